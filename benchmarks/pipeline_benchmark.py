@@ -0,0 +1,356 @@
+"""
+Offline end-to-end benchmark of the DJ pipeline.
+
+Every external service is replaced by a local stand-in from stubs.py: the LLM
+by a fake chat model streaming canned answers, Spotify by a stub Web API
+server that the real spotipy client talks to, the microphone by a synthetic
+WAV of speech bursts played through the real recorder and voice activity
+detection, and gTTS / playsound by no-ops. Latencies and error rates of each
+stand-in are flags, so regressions show up without network access or keys.
+
+Two phases are measured:
+
+- recommender: NextSongsSuggester.pipeline_stream called back to back from
+  `--concurrency` threads (time to first song, requests per second);
+- sessions: `--sessions` DJSessions run side by side in one event loop, each
+  hearing `--commands` spoken commands then "goodbye" (time from a request to
+  its music, songs queued per second, memory per session).
+
+Results are printed as a table, or as JSON with --json. The exit status is 1
+when recommender calls fail without --llm-errors, when no music starts, or
+when a --max-ttm or --max-memory-mb threshold is exceeded, for CI.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--sessions 4] [--commands 4] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from stubs import (
+    FakeChatModel,
+    FakeSoundDevice,
+    FakeTiktoken,
+    Latency,
+    StaticAuthManager,
+    StubSpotifyServer,
+    fake_synthesize,
+    make_catalog,
+    no_op_play,
+    synthetic_speech_wav,
+)
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src")
+
+# Spoken commands, cycled: open-ended requests go to the recommender, the rest
+# are routed locally
+COMMANDS = [
+    "play some upbeat latin music for a party",
+    "skip",
+    "something calmer for reading",
+    "louder",
+    "what's playing",
+    "more like this",
+    "I'm feeling sad today, play something to cheer me up",
+    "pause",
+    "resume",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions.")
+    parser.add_argument("--commands", type=int, default=4, help="Commands per session before goodbye.")
+    parser.add_argument("--requests", type=int, default=20, help="Recommender calls in the first phase.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads calling the recommender.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds to the first token.")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed chunks.")
+    parser.add_argument("--llm-errors", type=float, default=0.0, help="Fraction of failing LLM calls.")
+    parser.add_argument("--spotify-latency", type=float, default=0.05, help="Seconds per Spotify request.")
+    parser.add_argument("--spotify-errors", type=float, default=0.0, help="Fraction of 429/503 answers.")
+    parser.add_argument("--stt-latency", type=float, default=0.2, help="Seconds per transcription.")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="Seconds per synthesized phrase.")
+    parser.add_argument("--speed", type=float, default=2.0, help="Speed of the synthetic audio vs real time.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds before the sessions are stopped.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    parser.add_argument("--max-ttm", type=float, help="Fail if the p95 time to music exceeds this many seconds.")
+    parser.add_argument("--max-memory-mb", type=float, help="Fail if a session takes more memory than this.")
+    return parser.parse_args(argv)
+
+
+def stats(values):
+    from tracing import percentile
+
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def make_suggester(args, catalog, seed):
+    from chatgpt_handler import NextSongsSuggester
+    from prompt_builder import ProfileStore
+
+    chat_model = FakeChatModel(
+        catalog,
+        first_token=Latency(args.llm_latency, args.llm_latency / 4, seed),
+        token_delay=args.token_delay,
+        error_rate=args.llm_errors,
+        seed=seed,
+    )
+    mood_model = FakeChatModel(catalog, first_token=Latency(args.llm_latency / 2), token_delay=0, seed=seed)
+    suggester = NextSongsSuggester(
+        chat_model=chat_model,
+        mood_model=mood_model,
+        profiles=ProfileStore(summarize=None, path=os.path.join(args.workdir, "profiles.json")),
+    )
+    suggester.user_description = "Latin pop, 80s synth pop and chill acoustic songs"
+    return suggester
+
+
+def make_player(args, spotify):
+    from catalog_index import CatalogIndex
+    from spotify_api import SpotifyPlayer
+    from track_cache import TrackCache
+
+    # Cold caches, so that every song goes through the stub search endpoint
+    return SpotifyPlayer(
+        None,
+        None,
+        None,
+        track_cache=TrackCache(db_path=None),
+        catalog=CatalogIndex(path=None),
+        auth_manager=StaticAuthManager(),
+        api_url=spotify.api_url,
+    )
+
+
+def bench_recommender(args, catalog):
+    """Calls pipeline_stream from several threads; returns its metrics."""
+    from tracing import tracer
+
+    suggester = make_suggester(args, catalog, args.seed)
+    inputs = itertools.cycle(c for c in COMMANDS if len(c.split()) > 3)
+    lock = threading.Lock()
+    first_songs, totals, errors = [], [], [0]
+    remaining = [args.requests]
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+                text = next(inputs)
+            start = time.perf_counter()
+            first = None
+            try:
+                for _ in suggester.pipeline_stream(input_from_user=text, prev_songs=[]):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                totals.append(time.perf_counter() - start)
+                if first is not None:
+                    first_songs.append(first)
+
+    tracer.reset()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {
+        "requests": args.requests,
+        "errors": errors[0],
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(totals) / wall, 2) if wall else 0.0,
+        "first_song": stats(first_songs),
+        "complete": stats(totals),
+    }
+
+
+def make_session(args, catalog, spotify, index, speech):
+    import numpy as np
+
+    from audio_capture import RingBufferRecorder
+    from dj_session import DJSession
+    from tracing import tracer
+    from vad import VADListener
+
+    script = iter(
+        [COMMANDS[(index + i) % len(COMMANDS)] for i in range(args.commands)] + ["goodbye"]
+    )
+    stt_latency = Latency(args.stt_latency, args.stt_latency / 4, args.seed + index)
+    recorder = RingBufferRecorder()
+
+    def capture(stop):
+        for utterance in VADListener(recorder).utterances(stop):
+            yield np.array(utterance), recorder.sample_rate
+
+    def transcribe(samples, sample_rate):
+        with tracer.span("stt.transcribe"):
+            stt_latency.sleep()
+        return next(script, "")
+
+    return DJSession(
+        make_player(args, spotify),
+        make_suggester(args, catalog, args.seed + index),
+        device_id="stub-device",
+        capture=capture,
+        transcribe=transcribe,
+        speak=speech.say,
+        announce=lambda song: speech.say(f"Now playing {song}"),
+        greeting=["Hi, I'm your DJ."],
+        goodbye="Goodbye!",
+        poll_interval=0.5,
+    )
+
+
+async def run_sessions(sessions, timeout):
+    """Runs the sessions side by side; returns how many had to be stopped."""
+    tasks = [asyncio.create_task(session.run()) for session in sessions]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for session in sessions:
+        await session.stop()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(pending)
+
+
+def bench_sessions(args, catalog, spotify):
+    """Runs concurrent voice sessions end to end; returns their metrics."""
+    # Imported before memory is traced, so that only the sessions are measured
+    import audio_capture, dj_session, vad  # noqa: F401
+    from speech_output import SpeechOutput
+    from tracing import tracer
+    from tts_cache import TTSCache
+
+    tts_cache = TTSCache(
+        directory=os.path.join(args.workdir, "tts"),
+        synthesize=fake_synthesize(Latency(args.tts_latency)),
+    )
+    speech = SpeechOutput(tts_cache, play=no_op_play)
+
+    tracer.reset()
+    requests_before = spotify.requests
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = [make_session(args, catalog, spotify, i, speech) for i in range(args.sessions)]
+    start = time.perf_counter()
+    timed_out = asyncio.run(run_sessions(sessions, args.timeout))
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    durations, counters = tracer.snapshot()
+    queued = len(durations.get("spotify.add_to_queue", [])) + len(
+        durations.get("spotify.start_playback", [])
+    )
+    return {
+        "sessions": args.sessions,
+        "timed_out": timed_out,
+        "wall_s": round(wall, 3),
+        "time_to_music": stats(durations.get("session.time_to_music", [])),
+        "first_song": stats(durations.get("llm.first_song", [])),
+        "transcribe": stats(durations.get("stt.transcribe", [])),
+        "control": stats(durations.get("session.control", [])),
+        "songs_queued": queued,
+        "songs_per_s": round(queued / wall, 2) if wall else 0.0,
+        "spotify_requests": spotify.requests - requests_before,
+        "memory_per_session_mb": round((peak - baseline) / args.sessions / 2**20, 2),
+        "counters": counters,
+    }
+
+
+def print_report(results):
+    recommender, sessions = results["recommender"], results["sessions"]
+    print("Recommender")
+    print(f"  {recommender['requests_per_s']} requests/s, {recommender['errors']} errors")
+    for name in ("first_song", "complete"):
+        print(f"  {name:<18}{format_stats(recommender[name])}")
+    print(f"Sessions ({sessions['sessions']} concurrent, {sessions['wall_s']} s)")
+    for name in ("time_to_music", "first_song", "transcribe", "control"):
+        print(f"  {name:<18}{format_stats(sessions[name])}")
+    print(f"  {sessions['songs_queued']} songs queued ({sessions['songs_per_s']}/s), "
+          f"{sessions['spotify_requests']} Spotify requests")
+    print(f"  {sessions['memory_per_session_mb']} MB per session, {sessions['timed_out']} timed out")
+
+
+def format_stats(values):
+    if not values["count"]:
+        return "no samples"
+    return (f"n={values['count']:<4} p50 {values['p50_ms']:>8.1f} ms  "
+            f"p95 {values['p95_ms']:>8.1f} ms  max {values['max_ms']:>8.1f} ms")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    catalog = make_catalog(seed=args.seed)
+    spotify = StubSpotifyServer(
+        catalog,
+        latency=Latency(args.spotify_latency, args.spotify_latency / 4, args.seed),
+        error_rate=args.spotify_errors,
+        seed=args.seed,
+    ).start()
+
+    # Installed before any DJ module is imported; the players are given the
+    # stub's URL explicitly
+    sys.modules["tiktoken"] = FakeTiktoken()
+    sys.modules["sounddevice"] = FakeSoundDevice(
+        synthetic_speech_wav(args.commands + 1, seed=args.seed), speed=args.speed
+    )
+    sys.path.insert(0, SRC)
+
+    # What the DJ prints goes to stderr, so that stdout only has the results
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        args.workdir = workdir
+        try:
+            results = {
+                "recommender": bench_recommender(args, catalog),
+                "sessions": bench_sessions(args, catalog, spotify),
+            }
+        finally:
+            spotify.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    failures = []
+    errors = results["recommender"]["errors"]
+    if errors and not args.llm_errors:
+        failures.append(f"{errors} of {args.requests} recommender calls failed")
+    ttm = results["sessions"]["time_to_music"]
+    if args.max_ttm is not None and ttm["count"] and ttm["p95_ms"] > args.max_ttm * 1000:
+        failures.append(f"p95 time to music {ttm['p95_ms']} ms > {args.max_ttm * 1000:.0f} ms")
+    if not ttm["count"]:
+        failures.append("no music was started")
+    memory = results["sessions"]["memory_per_session_mb"]
+    if args.max_memory_mb is not None and memory > args.max_memory_mb:
+        failures.append(f"{memory} MB per session > {args.max_memory_mb} MB")
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Startup profile of the DJ: what importing each entry module costs.
+
+Runs `python -X importtime` in a fresh interpreter for every module and
+reports its total import time and the slowest imports under it. The
+entry modules should stay cheap; the heavy ones (langchain, spotipy, numpy,
+sounddevice, openai) are listed separately because they are loaded in the
+background after the greeting has started.
+
+Usage:
+    python benchmarks/startup_profile.py [--top 10] [module ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src")
+ENTRY_MODULES = ["main", "core_logic", "voice_interaction"]
+DEFERRED_MODULES = ["chatgpt_handler", "spotify_api", "stt_backends", "audio_capture"]
+
+
+def profile_import(module):
+    """
+    Imports `module` in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: Wall time in seconds, and (cumulative µs, self µs, name) for every
+        import, or None with the error output if the import failed.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        return wall, None, result.stderr.strip().splitlines()[-1:]
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return wall, imports, []
+
+
+def report(module, top):
+    wall, imports, error = profile_import(module)
+    if imports is None:
+        print(f"{module:<20} failed: {' '.join(error)}")
+        return
+    # -X importtime lists children before their parent, indented two more spaces
+    end = next(i for i, (_, _, name) in enumerate(imports) if name == f" {module}")
+    children = []
+    for entry in reversed(imports[:end]):
+        depth = (len(entry[2]) - len(entry[2].lstrip())) // 2
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append(entry)
+    total = imports[end][0]
+    print(f"{module:<20} import {total / 1000:8.1f} ms   interpreter {wall * 1000:8.1f} ms")
+    for cumulative, _, name in sorted(children, reverse=True)[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", help="Modules to profile (default: all).")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports shown per module.")
+    args = parser.parse_args()
+
+    if args.modules:
+        for module in args.modules:
+            report(module, args.top)
+        return
+    print("Entry modules (on the path to the first sound):")
+    for module in ENTRY_MODULES:
+        report(module, args.top)
+    print("\nDeferred modules (loaded in the background):")
+    for module in DEFERRED_MODULES:
+        report(module, args.top)
+
+
+if __name__ == "__main__":
+    main()
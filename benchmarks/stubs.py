@@ -0,0 +1,365 @@
+"""
+Local stand-ins for every external service the DJ talks to, with configurable
+latency and error injection, so that benchmarks run offline on a plain box:
+
+- FakeChatModel: a ChatOpenAI look-alike emitting canned or streamed completions.
+- StubSpotifyServer: a Web API look-alike (search and playback) that the real
+  spotipy client talks to over HTTP, at its `api_url`.
+- FakeSoundDevice: a sounddevice look-alike whose InputStream plays a WAV
+  (synthetic speech by default) into the recorder callback.
+- FakeTiktoken: a tiktoken look-alike that needs no encoding download.
+- fake_synthesize / no_op_play: gTTS and playsound replacements.
+"""
+import io
+import json
+import random
+import re
+import threading
+import time
+import types
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+
+class Latency:
+    """A latency distribution: `mean` seconds, uniformly spread by +/- `jitter`."""
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, seed: int = 0) -> None:
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def sleep(self) -> None:
+        delay = self.mean + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_catalog(size: int = 5000, artists: int = 400, seed: int = 0):
+    """Synthetic (title, artist) pairs shared by the fake LLM and the stub Spotify."""
+    rng = random.Random(seed)
+    words = ["Blue", "Night", "Fire", "Dance", "Heart", "City", "Summer", "Rain",
+             "Gold", "Wild", "Dream", "Light", "Road", "Moon", "Sugar", "Echo"]
+    return [
+        (f"{rng.choice(words)} {rng.choice(words)} {i}", f"Artist {rng.randrange(artists)}")
+        for i in range(size)
+    ]
+
+
+# LLM
+
+
+class FakeChatModel:
+    """
+    Drop-in for ChatOpenAI in NextSongsSuggester (invoke and stream).
+
+    Answers with a JSON array of songs from `catalog`, sized after the 'Count:'
+    line of the request and preceded by a mood line when asked to report it.
+    Streaming waits `first_token` then emits `chunk_chars` characters every
+    `token_delay` seconds; `error_rate` of the calls fail.
+    """
+
+    def __init__(self, catalog, first_token=None, token_delay=0.01,
+                 chunk_chars=4, error_rate=0.0, seed=0, reply=None) -> None:
+        self.catalog = catalog
+        self.first_token = first_token or Latency(0.3)
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.error_rate = error_rate
+        self.reply = reply
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _answer(self, messages) -> str:
+        with self._lock:
+            self.calls += 1
+            if self._random.random() < self.error_rate:
+                raise RuntimeError("Injected LLM error")
+            if self.reply is not None:
+                return self.reply
+            request = messages[-1].content if hasattr(messages[-1], "content") else str(messages[-1])
+            count = re.search(r"Count: (\d+)", request)
+            songs = self._random.sample(self.catalog, int(count.group(1)) if count else 5)
+        answer = json.dumps([{"song_name": title, "artist": artist} for title, artist in songs])
+        if "Report mood" in request:
+            answer = "Mood: happy\n" + answer
+        return answer
+
+    def invoke(self, messages):
+        answer = self._answer(messages)
+        self.first_token.sleep()
+        time.sleep(self.token_delay * len(answer) / self.chunk_chars)
+        return types.SimpleNamespace(content=answer)
+
+    def stream(self, messages):
+        answer = self._answer(messages)
+        self.first_token.sleep()
+        for i in range(0, len(answer), self.chunk_chars):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield types.SimpleNamespace(content=answer[i : i + self.chunk_chars])
+
+
+# Spotify
+
+
+class StaticAuthManager:
+    """Auth manager handing spotipy a constant token (the stub accepts anything)."""
+
+    def __init__(self) -> None:
+        self.cache_handler = types.SimpleNamespace(get_cached_token=lambda: None)
+
+    def get_access_token(self, as_dict=False):
+        return "stub-token"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many sessions connect at once
+    request_queue_size = 128
+
+
+class StubSpotifyServer:
+    """
+    Threaded HTTP server answering the Web API calls the DJ makes: search,
+    devices, playback state, play, queue, pause, next and volume. Every
+    request waits `latency`; `error_rate` of them get a 429 (Retry-After: 0)
+    or a 503. Start it, then give `api_url` to SpotifyPlayer.
+    """
+
+    def __init__(self, catalog, latency=None, error_rate=0.0, seed=0) -> None:
+        self.tracks = {}
+        for title, artist in catalog:
+            self.tracks[(title.lower(), artist.lower())] = {
+                "uri": f"spotify:track:{abs(hash((title, artist))):022d}"[:36],
+                "name": title,
+                "artists": [{"name": artist}],
+            }
+        self.latency = latency or Latency(0.05)
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.current = None
+        self.queued = []
+        self.volume = 50
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1/"
+
+    def start(self) -> "StubSpotifyServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _search(self, query):
+        fields = dict(re.findall(r"(artist|track):(.*?)(?= artist:| track:|$)", query))
+        title = fields.get("track", query).strip().lower()
+        artist = fields.get("artist", "").strip().lower()
+        track = self.tracks.get((title, artist))
+        if track is None and not artist:
+            track = next((t for (name, _), t in self.tracks.items() if name == title), None)
+        return {"tracks": {"items": [track] if track else []}}
+
+    def handle(self, method, path, query, body):
+        """Returns (status, headers, payload) for one request."""
+        with self._lock:
+            self.requests += 1
+            failing = self._random.random() < self.error_rate
+        self.latency.sleep()
+        if failing:
+            with self._lock:
+                self.errors += 1
+            if self._random.random() < 0.5:
+                return 429, {"Retry-After": "0"}, {"error": {"status": 429, "message": "Injected"}}
+            return 503, {}, {"error": {"status": 503, "message": "Injected"}}
+
+        if method == "GET" and path == "/v1/search":
+            return 200, {}, self._search(query.get("q", [""])[0])
+        if method == "GET" and path == "/v1/me/player/devices":
+            return 200, {}, {"devices": [{"id": "stub-device", "name": "Stub", "volume_percent": self.volume}]}
+        if method == "GET" and path == "/v1/me/player":
+            item = {"uri": self.current, "name": "Stub", "artists": [{"name": "Stub"}]} if self.current else None
+            return 200, {}, {"item": item, "is_playing": True, "device": {"volume_percent": self.volume}}
+        if method == "PUT" and path == "/v1/me/player/play":
+            uris = (body or {}).get("uris")
+            with self._lock:
+                if uris:
+                    self.current, self.queued = uris[0], list(uris[1:])
+            return 204, {}, None
+        if method == "POST" and path == "/v1/me/player/queue":
+            with self._lock:
+                self.queued.append(query.get("uri", [""])[0])
+            return 204, {}, None
+        if method == "POST" and path == "/v1/me/player/next":
+            with self._lock:
+                if self.queued:
+                    self.current = self.queued.pop(0)
+            return 204, {}, None
+        if method == "PUT" and path == "/v1/me/player/volume":
+            self.volume = int(query.get("volume_percent", [self.volume])[0])
+            return 204, {}, None
+        if method == "PUT" and path in ("/v1/me/player/pause", "/v1/me/player/seek"):
+            return 204, {}, None
+        return 404, {}, {"error": {"status": 404, "message": f"Not stubbed: {method} {path}"}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                status, headers, payload = stub.handle(
+                    self.command, url.path, parse_qs(url.query), body
+                )
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = do_POST = do_DELETE = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# Audio
+
+
+def synthetic_speech_wav(utterances: int, sample_rate: int = 16000, speech_seconds: float = 0.8,
+                         silence_seconds: float = 1.2, seed: int = 0) -> bytes:
+    """
+    A mono 16-bit WAV of `utterances` speech-like bursts (noise modulated at a
+    syllable rate) separated by near-silence, that voice activity detection
+    splits into one utterance each.
+    """
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 20, int(sample_rate * silence_seconds))]
+    for _ in range(utterances):
+        t = np.arange(int(sample_rate * speech_seconds)) / sample_rate
+        envelope = 0.6 + 0.4 * np.abs(np.sin(2 * np.pi * 4 * t))
+        parts.append(rng.normal(0, 3000, len(t)) * envelope)
+        parts.append(rng.normal(0, 20, int(sample_rate * silence_seconds)))
+    samples = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class FakeSoundDevice(types.ModuleType):
+    """
+    Stands in for the sounddevice module: every InputStream plays `wav` into
+    its callback in 30 ms blocks, `speed` times faster than real time, then
+    keeps delivering silence.
+    """
+
+    def __init__(self, wav: bytes, speed: float = 4.0, block_ms: int = 30) -> None:
+        super().__init__("sounddevice")
+        with wave.open(io.BytesIO(wav), "rb") as wf:
+            self.sample_rate = wf.getframerate()
+            self.samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        self.speed = speed
+        self.block = self.sample_rate * block_ms // 1000
+        fake = self
+
+        class InputStream:
+            def __init__(self, device=None, samplerate=None, channels=1, dtype="int16", callback=None):
+                self.callback = callback
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+
+            def _run(self):
+                position = 0
+                interval = fake.block / fake.sample_rate / fake.speed
+                while not self._stop.is_set():
+                    block = fake.samples[position : position + fake.block]
+                    if len(block) < fake.block:
+                        block = np.zeros(fake.block, dtype=np.int16)
+                    position += fake.block
+                    self.callback(block.reshape(-1, 1), fake.block, None, None)
+                    time.sleep(interval)
+
+            def __enter__(self):
+                self._thread.start()
+                return self
+
+            def __exit__(self, *exc):
+                self._stop.set()
+                self._thread.join()
+
+        self.InputStream = InputStream
+
+    def check_input_settings(self, device=None, channels=1, samplerate=None, dtype=None):
+        if samplerate != self.sample_rate:
+            raise ValueError("Invalid sample rate")
+
+    def query_devices(self, device=None, kind=None):
+        return {"default_samplerate": self.sample_rate, "max_input_channels": 1}
+
+    def sleep(self, milliseconds):
+        time.sleep(milliseconds / 1000 / self.speed)
+
+
+class FakeTiktoken(types.ModuleType):
+    """
+    Stands in for the tiktoken module, which downloads its encodings on first
+    use: words and punctuation marks count as one token each.
+    """
+
+    class Encoding:
+        def encode(self, text: str) -> list:
+            return re.findall(r"\w+|[^\w\s]", text)
+
+    def __init__(self) -> None:
+        super().__init__("tiktoken")
+
+    def encoding_for_model(self, model: str) -> "FakeTiktoken.Encoding":
+        return self.Encoding()
+
+    def get_encoding(self, name: str) -> "FakeTiktoken.Encoding":
+        return self.Encoding()
+
+
+# Speech
+
+
+def fake_synthesize(latency=None):
+    """A gTTS replacement for TTSCache writing a few bytes after `latency`."""
+    latency = latency or Latency(0.05)
+
+    def synthesize(text, lang, path):
+        latency.sleep()
+        with open(path, "wb") as f:
+            f.write(b"ID3" + text.encode("utf-8"))
+
+    return synthesize
+
+
+def no_op_play(path):
+    """A playsound replacement that plays nothing."""
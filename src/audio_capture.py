@@ -0,0 +1,166 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import numpy as np
+import sounddevice as sd
+
+from config import CAPTURE_MAX_SECONDS, CAPTURE_SAMPLE_RATE
+
+
+class RingBufferRecorder:
+    """
+    Records the microphone into a preallocated mono int16 ring buffer.
+
+    The stream callback downmixes and resamples each block to the target rate
+    and writes it in place, so nothing is appended or concatenated while
+    recording and memory stays bounded by `max_seconds`. When the device
+    supports the target rate in mono, blocks are copied straight into the
+    buffer with no conversion at all.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = CAPTURE_SAMPLE_RATE,
+        max_seconds: float = CAPTURE_MAX_SECONDS,
+        device=None,
+    ) -> None:
+        """
+        Args:
+            sample_rate (int): Rate of the recorded audio, in Hz.
+            max_seconds (float): Capacity of the ring buffer; older audio is overwritten.
+            device (optional): The sounddevice input device, default device if None.
+        """
+        self.sample_rate = sample_rate
+        self.device = device
+        self.dtype = "int16"
+        self._buffer = np.zeros(int(sample_rate * max_seconds), dtype=np.int16)
+        self._written = 0
+        self._lock = threading.Lock()
+        # Optional listener receiving every converted block, e.g. a VAD
+        self.on_block: Optional[Callable[[np.ndarray], None]] = None
+
+        # Prefer letting the host API deliver mono at the target rate
+        self.capture_rate, self.channels = sample_rate, 1
+        try:
+            sd.check_input_settings(
+                device=device, channels=1, samplerate=sample_rate, dtype=self.dtype
+            )
+        except Exception:
+            info = sd.query_devices(device, kind="input")
+            self.capture_rate = int(info["default_samplerate"])
+            try:
+                sd.check_input_settings(
+                    device=device, channels=1, samplerate=self.capture_rate
+                )
+            except Exception:
+                self.channels = info["max_input_channels"]
+        self._step = self.capture_rate / sample_rate
+        self._position = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def written(self) -> int:
+        """Total number of samples written since the last reset."""
+        return self._written
+
+    def reset(self) -> None:
+        """Forgets everything recorded so far."""
+        with self._lock:
+            self._written = 0
+            self._position = 0.0
+
+    def _convert(self, indata: np.ndarray) -> np.ndarray:
+        block = indata[:, 0] if self.channels == 1 else indata.mean(axis=1)
+        if self.capture_rate == self.sample_rate:
+            return block
+        # Linear interpolation, keeping the fractional position across blocks
+        positions = np.arange(self._position, len(block), self._step)
+        if len(positions):
+            self._position = positions[-1] + self._step - len(block)
+        else:
+            self._position -= len(block)
+        return np.interp(positions, np.arange(len(block)), block).astype(np.int16)
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        Writes mono samples at the target rate into the ring buffer.
+
+        Args:
+            samples (np.ndarray): The samples to write.
+        """
+        n = len(samples)
+        if n >= self.capacity:
+            samples, n = samples[-self.capacity :], self.capacity
+        with self._lock:
+            start = self._written % self.capacity
+            first = min(n, self.capacity - start)
+            self._buffer[start : start + first] = samples[:first]
+            self._buffer[: n - first] = samples[first:]
+            self._written += n
+
+    def callback(self, indata, frames, time, status) -> None:
+        """The sounddevice stream callback, called for each audio block."""
+        block = self._convert(indata)
+        self.write(block)
+        if self.on_block is not None:
+            # sounddevice reuses indata once the callback returns, and the
+            # block may be a view into it
+            self.on_block(block.copy())
+
+    @contextmanager
+    def stream(self):
+        """Records from the microphone for the duration of the context."""
+        with sd.InputStream(
+            device=self.device,
+            samplerate=self.capture_rate,
+            channels=self.channels,
+            dtype=self.dtype,
+            callback=self.callback,
+        ):
+            yield self
+
+    def view(self) -> np.ndarray:
+        """
+        Returns the recorded samples in order.
+
+        Returns:
+            np.ndarray: A view into the ring buffer (no copy) unless the buffer
+            has wrapped around, in which case the samples are unrolled into a new array.
+        """
+        with self._lock:
+            if self._written <= self.capacity:
+                return self._buffer[: self._written]
+            start = self._written % self.capacity
+            return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+    def slice(self, start: int, end: int) -> np.ndarray:
+        """
+        Returns the samples between two absolute positions (as counted by `written`).
+
+        Args:
+            start (int): First sample, clamped to the oldest sample still in the buffer.
+            end (int): Sample after the last one, clamped to `written`.
+
+        Returns:
+            np.ndarray: A view into the ring buffer, or a copy if the range wraps around.
+        """
+        with self._lock:
+            start = max(start, self._written - self.capacity, 0)
+            end = min(end, self._written)
+            if end <= start:
+                return self._buffer[:0]
+            first, last = start % self.capacity, end % self.capacity
+            if first < last or last == 0:
+                return self._buffer[first : last or self.capacity]
+            return np.concatenate((self._buffer[first:], self._buffer[:last]))
+
+    def duration(self) -> float:
+        """
+        Returns:
+            float: Seconds of audio available in the buffer.
+        """
+        return min(self._written, self.capacity) / self.sample_rate
@@ -0,0 +1,199 @@
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import CATALOG_MATCH_THRESHOLD, CATALOG_PATH
+from track_cache import normalize_text
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Splits normalized text into its character trigrams, padded at the word edges.
+
+    Args:
+        text (str): Text already passed through normalize_text.
+
+    Returns:
+        Set[str]: The trigrams of the text.
+    """
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """
+    Local index of known Spotify tracks with fuzzy "Title - Artist" lookup.
+
+    Tracks are kept in an append-only TSV file (uri, title, artist) and a
+    trigram inverted index is built over them in memory on load. Matching a
+    suggestion only scores the tracks sharing trigrams with it, so most LLM
+    suggestions resolve without a network call. A title alone only matches
+    when no other artist has an equally close title: the search endpoint,
+    which ranks by popularity, settles the others.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = CATALOG_PATH,
+        threshold: float = CATALOG_MATCH_THRESHOLD,
+    ) -> None:
+        """
+        Args:
+            path (str, optional): Path of the TSV file. None keeps the index in memory only.
+            threshold (float): Minimum Dice similarity for a match.
+        """
+        self.path = path
+        self.threshold = threshold
+        self._uris: List[str] = []
+        self._artists: List[str] = []
+        self._grams: List[Set[str]] = []
+        self._title_grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 3:
+                        self._index(*parts)
+
+    def __len__(self) -> int:
+        return len(self._uris)
+
+    def _index(self, uri: str, title: str, artist: str) -> bool:
+        title, artist = normalize_text(title), normalize_text(artist)
+        key = f"{uri}|{title}|{artist}"
+        if not title or key in self._known:
+            return False
+        self._known.add(key)
+        entry_id = len(self._uris)
+        grams = trigrams(f"{title} {artist}".strip())
+        self._uris.append(uri)
+        self._artists.append(artist)
+        self._grams.append(grams)
+        self._title_grams.append(trigrams(title))
+        for gram in grams:
+            self._postings[gram].append(entry_id)
+        return True
+
+    def add(self, uri: str, title: str, artist: Optional[str]) -> None:
+        """
+        Adds a resolved track to the index and appends it to the file.
+
+        Args:
+            uri (str): The Spotify track URI.
+            title (str): The track title.
+            artist (str, optional): The (main) artist name.
+        """
+        self._add([(uri, title, artist)])
+
+    def _add(self, rows: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        # Indexes the rows, then appends the new ones to the file at once
+        lines = []
+        with self._lock:
+            for uri, title, artist in rows:
+                # Tabs and newlines would break the file format
+                title = " ".join((title or "").split())
+                artist = " ".join((artist or "").split())
+                if self._index(uri, title, artist):
+                    lines.append(f"{uri}\t{title}\t{artist}\n")
+            if lines and self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+
+    def add_tracks(self, tracks: Iterable[dict]) -> int:
+        """
+        Adds Spotify track objects (as returned by the Web API) to the index.
+
+        Args:
+            tracks (Iterable[dict]): Track objects with 'uri', 'name' and 'artists'.
+
+        Returns:
+            int: The number of tracks considered.
+        """
+        rows = []
+        for track in tracks:
+            if not track or not track.get("uri") or not track.get("name"):
+                continue
+            artists = track.get("artists") or [{}]
+            rows.append((track["uri"], track["name"], artists[0].get("name")))
+        self._add(rows)
+        return len(rows)
+
+    def add_playlist_export(self, path: str) -> int:
+        """
+        Adds the tracks of a playlist exported as JSON, either a Web API
+        playlist items page ({"items": [{"track": {...}}]}) or a list of track objects.
+
+        Args:
+            path (str): Path of the JSON export.
+
+        Returns:
+            int: The number of tracks considered.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items = data.get("items", []) if isinstance(data, dict) else data
+        return self.add_tracks(item.get("track", item) for item in items)
+
+    def add_from_track_cache(self, track_cache) -> int:
+        """
+        Adds every track the track cache has resolved.
+
+        Args:
+            track_cache (TrackCache): The cache of previous searches.
+
+        Returns:
+            int: The number of tracks considered.
+        """
+        rows = []
+        for key, uri in track_cache.resolved_items():
+            title, _, artist = key.partition("|")
+            rows.append((uri, title, artist))
+        self._add(rows)
+        return len(rows)
+
+    def match(self, title: str, artist: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        Finds the known track closest to a suggestion.
+
+        Args:
+            title (str): The suggested title.
+            artist (str, optional): The suggested artist. Without it only titles are compared.
+
+        Returns:
+            Tuple[str, float], optional: The URI and similarity of the best match above
+            the threshold, or None (also for a title shared by several artists).
+        """
+        title, artist = normalize_text(title), normalize_text(artist or "")
+        if not title:
+            return None
+        query = trigrams(f"{title} {artist}".strip() if artist else title)
+        # A Dice score of at least t needs m = t*|q|/(2-t) shared trigrams, so
+        # any match contains one of the |q|-m+1 rarest query trigrams: only
+        # their postings are scanned for candidates (prefix filtering)
+        min_shared = math.ceil(self.threshold * len(query) / (2 - self.threshold))
+        with self._lock:
+            grams = self._grams if artist else self._title_grams
+            rarest = sorted(query, key=lambda g: len(self._postings.get(g, ())))
+            candidates = set()
+            for gram in rarest[: max(1, len(query) - min_shared + 1)]:
+                candidates.update(self._postings.get(gram, ()))
+
+            best, best_score, tied = None, self.threshold, set()
+            for entry_id in candidates:
+                entry = grams[entry_id]
+                score = 2 * len(query & entry) / (len(query) + len(entry))
+                if score > best_score or (score == best_score and best is None):
+                    best, best_score, tied = entry_id, score, set()
+                if score == best_score:
+                    tied.add(self._artists[entry_id])
+            if best is None or (not artist and len(tied) > 1):
+                return None
+            return self._uris[best], best_score
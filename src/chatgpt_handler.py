@@ -1,7 +1,23 @@
-from typing import Any, List, Optional
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple
 from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage
-from pydantic import BaseModel, Field
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, ValidationError
+
+from config import HISTORY_OVERREQUEST, HTTP_RETRIES, HTTP_TIMEOUT, OPENAI_BASE_URL
+from http_transport import shared_http_client
+from mood import classify_mood_locally, normalize_mood_text
+from play_history import PlayHistory
+from prompt_builder import SYSTEM_PREFIX, ProfileStore, build_request, count_tokens
+from recommendation_cache import RecommendationCache
+from track_cache import normalize_key
+from tracing import tracer
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*]|\d+[.)])\s+")
+_MOOD_LINE = re.compile(r"^\s*\**mood\**\s*:\s*\**\s*([a-zA-Z-]+)", re.IGNORECASE)
 
 
 class SuggestedSong(BaseModel):
@@ -10,6 +26,134 @@ class SuggestedSong(BaseModel):
         None, title="Artist", description="The artist of the song."
     )
 
+    def __str__(self) -> str:
+        return f"{self.song_name} - {self.artist}" if self.artist else self.song_name
+
+
+class SongStreamParser:
+    """
+    Incremental parser for a JSON array of SuggestedSong objects.
+
+    Text can be fed in arbitrary chunks (e.g. from a streamed completion), and
+    every object is validated and returned as soon as its closing brace
+    arrives. Text outside of the objects is ignored, so stray prose or code
+    fences around the array do no harm.
+    """
+
+    def __init__(self) -> None:
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._current: List[str] = []
+        self._skipped: List[str] = []
+        self.found_objects = False
+
+    def feed(self, text: str) -> List[SuggestedSong]:
+        """
+        Parses the next chunk of the response.
+
+        Args:
+            text (str): The next piece of the response.
+
+        Returns:
+            List[SuggestedSong]: The songs completed by this chunk.
+        """
+        songs = []
+        for char in text:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                else:
+                    self._skipped.append(char)
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.found_objects = True
+                    song = self._validate("".join(self._current))
+                    if song is not None:
+                        songs.append(song)
+        return songs
+
+    def close(self) -> List[SuggestedSong]:
+        """
+        Ends the response. If it held no JSON objects at all, falls back to the
+        plain 'Song Title - Artist' list format, one entry per line or comma.
+
+        Returns:
+            List[SuggestedSong]: The songs recovered by the fallback, if any.
+        """
+        if self.found_objects:
+            return []
+        text = "".join(self._skipped).strip().strip("[]`")
+        entries = text.split("\n") if "\n" in text else text.split(",")
+        songs = []
+        for entry in entries:
+            entry = _LIST_MARKER.sub("", entry).replace('"', "").strip()
+            if not entry:
+                continue
+            title, _, artist = entry.partition(" - ")
+            songs.append(
+                SuggestedSong(song_name=title.strip(), artist=artist.strip() or None)
+            )
+        return songs
+
+    @staticmethod
+    def _validate(text: str) -> Optional[SuggestedSong]:
+        try:
+            song = SuggestedSong(**json.loads(text))
+        except (ValueError, TypeError, ValidationError) as e:
+            print(f"Failed to parse song {text}: {e}")
+            return None
+        song.song_name = song.song_name.strip()
+        return song if song.song_name else None
+
+
+def make_chat_models():
+    """
+    Builds the recommendation and mood models. They hold no conversation state,
+    so one pair (and its connection pool) can serve every session of a process.
+
+    Returns:
+        tuple: The recommendation model and the mood model.
+    """
+    chat_model = ChatOpenAI(
+        model_name="gpt-4",
+        temperature=0.8,
+        max_tokens=500,
+        frequency_penalty=0,
+        presence_penalty=0,
+        top_p=1.0,
+        base_url=OPENAI_BASE_URL,
+        http_client=shared_http_client(),
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_RETRIES,
+    )
+    mood_model = ChatOpenAI(
+        model_name="gpt-3.5-turbo-16k",
+        temperature=0.0,
+        max_tokens=100,
+        base_url=OPENAI_BASE_URL,
+        http_client=shared_http_client(),
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_RETRIES,
+    )
+    return chat_model, mood_model
+
 
 class NextSongsSuggester:
     """
@@ -21,6 +165,14 @@ class NextSongsSuggester:
         self,
         n_recommendations: int = 5,
         past_played_songs_num: int = 10,
+        cache: Optional[RecommendationCache] = None,
+        fold_mood: bool = False,
+        mood_memo_size: int = 256,
+        chat_model: Optional[ChatOpenAI] = None,
+        mood_model: Optional[ChatOpenAI] = None,
+        profiles: Optional[ProfileStore] = None,
+        history: Optional[PlayHistory] = None,
+        overrequest: int = HISTORY_OVERREQUEST,
     ) -> None:
         """
         Initializes the NextSongsSuggester with the specified number of recommendations
@@ -29,24 +181,43 @@ class NextSongsSuggester:
         Args:
             n_recommendations (int): The number of song recommendations to provide.
             past_played_songs_num (int): The number of past songs to include in the context.
+            cache (RecommendationCache, optional): Cache answering repeated requests without calling the model.
+            fold_mood (bool): Infer the mood of the user input in the recommendation request itself,
+                instead of a separate model call.
+            mood_memo_size (int): The number of inferred moods remembered per normalized input.
+            chat_model (ChatOpenAI, optional): Recommendation model shared with other suggesters.
+            mood_model (ChatOpenAI, optional): Mood model shared with other suggesters.
+            profiles (ProfileStore, optional): Summaries of taste descriptions, shared with other suggesters.
+            history (PlayHistory, optional): The user's play history (in memory only if None).
+            overrequest (int): Extra songs asked from the model, so that enough remain
+                once already played ones are filtered out.
         """
-        self.chat_model = ChatOpenAI(
-            model_name="gpt-4",
-            temperature=0.8,
-            max_tokens=500,
-            frequency_penalty=0,
-            presence_penalty=0,
-            top_p=1.0,
-        )
-        self.mood_model = ChatOpenAI(
-            model_name="gpt-3.5-turbo-16k",
-            temperature=0.0,
-            max_tokens=100,
-        )
+        if chat_model is None or mood_model is None:
+            default_chat_model, default_mood_model = make_chat_models()
+            chat_model = chat_model or default_chat_model
+            mood_model = mood_model or default_mood_model
+        self.chat_model = chat_model
+        self.mood_model = mood_model
         self.user_description: str = ""
         self.mood: str = ""
         self.n_recommendations = n_recommendations
         self.past_played_songs_num = past_played_songs_num
+        self.cache = cache
+        self.fold_mood = fold_mood
+        self.mood_memo_size = mood_memo_size
+        self._mood_memo: "OrderedDict[str, str]" = OrderedDict()
+        # The user description is summarized once, by the cheaper mood model
+        self.profiles = profiles or ProfileStore(
+            summarize=lambda prompt: self.mood_model.invoke(
+                [HumanMessage(content=prompt)]
+            ).content
+        )
+        self.history = history or PlayHistory(recent_size=past_played_songs_num)
+        self.overrequest = overrequest
+        # Every song handed to the player this session, as normalized
+        # "song|artist" keys (see record_played)
+        self.played = set()
+        self.last_prompt_tokens = 0
 
     def collect_user_info(self) -> None:
         """
@@ -60,88 +231,128 @@ class NextSongsSuggester:
 
         print("Great! I'll tailor your music experience based on your mood. 🎶")
 
-    def infer_mood(self, user_input: str) -> str:
+    def _remember_mood(self, key: str, mood: str) -> None:
+        self._mood_memo[key] = mood
+        self._mood_memo.move_to_end(key)
+        while len(self._mood_memo) > self.mood_memo_size:
+            self._mood_memo.popitem(last=False)
+
+    def known_mood(self, user_input: str) -> Optional[str]:
         """
-        Infers the user's mood from their input using the GPT-3.5-turbo-16k model.
+        Returns the mood of the input if it can be told without calling a model,
+        either from the local keyword classifier or from previously inferred moods.
 
         Args:
             user_input (str): The user's input from which to infer mood.
 
         Returns:
-            str: The inferred mood as a lowercase string.
+            str, optional: The mood, or None if a model is needed.
         """
-        prompt = (
-            "Analyze the following text and determine the user's current mood or emotional state. "
-            "Provide a one-word description of the mood, such as 'happy', 'sad', 'energetic', 'calm', etc. "
-            "If the mood is not clear, respond with 'neutral'.\n\n"
-            f"User input: '{user_input}'\n\nMood:"
-        )
-        response = (
-            self.mood_model.invoke([SystemMessage(content=prompt)])
-            .content.strip()
-            .lower()
-        )
-
-        # Ensure the response is a single word and sanitize if necessary
-        mood = response.split()[0] if response else "neutral"
+        mood = classify_mood_locally(user_input)
+        if mood:
+            return mood
+        key = normalize_mood_text(user_input)
+        mood = self._mood_memo.get(key)
+        if mood:
+            self._mood_memo.move_to_end(key)
         return mood
 
-    def build_prompt(
+    def set_mood(self, mood: str) -> None:
+        """Sets the session's mood, e.g. as the `on_mood` of a pipeline."""
+        self.mood = mood
+
+    def _request_mood(self, input_from_user: str, on_mood: Callable[[str], None]) -> Tuple[str, bool]:
+        # With fold_mood the recommendation request reports the mood itself,
+        # unless it is already known locally. Returns the mood to build the
+        # request with, and whether the model should report it.
+        if not self.fold_mood or not input_from_user:
+            return self.mood, False
+        mood = self.known_mood(input_from_user)
+        if mood:
+            on_mood(mood)
+            return mood, False
+        return self.mood, True
+
+    def _take_mood_line(
+        self, input_from_user: str, response: str, on_mood: Callable[[str], None]
+    ) -> str:
+        first_line, _, rest = response.partition("\n")
+        match = _MOOD_LINE.match(first_line)
+        if not match:
+            return response
+        mood = match.group(1).lower()
+        self._remember_mood(normalize_mood_text(input_from_user), mood)
+        on_mood(mood)
+        return rest
+
+    def build_messages(
         self,
         input_from_user: str = "",
         prev_songs: Optional[List[str]] = None,
-    ) -> str:
+        report_mood: bool = False,
+        mood: Optional[str] = None,
+    ) -> list:
         """
-        Builds the prompt to be sent to the ChatGPT model based on collected user information.
+        Builds the messages to be sent to the ChatGPT model: the static system
+        prefix, then a compact request with the summarized profile, the mood,
+        the recent songs (within a token budget) and the user input.
 
         Args:
             input_from_user (str): Additional input from the user during the session.
             prev_songs (List[str], optional): A list of previously played songs.
+            report_mood (bool): Ask the model to start its answer with the mood of the user input.
+            mood (str, optional): The mood to recommend for (the session's mood if None).
 
         Returns:
-            str: The constructed prompt for the AI model.
+            list: The system and human messages.
         """
-        context = (
-            "You are an AI DJ, the most advanced in the world. Your task is to suggest songs for the user to listen to next, "
-            "based on their music taste, mood, activity, and previous songs."
+        request = build_request(
+            self.profiles.profile(self.user_description),
+            self.mood if mood is None else mood,
+            (prev_songs or [])[-self.past_played_songs_num :],
+            input_from_user,
+            self.n_recommendations + self.overrequest,
+            report_mood,
         )
+        self.last_prompt_tokens = count_tokens(SYSTEM_PREFIX) + count_tokens(request)
+        return [SystemMessage(content=SYSTEM_PREFIX), HumanMessage(content=request)]
 
-        if self.user_description:
-            context += f"\n\nHere is a description of the user's music taste:\n{self.user_description}"
+    def _is_new(self, song: SuggestedSong, selected: Set[str]) -> bool:
+        # Dedup against the whole play history, this session's plays and the
+        # songs already selected for this answer, done here rather than
+        # trusted to the model
+        key = normalize_key(song.song_name, song.artist)
+        if key in selected or key in self.played or song in self.history:
+            return False
+        selected.add(key)
+        return True
 
-        if self.mood:
-            context += f"\n\nThe user's current mood is: {self.mood}"
-
-        if prev_songs:
-            context += "\n\nHere are the last few songs that the user has been listening to in this playlist:"
-            recent_songs = prev_songs[-self.past_played_songs_num :]
-            for song in recent_songs:
-                context += f"\n- {song}"
-        else:
-            context += (
-                "\n\nThe user has not listened to any songs yet in this playlist."
-            )
+    def record_played(self, song: SuggestedSong) -> None:
+        """
+        Records a song handed to the player, so that it is not suggested again
+        this session. Suggestions that are never played (e.g. from a discarded
+        speculative batch) stay available.
 
-        if input_from_user:
-            context += (
-                f"\n\nThe user has provided the following input: '{input_from_user}'"
-            )
+        Args:
+            song (SuggestedSong): The song.
+        """
+        self.played.add(normalize_key(song.song_name, song.artist))
 
-        context += f"\n\nBased on this information, suggest the next {self.n_recommendations} songs for the user."
+    def _count_tokens(self, completion_tokens: int) -> None:
+        tracer.count("llm.prompt_tokens", self.last_prompt_tokens)
+        tracer.count("llm.completion_tokens", completion_tokens)
 
-        context += "\n\n**Instructions:**"
-        context += (
-            "\n- Only provide the song titles and artist names, in a comma-separated list like this: "
-            "'Song Title - Artist, Song Title - Artist, ...'"
-        )
-        context += "\n- Ensure that the recommendations match the user's mood, activity, and music taste."
-        context += "\n- If there is no specific input/information, you can provide general recommendations (and) you think the user will enjoy based on his description."
-        context += "\n- Do not include any songs that the user has already listened to in this playlist."
-        context += "\n- Make sure that the songs exist and are spelled correctly."
+    def _select(self, songs: List[SuggestedSong]) -> List[SuggestedSong]:
+        # The model was asked for a few more songs than needed: keep the first new ones
+        selected, keys = [], set()
+        for song in songs:
+            if len(selected) == self.n_recommendations:
+                break
+            if self._is_new(song, keys):
+                selected.append(song)
+        return selected
 
-        return context
-
-    def extract_titles(self, response: str) -> List[str]:
+    def extract_titles(self, response: str) -> List[SuggestedSong]:
         """
         Extracts song titles and artist names from the AI model's response.
 
@@ -149,34 +360,144 @@ class NextSongsSuggester:
             response (str): The response string from the AI model.
 
         Returns:
-            List[str]: A list of songs in the format 'Song Title - Artist'.
+            List[SuggestedSong]: The validated songs.
         """
-        try:
-            songs = [song.strip() for song in response.split(",")]
-            return songs
-        except Exception as e:
-            print(f"Failed to parse response: {e}")
-            return []
+        parser = SongStreamParser()
+        songs = parser.feed(response)
+        return songs + parser.close()
+
+    def _cache_inputs(self, input_from_user: str, prev_songs: Optional[List[str]], mood: str):
+        recent_songs = (prev_songs or [])[-self.past_played_songs_num :]
+        return (
+            self.user_description,
+            mood,
+            input_from_user,
+            recent_songs,
+            self.n_recommendations,
+        )
+
+    def _from_cache(self, cache_inputs) -> Optional[List[SuggestedSong]]:
+        """
+        Answers from the recommendation cache, if a cached answer still holds
+        a full batch of songs not played yet; otherwise the model is asked.
+        """
+        if self.cache is None:
+            return None
+        cached_songs = self.cache.lookup(*cache_inputs)
+        if cached_songs is not None:
+            selected = self._select(cached_songs)
+            if len(selected) == self.n_recommendations:
+                tracer.count("recommendation_cache.hit")
+                return selected
+            # Mostly played already: a repeated request deserves new songs
+        tracer.count("recommendation_cache.miss")
+        return None
 
     def pipeline(
         self,
         input_from_user: str = "",
         prev_songs: Optional[List[str]] = None,
-    ) -> List[str]:
+        on_mood: Optional[Callable[[str], None]] = None,
+    ) -> List[SuggestedSong]:
         """
         The main pipeline that constructs the prompt, invokes the AI model, and returns song recommendations.
 
         Args:
             input_from_user (str): Input from the user during the session.
             prev_songs (List[str], optional): A list of previously played songs.
+            on_mood (Callable, optional): Receives the mood of the input once known,
+                e.g. `set_mood` to make it the session's mood; ignored if None.
 
         Returns:
-            List[str]: A list of recommended songs.
+            List[SuggestedSong]: A list of recommended songs.
         """
-        prompt = self.build_prompt(input_from_user, prev_songs)
-        response = self.chat_model.invoke([SystemMessage(content=prompt)]).content
+        on_mood = on_mood or (lambda mood: None)
+        mood, report_mood = self._request_mood(input_from_user, on_mood)
+        cache_inputs = self._cache_inputs(input_from_user, prev_songs, mood)
+        cached_songs = self._from_cache(cache_inputs)
+        if cached_songs is not None:
+            return cached_songs
+
+        messages = self.build_messages(input_from_user, prev_songs, report_mood, mood)
+        with tracer.span("llm.recommend", prompt_tokens=self.last_prompt_tokens) as span:
+            response = self.chat_model.invoke(messages).content
+            span["completion_tokens"] = count_tokens(response)
+        self._count_tokens(span["completion_tokens"])
+        if report_mood:
+            response = self._take_mood_line(input_from_user, response, on_mood)
         recommended_songs = self.extract_titles(response)
-        return recommended_songs
+        if self.cache is not None:
+            self.cache.store(*cache_inputs, recommended_songs)
+        return self._select(recommended_songs)
+
+    def pipeline_stream(
+        self,
+        input_from_user: str = "",
+        prev_songs: Optional[List[str]] = None,
+        on_mood: Optional[Callable[[str], None]] = None,
+    ) -> Iterator[SuggestedSong]:
+        """
+        Streaming variant of the pipeline that yields each recommended song as soon as
+        its JSON object is complete, while the rest of the completion is still being generated.
+
+        Args:
+            input_from_user (str): Input from the user during the session.
+            prev_songs (List[str], optional): A list of previously played songs.
+            on_mood (Callable, optional): Receives the mood of the input once known,
+                e.g. `set_mood` to make it the session's mood; ignored if None.
+
+        Yields:
+            SuggestedSong: Recommended songs.
+        """
+        on_mood = on_mood or (lambda mood: None)
+        mood, report_mood = self._request_mood(input_from_user, on_mood)
+        cache_inputs = self._cache_inputs(input_from_user, prev_songs, mood)
+        cached_songs = self._from_cache(cache_inputs)
+        if cached_songs is not None:
+            yield from cached_songs
+            return
+
+        messages = self.build_messages(input_from_user, prev_songs, report_mood, mood)
+        parser = SongStreamParser()
+        recommended_songs = []
+        selected = set()
+        buffer = ""
+        response = ""
+        start = time.perf_counter()
+        for chunk in self.chat_model.stream(messages):
+            buffer += chunk.content
+            response += chunk.content
+            if report_mood:
+                # Hold the answer back until the mood line is complete
+                if "\n" not in buffer:
+                    continue
+                buffer = self._take_mood_line(input_from_user, buffer, on_mood)
+                report_mood = False
+            for song in parser.feed(buffer):
+                recommended_songs.append(song)
+                first = not selected
+                if len(selected) < self.n_recommendations and self._is_new(song, selected):
+                    if first:
+                        tracer.record("llm.first_song", time.perf_counter() - start)
+                    yield song
+            buffer = ""
+        if report_mood:
+            buffer = self._take_mood_line(input_from_user, buffer, on_mood)
+        for song in parser.feed(buffer) + parser.close():
+            recommended_songs.append(song)
+            if len(selected) < self.n_recommendations and self._is_new(song, selected):
+                yield song
+        completion_tokens = count_tokens(response)
+        tracer.record(
+            "llm.recommend",
+            time.perf_counter() - start,
+            prompt_tokens=self.last_prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        self._count_tokens(completion_tokens)
+        # Only complete answers are cached; a stream closed early never gets here
+        if self.cache is not None:
+            self.cache.store(*cache_inputs, recommended_songs)
 
     def __call__(self, *args: Any, **kwargs: Any) -> Any:
         """
@@ -1 +1,132 @@
+import os
+
 REDIRECT_URI = "http://localhost:8888/callback"
+
+# Local on-disk state (caches, indexes) lives next to the repo, outside src/
+path = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(path, "../cache")
+
+# Track-resolution cache used by SpotifyPlayer.get_track_uris
+TRACK_CACHE_PATH = os.path.join(CACHE_DIR, "tracks.sqlite3")
+TRACK_CACHE_MEMORY_SIZE = 2048
+TRACK_CACHE_TTL = 30 * 24 * 3600  # found tracks, in seconds
+TRACK_CACHE_NEGATIVE_TTL = 24 * 3600  # tracks the search did not find
+
+# Concurrent track resolution against the Spotify search endpoint
+SPOTIFY_SEARCH_WORKERS = 8
+SPOTIFY_REQUESTS_PER_SECOND = 10.0
+SPOTIFY_REQUESTS_BURST = 10
+SPOTIFY_SEARCH_RETRIES = 3
+SPOTIFY_RETRY_BACKOFF = 0.5  # seconds, doubled on every retry
+
+# Prefetching playback queue
+QUEUE_LOW_WATER = 2  # refill when fewer tracks than this are left after the current one
+QUEUE_POLL_INTERVAL = 5.0  # seconds between playback state checks
+
+# Recommendation cache in front of NextSongsSuggester
+RECOMMENDATION_CACHE_SIZE = 256
+RECOMMENDATION_CACHE_TTL = 6 * 3600
+RECOMMENDATION_SIMILARITY_THRESHOLD = 0.9  # cosine similarity of the user inputs
+RECOMMENDATION_VARIETY = "sample"  # "replay" the cached answer, or "sample" from the pool
+RECOMMENDATION_REGENERATE_PROBABILITY = 0.2  # chance of refreshing a pool on a hit
+RECOMMENDATION_CACHE_EMBEDDINGS = False  # match reworded requests with OpenAI embeddings
+
+# Local catalog of known tracks, matched before searching Spotify
+CATALOG_PATH = os.path.join(CACHE_DIR, "catalog.tsv")
+CATALOG_MATCH_THRESHOLD = 0.85  # Dice similarity of the title/artist trigrams
+
+# Microphone capture
+CAPTURE_SAMPLE_RATE = 16000  # what Whisper works with; higher rates only add bytes
+CAPTURE_MAX_SECONDS = 60  # ring buffer length, older audio is overwritten
+
+# Voice activity detection: hands-free capture instead of Enter-to-start/stop
+VOICE_ACTIVATION = True
+VAD_FRAME_MS = 30
+VAD_AGGRESSIVENESS = 2  # webrtcvad mode (0-3), used when the package is installed
+VAD_ENERGY_RATIO = 3.0  # speech is this many times louder than the noise floor
+VAD_MUSIC_ENERGY_RATIO = 3.0  # and as many times louder than music playing
+VAD_START_MS = 90  # speech needed to open an utterance
+VAD_HANGOVER_MS = 700  # silence needed to close it
+VAD_PADDING_MS = 200  # audio kept before and after the speech
+VAD_MAX_UTTERANCE_SECONDS = 15
+
+# Speech-to-text: "api" (OpenAI whisper-1), "local" (faster-whisper), or
+# "local+api" to fall back to the API when the local model is unavailable
+STT_BACKEND = os.getenv("DJ_STT_BACKEND", "api")
+STT_LOCAL_MODEL = os.getenv("DJ_STT_LOCAL_MODEL", "base.en")
+STT_LOCAL_COMPUTE_TYPE = "int8"
+STT_LOCAL_THREADS = 4
+
+# Text-to-speech audio cache
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")
+TTS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+TTS_LANG = "en"
+
+# Announcements lower the music to this fraction of its volume while they play
+DUCKING_RATIO = 0.3
+TTS_SYNTHESIS_WORKERS = 2
+
+# Endpoints, overridable to run against stub servers
+SPOTIFY_API_URL = os.getenv("DJ_SPOTIFY_API_URL", "https://api.spotify.com/v1/")
+SPOTIFY_ACCOUNTS_URL = os.getenv("DJ_SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # None: the official API
+
+# Server mode: many listeners, one session each, in one process
+SERVER_HOST = os.getenv("DJ_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("DJ_SERVER_PORT", "8888"))
+SERVER_REDIRECT_URI = os.getenv(
+    "DJ_SERVER_REDIRECT_URI", f"http://localhost:{SERVER_PORT}/callback"
+)
+TOKEN_CACHE_DIR = os.path.join(CACHE_DIR, "tokens")  # one Spotify token file per user
+SERVER_MAX_SESSIONS = 100
+SERVER_LOGIN_TIMEOUT = 600  # seconds to complete a Spotify login
+SERVER_TOKEN_TTL = 30 * 24 * 3600  # seconds an API token issued at login stays valid
+# Signs API tokens; a random secret (the default) logs everyone out on restart
+SERVER_SECRET = os.getenv("DJ_SERVER_SECRET")
+SESSION_MAX_CONCURRENT_REQUESTS = 2  # API calls handled at once for one session
+SESSION_RESOLVE_CONCURRENCY = 4  # track lookups in flight for one session
+
+# Shared HTTP transport (Spotify, OpenAI and text-to-speech)
+HTTP_TIMEOUT = 10.0  # seconds
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.3
+HTTP_POOL_SIZE = 32  # keep-alive connections per host
+TOKEN_REFRESH_MARGIN = 300  # refresh Spotify tokens this many seconds before they expire
+
+# Prompt assembly: token budgets of the variable parts of a recommendation request
+PROMPT_TOKENIZER_MODEL = "gpt-4"
+PROMPT_PROFILE_MAX_TOKENS = 60  # longer taste descriptions are summarized once
+PROMPT_HISTORY_MAX_TOKENS = 150
+PROMPT_INPUT_MAX_TOKENS = 100
+PROFILE_CACHE_PATH = os.path.join(CACHE_DIR, "profiles.json")
+
+# Play history: every song a user has listened to, to never recommend it again
+HISTORY_DIR = os.path.join(CACHE_DIR, "history")  # one file per user
+HISTORY_RECENT_SIZE = 10  # songs shown to the model
+HISTORY_OVERREQUEST = 3  # extra songs asked for, replacing filtered repeats
+
+# Voice commands handled locally instead of by the recommender
+ROUTER_CLASSIFIER = True  # also match close variants of the command patterns
+ROUTER_CLASSIFIER_THRESHOLD = 0.6  # word overlap with an example phrasing
+ROUTER_CLASSIFIER_MAX_WORDS = 6  # longer requests always go to the recommender
+VOLUME_STEP = 15  # percent, for "louder" / "quieter"
+
+# Tracing: spans per pipeline stage, exported as JSON lines and/or to OpenTelemetry
+TRACE_FILE = os.getenv("DJ_TRACE_FILE")  # JSONL path, or None
+TRACE_OTEL = os.getenv("DJ_TRACE_OTEL", "") == "1"
+TRACE_MAX_SAMPLES = 10000  # durations kept per stage for the percentile report
+
+# Speculation: recommendations prepared while a song plays, for the likely next requests
+SPECULATION = True
+SPECULATION_REQUESTS = 2  # likely requests ("more energetic", "calmer") besides the continuation
+SPECULATION_MATCH_THRESHOLD = 0.5  # word overlap of a request with a likely one
+
+# Spotify library sync: saved and top tracks and playlists, for the taste profile and the catalog
+LIBRARY_SYNC = True
+LIBRARY_DIR = os.path.join(CACHE_DIR, "library")  # one SQLite file per user
+LIBRARY_SYNC_INTERVAL = 6 * 3600  # seconds before the library is synced again
+LIBRARY_SYNC_WORKERS = 4  # pages fetched at once
+LIBRARY_SYNC_RETRIES = 3  # for requests answered with 429
+LIBRARY_TOP_ARTISTS = 8  # in the taste summary
+LIBRARY_TOP_GENRES = 6
+LIBRARY_TOP_TRACKS = 5
@@ -1,43 +1,35 @@
+import asyncio
 import threading
-import time
-import sys
-import select
-from chatgpt_handler import NextSongsSuggester
-from spotify_api import SpotifyPlayer
-from voice_interaction import speak_text, listen_user
+from concurrent.futures import ThreadPoolExecutor
+from dj_session import DJSession
+from voice_interaction import (
+    GOODBYE,
+    GREETING,
+    GREETING_WITH_TASTE,
+    INTRO,
+    announce_now_playing,
+    prepare_announcement,
+    presynthesize_phrases,
+    speak_text,
+    speech,
+    transcribe_audio,
+    warm_up,
+)
 import os
 from dotenv import load_dotenv
 
-import sounddevice as sd
-import numpy as np
-import wave
-
-# Shared variables
-recording = False
-audio_frames = []
-sample_rate = 44100
-device_info = sd.query_devices(kind="input")
-max_channels = device_info["max_input_channels"]
-dtype = "int16"
-filename = "output.wav"
-lock = threading.Lock()
-REDIRECT_URI = "http://localhost:8888/callback"
-
-# Global flag for controlling the interaction loop
-is_listening = False
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-
-# Initialize the SpotifyPlayer
-player = SpotifyPlayer(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI)
-
-# Get available devices and select one
-devices = player.get_devices()
-if devices:
-    device_id = devices[0]["id"]  # Select the first available device
-else:
-    print("No devices available.")
-    exit()
+from config import (
+    DUCKING_RATIO,
+    HISTORY_DIR,
+    LIBRARY_DIR,
+    LIBRARY_SYNC,
+    RECOMMENDATION_CACHE_EMBEDDINGS,
+    REDIRECT_URI,
+    VOICE_ACTIVATION,
+)
+
+# Spotify, langchain, numpy and sounddevice are imported by the functions that
+# need them, so that the greeting can play while they load
 
 # Load environment variables
 path = os.path.dirname(os.path.abspath(__file__))
@@ -60,172 +52,248 @@ def read_user_description():
         return ""
 
 
-def audio_callback(indata, frames, time, status):
-    """This callback function is called for each audio block."""
-    with lock:
-        audio_frames.append(indata.copy())
-
-
-def start_recording():
-    """Starts recording audio."""
-    global recording
-    recording = True
-    player.pause(device_id=device_id)
-    print("Recording started. Press Enter to stop.")
-    with sd.InputStream(
-        samplerate=sample_rate,
-        channels=max_channels,
-        dtype=dtype,
-        callback=audio_callback,
-    ):
-        while recording:
-            sd.sleep(100)
-
-
-def stop_recording():
-    """Stops recording audio and saves the file."""
-    global recording
-    recording = False
-    save_audio()
-    print(f"Recording stopped. Audio saved to {filename}")
-
-
-def save_audio():
-    """Saves the recorded audio to a WAV file."""
-    with lock:
-        if audio_frames:
-            np_frames = np.concatenate(audio_frames)
-            with wave.open(filename, "wb") as wf:
-                wf.setnchannels(max_channels)
-                wf.setsampwidth(np.dtype(dtype).itemsize)
-                wf.setframerate(sample_rate)
-                wf.writeframes(np_frames.tobytes())
-        else:
-            print("No audio frames recorded.")
-
-
-def user_interaction_thread(suggester):
+def connect_spotify():
     """
-    Handles user interactions, such as pausing the song and listening for voice prompts.
+    Authenticates with Spotify and picks the first available device.
+
+    Returns:
+        tuple: The SpotifyPlayer and the device ID, or (player, None) if no device is available.
     """
-    global is_listening
-    previous_songs = []
-    current_song = None
+    from http_transport import token_refresher
+    from spotify_api import SpotifyPlayer
 
-    # Read user description from file and set it in the suggester
-    user_description = read_user_description()
-    suggester.user_description = user_description
+    player = SpotifyPlayer(
+        os.getenv("CLIENT_ID"), os.getenv("CLIENT_SECRET"), REDIRECT_URI
+    )
+    # The token is refreshed ahead of expiry instead of on a request
+    token_refresher().register(player.auth_manager)
+    devices = player.get_devices()
+    if not devices:
+        return player, None
+    return player, devices[0]["id"]  # Select the first available device
 
-    # Collect user mood (now only asks for mood)
-    suggester.collect_user_info()
 
-    # Provide a personalized greeting
-    if suggester.user_description:
-        speak_text(
-            f"Hey there! Based on your music taste from spotify, I see what you enjoy. Let's get started!"
-        )
-    else:
-        speak_text("Hey there! I'm excited to build a playlist just for you!")
-
-    # Add a personalized DJ introduction
-    speak_text("Alright, DJ NEA is crafting a playlist just for you. Enjoy!")
-
-    # Get initial song recommendations
-    recommendations = suggester.pipeline(prev_songs=previous_songs)
-    if recommendations:
-        for recommendation in recommendations:
-            try:
-                current_song = recommendation
-                previous_songs.append(current_song)
-                if len(previous_songs) > suggester.past_played_songs_num:
-                    previous_songs.pop(0)
-
-                # Announce and play the new song
-                speak_text(f"Got it! Now playing {current_song}. Hope you enjoy it!")
-                song_artist = (
-                    current_song.replace('"', "").replace("'", "").split(" - ")
-                )
-                print(song_artist)
-                player.play_song([song_artist], device_id)
-                break
-            except Exception as e:
-                print(
-                    f"An error occurred while finding the song: {recommendation}, {e}"
-                )
-                speak_text(f"Sorry, I couldn't find the song. Let's try another.")
-    print("🎧 Your AI DJ is ready and waiting for your commands...")
-
-    while True:
-        input("Press Enter to start recording.")
-        # Start the recording in a separate thread
-        recording_thread = threading.Thread(
-            target=start_recording,
+def voice_capture(recorder, on_speech_start=None, muted=None, music_playing=None):
+    """
+    Hands-free capture: the microphone stays open and every utterance is
+    yielded as soon as it ends.
+
+    Args:
+        recorder (RingBufferRecorder): The recorder to listen through.
+        on_speech_start (Callable, optional): Called when the user starts talking.
+        muted (threading.Event, optional): Set while the DJ speaks, so that it does not hear itself.
+        music_playing (Callable, optional): Tells whether music is playing on the speakers.
+
+    Returns:
+        Callable: Capture function for DJSession.
+    """
+
+    def capture(stop):
+        from vad import VADListener
+
+        listener = VADListener(
+            recorder,
+            on_speech_start=on_speech_start,
+            muted=muted,
+            music_playing=music_playing,
         )
-        recording_thread.start()
-        # Wait for user input to stop recording
-        input()
-        stop_recording()
-        # Wait for the recording thread to finish
-        recording_thread.join()
-        # Use Whisper for voice input processing
-        user_input = listen_user(filename)
-        if user_input:
-            is_listening = True
-
-            if user_input.lower() == "quit":
-                speak_text(
-                    "Goodbye! Thanks for listening with DJ NEA! Catch you next time!"
-                )
-                print("Goodbye! Thanks for listening with your AI DJ!")
-                break
-
-            # Get updated song recommendations based on user input and past songs
-            recommendations = suggester(
-                input_from_user=user_input, prev_songs=previous_songs
-            )
+        print("Listening... just start talking.")
+        for utterance in listener.utterances(stop):
+            # Copied, as the ring buffer is reused while the utterance is transcribed
+            yield utterance.copy(), recorder.sample_rate
+
+    return capture
+
 
-            if recommendations:
-                for recommendation in recommendations:
-                    try:
-                        current_song = recommendation
-                        previous_songs.append(current_song)
-                        if len(previous_songs) > suggester.past_played_songs_num:
-                            previous_songs.pop(0)
-
-                        # Announce and play the new song
-                        speak_text(
-                            f"Got it! Now playing {current_song}. Hope you enjoy it!"
-                        )
-                        song_artist = current_song.split(" - ")
-                        player.play_song([song_artist], device_id)
-                        break
-                    except Exception as e:
-                        print(
-                            f"An error occurred while finding the song: {recommendation}"
-                        )
-                        speak_text(
-                            f"Sorry, I couldn't find the song {recommendation}. Let's try another."
-                        )
-
-            is_listening = False
-
-        time.sleep(0.1)  # Small delay to avoid busy-waiting
-
-
-def start_dj():
+def push_to_talk_capture(recorder, on_speech_start=None):
     """
-    Entry point for starting the AI DJ in the terminal.
+    Capture where recording is started and stopped with Enter.
+
+    Args:
+        recorder (RingBufferRecorder): The recorder to record with.
+        on_speech_start (Callable, optional): Called when recording starts.
+
+    Returns:
+        Callable: Capture function for DJSession.
     """
-    suggester = NextSongsSuggester(n_recommendations=5, past_played_songs_num=10)
 
-    interaction_thread = threading.Thread(
-        target=user_interaction_thread, args=(suggester,), daemon=True
+    def capture(stop):
+        import sounddevice as sd
+
+        while not stop.is_set():
+            input("Press Enter to start recording.")
+            if stop.is_set():
+                return
+            recorder.reset()
+            if on_speech_start:
+                on_speech_start()
+            recording = threading.Event()
+            recording.set()
+
+            def record():
+                with recorder.stream():
+                    while recording.is_set():
+                        sd.sleep(100)
+
+            # Record in a separate thread until the user presses Enter again
+            recording_thread = threading.Thread(target=record)
+            recording_thread.start()
+            print("Recording started. Press Enter to stop.")
+            input()
+            recording.clear()
+            recording_thread.join()
+            print(f"Recording stopped ({recorder.duration():.1f}s of audio).")
+            yield recorder.view().copy(), recorder.sample_rate
+
+    return capture
+
+
+def ask_mood() -> str:
+    """
+    Asks the user about their current mood, like NextSongsSuggester.collect_user_info
+    but without waiting for langchain to load.
+
+    Returns:
+        str: The mood, lowercased.
+    """
+    print("🎧 Hello! I'm your AI DJ. Let's get started.")
+    mood = input("How are you feeling today? (e.g., happy, sad, energetic): ").strip().lower()
+    print("Great! I'll tailor your music experience based on your mood. 🎶")
+    return mood
+
+
+def make_suggester():
+    """Builds the song suggester (importing langchain takes a while)."""
+    from chatgpt_handler import NextSongsSuggester
+    from play_history import PlayHistory
+    from recommendation_cache import RecommendationCache
+
+    embed = None
+    if RECOMMENDATION_CACHE_EMBEDDINGS:
+        from langchain_openai import OpenAIEmbeddings
+
+        embed = OpenAIEmbeddings().embed_query
+    return NextSongsSuggester(
+        n_recommendations=5,
+        past_played_songs_num=10,
+        cache=RecommendationCache(embed=embed),
+        fold_mood=True,
+        # Songs played in earlier sessions are not recommended again
+        history=PlayHistory(os.path.join(HISTORY_DIR, "local.tsv")),
     )
-    interaction_thread.start()
 
+
+def start_dj(profile=False):
+    """
+    Entry point for starting the AI DJ in the terminal.
+
+    Args:
+        profile (bool): Print p50/p95 latencies per pipeline stage when the session ends.
+    """
+    # Stock announcements are synthesized while the user answers the mood question
+    presynthesize_phrases()
+
+    # Provide a personalized greeting right away, while the clients warm up
+    user_description = read_user_description()
+    library_path = os.path.join(LIBRARY_DIR, "local.sqlite3")
+    knows_taste = user_description or (LIBRARY_SYNC and os.path.exists(library_path))
+    speak_text(GREETING_WITH_TASTE if knows_taste else GREETING)
+
+    warm_up()
+    with ThreadPoolExecutor(max_workers=2) as startup:
+        spotify = startup.submit(connect_spotify)
+        pending_suggester = startup.submit(make_suggester)
+
+        # Collect user mood (now only asks for mood) while the clients load
+        mood = ask_mood()
+        suggester = pending_suggester.result()
+        suggester.mood = mood
+
+        # The description from the settings file, with the taste summary of
+        # the last Spotify library sync
+        library = None
+        suggester.user_description = user_description
+        if LIBRARY_SYNC:
+            from library_sync import LibraryStore, describe_taste
+
+            library = LibraryStore(library_path)
+            suggester.user_description = describe_taste(
+                user_description, library.taste_summary()
+            )
+
+        player, device_id = spotify.result()
+    if device_id is None:
+        print("No devices available.")
+        return
+
+    if library is not None:
+        # Refreshed in the background: new library tracks resolve locally, and
+        # the summary is updated for the next recommendations
+        from library_sync import sync_in_background
+
+        def on_synced(summary):
+            suggester.user_description = describe_taste(user_description, summary)
+
+        sync_in_background(player.sp, library, catalog=player.catalog, on_synced=on_synced)
+
+    # Music is turned down while the DJ speaks
+    from volume_ducker import VolumeDucker
+
+    ducker = VolumeDucker(player, device_id, ratio=DUCKING_RATIO)
+    # The microphone ignores the DJ's own announcements
+    speaking = threading.Event()
+
+    def on_announcement_start():
+        speaking.set()
+        ducker.duck()
+
+    def on_announcement_end():
+        ducker.restore()
+        speaking.clear()
+
+    speech.on_start = on_announcement_start
+    speech.on_end = on_announcement_end
+
+    # Mono 16 kHz capture into a preallocated buffer, reused for every command
+    from audio_capture import RingBufferRecorder
+
+    recorder = RingBufferRecorder()
+
+    def on_speech_start():
+        player.pause(device_id=device_id)
+        # Songs prepared ahead are no longer worth the wait once the user speaks
+        session.interrupt()
+
+    if VOICE_ACTIVATION:
+        capture = voice_capture(
+            recorder,
+            on_speech_start=on_speech_start,
+            muted=speaking,
+            music_playing=lambda: player.playing,
+        )
+    else:
+        capture = push_to_talk_capture(recorder, on_speech_start=on_speech_start)
+
+    session = DJSession(
+        player,
+        suggester,
+        device_id,
+        capture=capture,
+        transcribe=transcribe_audio,
+        speak=speak_text,
+        announce=announce_now_playing,
+        prepare_announcement=prepare_announcement,
+        # Add a personalized DJ introduction
+        greeting=[INTRO],
+        goodbye=GOODBYE,
+    )
     print(
-        "🎧 Your AI DJ is ready and waiting for your commands... Type your requests or 'quit' to exit."
+        "🎧 Your AI DJ is ready and waiting for your commands... Say 'quit' to exit."
     )
-    interaction_thread.join()
+    asyncio.run(session.run())
+
+    if profile:
+        from tracing import tracer
 
+        print(tracer.summary())
     print("DJ session has ended. Goodbye!")
@@ -0,0 +1,432 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+import uuid
+from typing import Dict, Optional, Set, Tuple
+
+from catalog_index import CatalogIndex
+from chatgpt_handler import NextSongsSuggester, make_chat_models
+from config import (
+    HISTORY_DIR,
+    LIBRARY_DIR,
+    LIBRARY_SYNC,
+    SERVER_HOST,
+    SERVER_LOGIN_TIMEOUT,
+    SERVER_MAX_SESSIONS,
+    SERVER_PORT,
+    SERVER_REDIRECT_URI,
+    SERVER_SECRET,
+    SERVER_TOKEN_TTL,
+    SESSION_MAX_CONCURRENT_REQUESTS,
+    SESSION_RESOLVE_CONCURRENCY,
+    SPOTIFY_API_URL,
+    SPOTIFY_REQUESTS_BURST,
+    SPOTIFY_REQUESTS_PER_SECOND,
+    TOKEN_CACHE_DIR,
+)
+from dj_session import DJSession
+from library_sync import LibraryStore, describe_taste, sync_in_background
+from play_history import PlayHistory
+from prompt_builder import ProfileStore
+from http_transport import token_refresher
+from recommendation_cache import RecommendationCache
+from spotify_api import SpotifyPlayer, make_auth_manager
+from track_cache import TrackCache
+from track_resolver import TokenBucket
+
+try:
+    from aiohttp import WSMsgType, web
+except ImportError:  # only needed in server mode
+    web = None
+
+_USER_ID = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+_STATE_COOKIE = "dj_login_state"
+_TOKEN_COOKIE = "dj_token"
+
+
+class ServerSession:
+    """One listener's DJ session, plus the clients following its events."""
+
+    def __init__(self, session_id: str, user_id: str, player, device_id: str) -> None:
+        self.session_id = session_id
+        self.user_id = user_id
+        self.player = player
+        self.device_id = device_id
+        self.dj: Optional[DJSession] = None
+        self.task: Optional[asyncio.Task] = None
+        # Caps the API calls one listener can have in flight at once
+        self.semaphore = asyncio.Semaphore(SESSION_MAX_CONCURRENT_REQUESTS)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.now_playing: Optional[str] = None
+        self._loop = asyncio.get_running_loop()
+
+    def publish(self, event: dict) -> None:
+        """Sends an event to every subscriber. Safe to call from any thread."""
+        self._loop.call_soon_threadsafe(self._broadcast, event)
+
+    def _broadcast(self, event: dict) -> None:
+        if event["type"] == "now_playing":
+            self.now_playing = event["song"]
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(event)
+
+    def describe(self) -> dict:
+        return {
+            "session": self.session_id,
+            "user": self.user_id,
+            "device": self.device_id,
+            "now_playing": self.now_playing,
+            "history": list(self.dj.history) if self.dj else [],
+        }
+
+
+class DJServer:
+    """
+    Local HTTP/WebSocket API hosting many DJ sessions in one process.
+
+    Every listener authorizes Spotify once (their token is kept in its own
+    file under TOKEN_CACHE_DIR) and then gets a session with its own
+    suggester, player and device. The callback issues a signed API token,
+    set as a cookie and shown to the user; the session routes require it
+    (cookie or "Authorization: Bearer <token>") and only serve the sessions
+    of the user it was issued to. The LLM clients, track cache, catalog,
+    recommendation cache and Spotify rate limit are shared by all sessions.
+
+    Routes:
+        GET    /login?user=<id>              Redirects to Spotify's authorization page.
+        GET    /callback                     OAuth redirect target.
+        POST   /sessions                     {"device"?, "mood"?, "description"?}
+        GET    /sessions/{session}           Session state.
+        POST   /sessions/{session}/commands  {"text"}
+        DELETE /sessions/{session}           Ends the session.
+        GET    /sessions/{session}/events    WebSocket of events; text messages are commands.
+    """
+
+    def __init__(
+        self,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        redirect_uri: str = SERVER_REDIRECT_URI,
+        token_dir: str = TOKEN_CACHE_DIR,
+        max_sessions: int = SERVER_MAX_SESSIONS,
+        secret: Optional[str] = SERVER_SECRET,
+        api_url: str = SPOTIFY_API_URL,
+    ) -> None:
+        if web is None:
+            raise RuntimeError("aiohttp is required to run the DJ server")
+        self.client_id = client_id or os.getenv("CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("CLIENT_SECRET")
+        self.redirect_uri = redirect_uri
+        self.token_dir = token_dir
+        self.max_sessions = max_sessions
+        self.api_url = api_url
+        self._secret = secret.encode("utf-8") if secret else secrets.token_bytes(32)
+        os.makedirs(token_dir, exist_ok=True)
+
+        # Shared by every session
+        self.track_cache = TrackCache()
+        self.catalog = CatalogIndex()
+        self.bucket = TokenBucket(SPOTIFY_REQUESTS_PER_SECOND, SPOTIFY_REQUESTS_BURST)
+        self.chat_model, self.mood_model = make_chat_models()
+        self.recommendation_cache = RecommendationCache()
+        self.profiles = ProfileStore(
+            summarize=lambda prompt: self.mood_model.invoke(prompt).content
+        )
+
+        self.sessions: Dict[str, ServerSession] = {}
+        # Sessions being created, counted against max_sessions
+        self._starting = 0
+        self._sessions_lock = asyncio.Lock()
+        # OAuth state of the logins in progress: nonce -> (user_id, expiry)
+        self._logins: Dict[str, Tuple[str, float]] = {}
+        # Spotify libraries of the users with a session, one SQLite file each
+        self.libraries: Dict[str, LibraryStore] = {}
+
+    # Helpers
+
+    def _library(self, user_id: str) -> LibraryStore:
+        if user_id not in self.libraries:
+            self.libraries[user_id] = LibraryStore(
+                os.path.join(LIBRARY_DIR, f"{user_id}.sqlite3")
+            )
+        return self.libraries[user_id]
+
+    def _auth_manager(self, user_id: str):
+        return make_auth_manager(
+            self.client_id,
+            self.client_secret,
+            self.redirect_uri,
+            cache_path=os.path.join(self.token_dir, f"{user_id}.json"),
+            open_browser=False,
+        )
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _issue_token(self, user_id: str) -> str:
+        payload = f"{user_id}.{int(time.time()) + SERVER_TOKEN_TTL}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def _authenticated_user(self, request) -> str:
+        header = request.headers.get("Authorization", "")
+        token = header[7:] if header.startswith("Bearer ") else request.cookies.get(_TOKEN_COOKIE, "")
+        payload, _, signature = token.rpartition(".")
+        user_id, _, expiry = payload.rpartition(".")
+        if (
+            not hmac.compare_digest(signature.encode("utf-8"), self._sign(payload).encode("utf-8"))
+            or not expiry.isdigit()
+            or int(expiry) < time.time()
+            or not _USER_ID.fullmatch(user_id)
+        ):
+            raise web.HTTPUnauthorized(text="Log in at /login?user=<id> first")
+        return user_id
+
+    def _session(self, request) -> ServerSession:
+        user_id = self._authenticated_user(request)
+        session = self.sessions.get(request.match_info["session"])
+        # Sessions of other users are not revealed
+        if session is None or session.user_id != user_id:
+            raise web.HTTPNotFound(text="Unknown session")
+        return session
+
+    @staticmethod
+    def _user_id(value) -> str:
+        if not isinstance(value, str) or not _USER_ID.fullmatch(value):
+            raise web.HTTPBadRequest(text="Invalid user")
+        return value
+
+    def _connect(self, user_id: str, device_id: Optional[str]):
+        """Blocking: builds the user's player and picks their device."""
+        auth_manager = self._auth_manager(user_id)
+        token = auth_manager.validate_token(auth_manager.cache_handler.get_cached_token())
+        if not token:
+            return None, None
+        player = SpotifyPlayer(
+            self.client_id,
+            self.client_secret,
+            self.redirect_uri,
+            track_cache=self.track_cache,
+            catalog=self.catalog,
+            auth_manager=auth_manager,
+            bucket=self.bucket,
+            api_url=self.api_url,
+        )
+        token_refresher().register(auth_manager)
+        devices = player.get_devices()
+        if device_id is None and devices:
+            device_id = devices[0]["id"]
+        if device_id not in {device["id"] for device in devices}:
+            device_id = None
+        return player, device_id
+
+    # Handlers
+
+    async def login(self, request):
+        user_id = self._user_id(request.query.get("user"))
+        now = time.monotonic()
+        self._logins = {n: login for n, login in self._logins.items() if login[1] > now}
+        # A random state, also set in the browser, so that a callback only
+        # completes the login this browser started
+        nonce = secrets.token_urlsafe(24)
+        self._logins[nonce] = (user_id, now + SERVER_LOGIN_TIMEOUT)
+        redirect = web.HTTPFound(self._auth_manager(user_id).get_authorize_url(state=nonce))
+        redirect.set_cookie(
+            _STATE_COOKIE, nonce, max_age=SERVER_LOGIN_TIMEOUT, httponly=True, samesite="Lax"
+        )
+        raise redirect
+
+    async def callback(self, request):
+        nonce = request.query.get("state")
+        login = self._logins.pop(nonce, None) if isinstance(nonce, str) else None
+        if (
+            login is None
+            or login[1] <= time.monotonic()
+            or not secrets.compare_digest(
+                nonce.encode("utf-8"), request.cookies.get(_STATE_COOKIE, "").encode("utf-8")
+            )
+        ):
+            raise web.HTTPBadRequest(text="Invalid or expired login, please log in again")
+        user_id = login[0]
+        code = request.query.get("code")
+        if not code:
+            raise web.HTTPBadRequest(text=request.query.get("error", "Missing code"))
+        auth_manager = self._auth_manager(user_id)
+        await asyncio.to_thread(auth_manager.get_access_token, code, check_cache=False)
+        token = self._issue_token(user_id)
+        response = web.Response(
+            text="Spotify connected, you can close this window.\n"
+            f"API token (Authorization: Bearer ...): {token}"
+        )
+        response.set_cookie(
+            _TOKEN_COOKIE, token, max_age=SERVER_TOKEN_TTL, httponly=True, samesite="Strict"
+        )
+        response.del_cookie(_STATE_COOKIE)
+        return response
+
+    async def create_session(self, request):
+        user_id = self._authenticated_user(request)
+        body = await request.json()
+        if body.get("user", user_id) != user_id:
+            raise web.HTTPForbidden(text="The API token belongs to another user")
+        async with self._sessions_lock:
+            if len(self.sessions) + self._starting >= self.max_sessions:
+                raise web.HTTPServiceUnavailable(text="Too many sessions")
+            self._starting += 1
+        try:
+            return await self._start_session(user_id, body)
+        finally:
+            async with self._sessions_lock:
+                self._starting -= 1
+
+    async def _start_session(self, user_id: str, body: dict):
+        player, device_id = await asyncio.to_thread(
+            self._connect, user_id, body.get("device")
+        )
+        if player is None:
+            return web.json_response(
+                {"error": "not_authorized", "login": f"/login?user={user_id}"},
+                status=401,
+            )
+        if device_id is None:
+            token_refresher().unregister(player.auth_manager)
+            await asyncio.to_thread(player.resolver.shutdown)
+            return web.json_response({"error": "no_device"}, status=409)
+
+        suggester = NextSongsSuggester(
+            n_recommendations=5,
+            past_played_songs_num=10,
+            cache=self.recommendation_cache,
+            fold_mood=True,
+            chat_model=self.chat_model,
+            mood_model=self.mood_model,
+            profiles=self.profiles,
+            history=PlayHistory(os.path.join(HISTORY_DIR, f"{user_id}.tsv")),
+        )
+        description = body.get("description", "")
+        suggester.user_description = description
+        if LIBRARY_SYNC:
+            # The last synced taste summary now, a fresh one once the sync is done
+            library = self._library(user_id)
+            suggester.user_description = describe_taste(description, library.taste_summary())
+
+            def on_synced(summary):
+                suggester.user_description = describe_taste(description, summary)
+
+            sync_in_background(player.sp, library, catalog=self.catalog, on_synced=on_synced)
+        suggester.mood = body.get("mood", "").strip().lower()
+
+        session = ServerSession(uuid.uuid4().hex, user_id, player, device_id)
+        session.dj = DJSession(
+            player,
+            suggester,
+            device_id,
+            announce=lambda song: session.publish(
+                {"type": "now_playing", "song": str(song)}
+            ),
+            prepare_announcement=lambda song: session.publish(
+                {"type": "queued", "song": str(song)}
+            ),
+            resolve_concurrency=SESSION_RESOLVE_CONCURRENCY,
+        )
+        self.sessions[session.session_id] = session
+        session.task = asyncio.create_task(self._run(session))
+        return web.json_response(session.describe(), status=201)
+
+    async def _run(self, session: ServerSession) -> None:
+        try:
+            await session.dj.run()
+        except Exception as e:
+            print(f"Session {session.session_id} failed: {e}")
+        finally:
+            self.sessions.pop(session.session_id, None)
+            token_refresher().unregister(session.player.auth_manager)
+            await asyncio.to_thread(session.player.resolver.shutdown)
+            session.publish({"type": "ended"})
+
+    async def get_session(self, request):
+        return web.json_response(self._session(request).describe())
+
+    async def command(self, request):
+        session = self._session(request)
+        if session.semaphore.locked():
+            raise web.HTTPTooManyRequests(text="Too many requests for this session")
+        async with session.semaphore:
+            body = await request.json()
+            text = body.get("text", "").strip()
+            if not text:
+                raise web.HTTPBadRequest(text="Missing text")
+            await session.dj.command(text)
+        return web.json_response({"accepted": text}, status=202)
+
+    async def end_session(self, request):
+        session = self._session(request)
+        await session.dj.stop()
+        await session.task
+        return web.json_response({"ended": session.session_id})
+
+    async def events(self, request):
+        session = self._session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        events: asyncio.Queue = asyncio.Queue()
+        session.subscribers.add(events)
+
+        async def forward():
+            while True:
+                event = await events.get()
+                await ws.send_json(event)
+                if event["type"] == "ended":
+                    await ws.close()
+                    return
+
+        sender = asyncio.create_task(forward())
+        try:
+            await ws.send_json({"type": "state", **session.describe()})
+            async for message in ws:
+                if message.type != WSMsgType.TEXT or not message.data.strip():
+                    continue
+                async with session.semaphore:
+                    await session.dj.command(message.data.strip())
+        finally:
+            session.subscribers.discard(events)
+            sender.cancel()
+        return ws
+
+    async def _shutdown(self, app) -> None:
+        for session in list(self.sessions.values()):
+            await session.dj.stop()
+        await asyncio.gather(
+            *(session.task for session in list(self.sessions.values())),
+            return_exceptions=True,
+        )
+        self.track_cache.close()
+        for library in self.libraries.values():
+            library.close()
+
+    def make_app(self):
+        """Builds the aiohttp application."""
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/login", self.login),
+                web.get("/callback", self.callback),
+                web.post("/sessions", self.create_session),
+                web.get("/sessions/{session}", self.get_session),
+                web.post("/sessions/{session}/commands", self.command),
+                web.delete("/sessions/{session}", self.end_session),
+                web.get("/sessions/{session}/events", self.events),
+            ]
+        )
+        app.on_shutdown.append(self._shutdown)
+        return app
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+    """Runs the DJ server until interrupted."""
+    server = DJServer()
+    print(f"🎧 DJ server listening on http://{host}:{port}")
+    web.run_app(server.make_app(), host=host, port=port, print=None)
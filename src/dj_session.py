@@ -0,0 +1,471 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterator, List, Optional
+
+from config import ROUTER_CLASSIFIER, SPECULATION, VOLUME_STEP
+from intent_router import (
+    LOUDER,
+    MORE_LIKE_THIS,
+    PAUSE,
+    QUIETER,
+    QUIT,
+    RESUME,
+    SET_VOLUME,
+    SKIP,
+    WHATS_PLAYING,
+    Intent,
+    IntentRouter,
+    KeywordClassifier,
+)
+from playback_queue import PlaybackQueue
+from speculator import Speculator
+from tracing import tracer
+
+
+def _settle(future: asyncio.Future, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class DJSession:
+    """
+    asyncio engine running one DJ session as a pipeline of stages:
+
+        capture -> transcribe -> recommend -> resolve -> play -> announce
+
+    Stages are coroutines connected by bounded asyncio queues, and blocking
+    work (microphone, Whisper, the LLM stream, Spotify calls) runs in worker
+    threads. A new command cancels the recommendation in flight and drops
+    whatever older songs are still waiting in the downstream queues, so the
+    user never waits behind a request they have already replaced. While
+    nothing is asked, a speculator prepares the likely next batches, which
+    is cancelled as soon as the user speaks.
+
+    Nothing is global: a process can run several sessions side by side.
+    """
+
+    def __init__(
+        self,
+        player,
+        suggester,
+        device_id: Optional[str] = None,
+        capture: Optional[Callable[[threading.Event], Iterator]] = None,
+        transcribe: Optional[Callable] = None,
+        speak: Optional[Callable[[str], object]] = None,
+        announce: Optional[Callable[[object], object]] = None,
+        prepare_announcement: Optional[Callable[[object], object]] = None,
+        greeting: Optional[List[str]] = None,
+        goodbye: Optional[str] = None,
+        low_water: Optional[int] = None,
+        queue_size: int = 8,
+        resolve_concurrency: int = 4,
+        poll_interval: Optional[float] = None,
+        router: Optional[IntentRouter] = None,
+        speculator: Optional[Speculator] = None,
+    ) -> None:
+        """
+        Args:
+            player (SpotifyPlayer): Resolves and plays tracks.
+            suggester (NextSongsSuggester): Recommends songs.
+            device_id (str, optional): The Spotify device to play on.
+            capture (Callable, optional): Given a stop event, yields (samples, sample_rate) utterances.
+                Without it, commands only come from submit().
+            transcribe (Callable, optional): Turns (samples, sample_rate) into text.
+            speak (Callable, optional): Says a phrase without blocking.
+            announce (Callable, optional): Says "now playing" for a song without blocking.
+            prepare_announcement (Callable, optional): Prefetches the announcement of a queued song.
+            greeting (List[str], optional): Phrases said when the session starts.
+            goodbye (str, optional): Phrase said when the session ends.
+            low_water (int, optional): Ask for more songs when fewer are queued (PlaybackQueue default if None).
+            queue_size (int): Capacity of the queues between stages.
+            resolve_concurrency (int): Track lookups in flight at once.
+            poll_interval (float, optional): Seconds between playback checks (PlaybackQueue default if None).
+            router (IntentRouter, optional): Recognizes playback commands, which are handled
+                without asking the recommender.
+            speculator (Speculator, optional): Prepares likely requests while the session is idle
+                (one is made if SPECULATION is set).
+        """
+        self.player = player
+        self.suggester = suggester
+        self.device_id = device_id
+        self.capture = capture
+        self.transcribe = transcribe
+        self.speak = speak
+        self.announce = announce
+        self.greeting = greeting or []
+        self.goodbye = goodbye
+        self.queue_size = queue_size
+        self.resolve_concurrency = resolve_concurrency
+        self.router = router or IntentRouter(
+            KeywordClassifier() if ROUTER_CLASSIFIER else None
+        )
+        self.speculator = speculator or (
+            Speculator(suggester, player) if SPECULATION else None
+        )
+
+        queue_options = {}
+        if low_water is not None:
+            queue_options["low_water"] = low_water
+        if poll_interval is not None:
+            queue_options["poll_interval"] = poll_interval
+        self.queue = PlaybackQueue(
+            player,
+            device_id,
+            on_now_playing=self._on_now_playing,
+            on_queued=prepare_announcement,
+            **queue_options,
+        )
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._recommendation: Optional[asyncio.Task] = None
+        self._cancel_recommendation: Optional[threading.Event] = None
+        self._speculation: Optional[asyncio.Future] = None
+        self._cancel_speculation: Optional[threading.Event] = None
+        self._capture_stop = threading.Event()
+        self._stopped: Optional[asyncio.Event] = None
+        self._stop_requested = False
+        self._started_generations = set()
+        # When each batch was requested, to measure the time until its music starts
+        self._requested_at = {}
+
+    # Public API
+
+    async def run(self) -> None:
+        """Runs the session until a quit command or stop()."""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if self._stop_requested:
+            self._stopped.set()
+        self._utterances: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._commands: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._songs: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._resolved: asyncio.Queue = asyncio.Queue(self.resolve_concurrency)
+        self._announcements: asyncio.Queue = asyncio.Queue()
+
+        stages = [
+            self._transcribe_stage(),
+            self._command_stage(),
+            self._resolve_stage(),
+            self._play_stage(),
+            self._announce_stage(),
+            self._refill_stage(),
+        ]
+        if self.capture is not None:
+            stages.append(self._capture_stage())
+        self._tasks = [asyncio.create_task(stage) for stage in stages]
+        self.queue.start()
+
+        for phrase in self.greeting:
+            self._say(phrase)
+        self._start_recommendation("", start=True)
+
+        try:
+            await self._stopped.wait()
+        finally:
+            await self._shutdown()
+
+    @property
+    def history(self) -> List[str]:
+        """The recently played songs, oldest first."""
+        return self.suggester.history.recent()
+
+    async def command(self, text: str) -> None:
+        """Handles a text command as if it had been spoken."""
+        await self._commands.put(text)
+
+    def submit(self, text: str) -> None:
+        """Thread-safe variant of command()."""
+        asyncio.run_coroutine_threadsafe(self.command(text), self._loop)
+
+    def interrupt(self) -> None:
+        """Thread-safe: cancels speculation in flight, e.g. when the user starts talking."""
+        if self._cancel_speculation is not None:
+            self._cancel_speculation.set()
+
+    async def stop(self) -> None:
+        """Ends the session."""
+        self._stop_requested = True
+        if self._stopped is not None:
+            self._stopped.set()
+
+    # Stages
+
+    async def _capture_stage(self) -> None:
+        def capture():
+            for utterance in self.capture(self._capture_stop):
+                # Blocks the capture thread while the transcriber is behind
+                asyncio.run_coroutine_threadsafe(
+                    self._utterances.put(utterance), self._loop
+                ).result()
+
+        await self._in_thread(capture)
+
+    async def _transcribe_stage(self) -> None:
+        while True:
+            samples, sample_rate = await self._utterances.get()
+            self.interrupt()
+            try:
+                text = await asyncio.to_thread(self.transcribe, samples, sample_rate)
+            except Exception as e:
+                print(f"An error occurred while transcribing: {e}")
+                text = ""
+            if text:
+                await self._commands.put(text)
+                continue
+            # Noise, not a command: let the music go on
+            try:
+                await asyncio.to_thread(self.player.resume, self.device_id)
+            except Exception as e:
+                print(f"An error occurred while resuming playback: {e}")
+
+    async def _command_stage(self) -> None:
+        while True:
+            text = await self._commands.get()
+            self.interrupt()
+            intent = self.router.route(text)
+            if intent is None:
+                # Open-ended request: only these need the recommender
+                self._start_recommendation(text, start=True)
+            elif intent.name == QUIT:
+                if self.goodbye:
+                    try:
+                        await asyncio.wrap_future(self._say(self.goodbye))
+                    except Exception:
+                        pass  # already reported by the speech worker
+                self._stopped.set()
+                return
+            else:
+                try:
+                    with tracer.span("session.control", intent=intent.name):
+                        await asyncio.to_thread(self._control, intent)
+                except Exception as e:
+                    print(f"An error occurred while handling '{text}': {e}")
+
+    async def _resolve_stage(self) -> None:
+        while True:
+            generation, song = await self._songs.get()
+            if generation != self.queue.generation:
+                continue
+            lookup = asyncio.create_task(
+                asyncio.to_thread(
+                    self.player.get_track_uris, [(song.song_name, song.artist)]
+                )
+            )
+            # The bounded queue caps lookups in flight and keeps their order
+            await self._resolved.put((generation, song, lookup))
+
+    async def _play_stage(self) -> None:
+        while True:
+            generation, song, lookup = await self._resolved.get()
+            try:
+                uri = (await lookup)[0]
+            except Exception as e:
+                print(f"An error occurred while finding the song: {song}, {e}")
+                continue
+            if uri is None or generation != self.queue.generation:
+                continue
+            start = generation not in self._started_generations
+            try:
+                pushed = await asyncio.to_thread(
+                    self.queue.push, song, uri, generation, start
+                )
+            except Exception as e:
+                # The next song of the batch tries again (e.g. once a device is active)
+                print(f"An error occurred while playing the song: {song}, {e}")
+                continue
+            if pushed:
+                # Not suggested again this session (discarded suggestions may be)
+                self.suggester.record_played(song)
+            if pushed and start:
+                self._started_generations.add(generation)
+                requested_at = self._requested_at.pop(generation, None)
+                if requested_at is not None:
+                    tracer.record("session.time_to_music", time.perf_counter() - requested_at)
+
+    async def _announce_stage(self) -> None:
+        while True:
+            song = await self._announcements.get()
+            # Recorded in the user's play history, so it is never suggested again
+            self.suggester.history.add(song)
+            if self.announce is not None:
+                self.announce(song)
+
+    async def _refill_stage(self) -> None:
+        while True:
+            await asyncio.sleep(self.queue.poll_interval)
+            idle = (
+                self._recommendation is not None
+                and self._recommendation.done()
+                and self._songs.empty()
+                and self._resolved.empty()
+            )
+            started = self.queue.generation in self._started_generations
+            speculating = self._speculation is not None and not self._speculation.done()
+            if not (idle and started) or speculating:
+                continue
+            if self.queue.remaining() < self.queue.low_water:
+                self._start_recommendation("", start=False)
+            else:
+                self._start_speculation()
+
+    # Helpers
+
+    def _control(self, intent: Intent) -> None:
+        """Blocking: carries out a playback command."""
+        player, device_id = self.player, self.device_id
+        if intent.name == MORE_LIKE_THIS:
+            song = self.queue.now_playing() or self._current_track()
+            request = f"More songs like {song}" if song else "More songs like these"
+            self._loop.call_soon_threadsafe(self._start_recommendation, request, True)
+            return
+        if intent.name == SKIP:
+            player.next_track(device_id=device_id)
+            return
+        if intent.name == PAUSE:
+            player.pause(device_id=device_id)
+            return
+
+        if intent.name in (LOUDER, QUIETER, SET_VOLUME):
+            volume = intent.value
+            if volume is None:
+                step = VOLUME_STEP if intent.name == LOUDER else -VOLUME_STEP
+                volume = max(0, min(100, (player.get_volume() or 50) + step))
+            player.set_volume(volume, device_id=device_id)
+        elif intent.name == WHATS_PLAYING:
+            song = self.queue.now_playing() or self._current_track()
+            if song and self.announce is not None:
+                self.announce(song)
+        # The music was paused when the user started talking (RESUME lands here too)
+        if self.capture is not None or intent.name == RESUME:
+            player.resume(device_id=device_id)
+
+    def _current_track(self) -> Optional[str]:
+        playback = self.player.get_current_track()
+        track = playback.get("item") if playback else None
+        if not track:
+            return None
+        artists = ", ".join(artist["name"] for artist in track.get("artists", []))
+        return f"{track['name']} - {artists}" if artists else track["name"]
+
+    def _say(self, text: str) -> Future:
+        if self.speak is None:
+            done: Future = Future()
+            done.set_result(None)
+            return done
+        return self.speak(text)
+
+    def _in_thread(self, target: Callable[[], None]) -> asyncio.Future:
+        # Daemon thread rather than the default executor: capture and the LLM
+        # stream may block for a long time and must not hold up interpreter exit
+        done = self._loop.create_future()
+
+        def run():
+            error = None
+            try:
+                target()
+            except BaseException as e:
+                error = e
+            try:
+                self._loop.call_soon_threadsafe(_settle, done, error)
+            except RuntimeError:
+                pass  # the session has ended and its loop is closed
+
+        threading.Thread(target=run, daemon=True).start()
+        return done
+
+    def _on_now_playing(self, song) -> None:
+        # Called from the playback queue's monitor thread
+        self._loop.call_soon_threadsafe(self._announcements.put_nowait, song)
+
+    def _start_speculation(self) -> None:
+        generation = self.queue.generation
+        if self.speculator is None or not self.speculator.pending(generation):
+            return
+        cancel = threading.Event()
+        self._cancel_speculation = cancel
+        self._speculation = self._in_thread(
+            lambda: self.speculator.prepare_next(generation, cancel)
+        )
+
+    def _start_recommendation(self, text: str, start: bool) -> None:
+        # A request prepared while the session was idle is served right away
+        staged = None
+        if self.speculator is not None:
+            staged = self.speculator.take(text, self.queue.generation)
+        if start:
+            # Preempt the request in flight and anything it already produced
+            if self._cancel_recommendation is not None:
+                self._cancel_recommendation.set()
+            if self._recommendation is not None:
+                self._recommendation.cancel()
+            generation = self.queue.new_batch()
+            self._requested_at[generation] = time.perf_counter()
+            for pending in (self._songs, self._resolved):
+                while not pending.empty():
+                    pending.get_nowait()
+        else:
+            generation = self.queue.generation
+
+        if staged:
+            self._cancel_recommendation = None
+            self._recommendation = asyncio.create_task(
+                self._serve_staged(generation, staged)
+            )
+            return
+        cancel = threading.Event()
+        self._cancel_recommendation = cancel
+        self._recommendation = asyncio.create_task(
+            self._recommend(text, generation, cancel)
+        )
+
+    async def _serve_staged(self, generation: int, tracks) -> None:
+        # Already resolved: straight to the play stage
+        for song, uri in tracks:
+            lookup = self._loop.create_future()
+            lookup.set_result([uri])
+            await self._resolved.put((generation, song, lookup))
+
+    async def _recommend(self, text: str, generation: int, cancel: threading.Event) -> None:
+        history = self.history
+
+        def stream():
+            songs = self.suggester.pipeline_stream(
+                input_from_user=text, prev_songs=history, on_mood=self.suggester.set_mood
+            )
+            try:
+                for song in songs:
+                    if cancel.is_set():
+                        return
+                    asyncio.run_coroutine_threadsafe(
+                        self._songs.put((generation, song)), self._loop
+                    ).result()
+            finally:
+                songs.close()
+
+        try:
+            await self._in_thread(stream)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        except Exception as e:
+            print(f"An error occurred while getting recommendations: {e}")
+
+    async def _shutdown(self) -> None:
+        self._capture_stop.set()
+        self.interrupt()
+        if self._cancel_recommendation is not None:
+            self._cancel_recommendation.set()
+        for task in self._tasks + [self._recommendation]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(t for t in self._tasks if t is not None), return_exceptions=True
+        )
+        self.queue.stop()
@@ -0,0 +1,215 @@
+import base64
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (
+    HTTP_BACKOFF,
+    HTTP_POOL_SIZE,
+    HTTP_RETRIES,
+    HTTP_TIMEOUT,
+    TOKEN_REFRESH_MARGIN,
+)
+
+try:
+    import h2  # noqa: F401  # enables HTTP/2 in httpx
+except ImportError:
+    h2 = None
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_http_client = None
+
+# gtts_stream copies gTTS.stream (see tests/test_http_transport.py): other
+# gTTS releases use gTTS.stream itself
+_GTTS_TESTED_VERSIONS = ("2.5.",)
+_GTTS_AUDIO = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+def make_session(
+    pool_size: int = HTTP_POOL_SIZE,
+    retries: int = HTTP_RETRIES,
+    backoff: float = HTTP_BACKOFF,
+) -> requests.Session:
+    """
+    Builds a requests session with keep-alive connection pools and retries.
+
+    Only connection errors and 5xx responses to idempotent requests are
+    retried here: 429s are left to the caller, which knows how to share the
+    Retry-After pause (see TrackResolver).
+
+    Args:
+        pool_size (int): Connections kept alive per host.
+        retries (int): Retries of a failed request.
+        backoff (float): Base delay of the exponential backoff, in seconds.
+
+    Returns:
+        requests.Session: The session.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def shared_session() -> requests.Session:
+    """The process-wide requests session, used for Spotify and text-to-speech."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def shared_http_client():
+    """
+    The process-wide httpx client used by the OpenAI clients, speaking HTTP/2
+    when the optional h2 package is installed.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.Client(
+                http2=h2 is not None,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                ),
+            )
+        return _http_client
+
+
+def gtts_stream(tts, session: Optional[requests.Session] = None):
+    """
+    Does what gTTS.stream does over a shared session instead of opening a new
+    connection for every request.
+
+    gTTS has no public way to pass a session, so this relies on its private
+    request preparation, only with the gTTS releases it was tested against.
+
+    Args:
+        tts (gTTS): The configured gTTS object.
+        session (requests.Session, optional): Defaults to the shared session.
+
+    Yields:
+        bytes: MP3 data.
+    """
+    from gtts.tts import gTTSError
+    from gtts.version import __version__ as gtts_version
+
+    if not gtts_version.startswith(_GTTS_TESTED_VERSIONS):
+        yield from tts.stream()
+        return
+    session = session or shared_session()
+    for request in tts._prepare_requests():
+        try:
+            response = session.send(request, timeout=tts.timeout or HTTP_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            raise gTTSError(tts=tts, response=response)
+        except requests.exceptions.RequestException:
+            raise gTTSError(tts=tts)
+        for line in response.iter_lines(chunk_size=1024):
+            decoded_line = line.decode("utf-8")
+            if "jQ1olc" not in decoded_line:
+                continue
+            audio = _GTTS_AUDIO.search(decoded_line)
+            if not audio:
+                raise gTTSError(tts=tts, response=response)
+            yield base64.b64decode(audio.group(1).encode("ascii"))
+
+
+class TokenRefresher:
+    """
+    Refreshes Spotify OAuth tokens in the background, `margin` seconds before
+    they expire, so that no request ever waits for a refresh.
+
+    spotipy only refreshes lazily, on the first request within a minute of
+    `expires_at`; registered auth managers find a fresh token in their cache
+    instead.
+    """
+
+    def __init__(self, margin: float = TOKEN_REFRESH_MARGIN) -> None:
+        """
+        Args:
+            margin (float): Seconds before expiry at which a token is refreshed.
+        """
+        self.margin = margin
+        self._managers: Dict[int, object] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, auth_manager) -> None:
+        """Keeps the token of a SpotifyOAuth manager fresh from now on."""
+        with self._lock:
+            self._managers[id(auth_manager)] = auth_manager
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def unregister(self, auth_manager) -> None:
+        with self._lock:
+            self._managers.pop(id(auth_manager), None)
+
+    def refresh_due(self) -> float:
+        """
+        Refreshes every token close to expiry.
+
+        Returns:
+            float: Seconds until the next token is due.
+        """
+        with self._lock:
+            managers = list(self._managers.values())
+        next_due = 3600.0
+        now = time.time()
+        for auth_manager in managers:
+            token = auth_manager.cache_handler.get_cached_token()
+            if not token or "expires_at" not in token:
+                continue
+            due = token["expires_at"] - self.margin - now
+            if due <= 0:
+                try:
+                    token = auth_manager.refresh_access_token(token["refresh_token"])
+                    due = token["expires_at"] - self.margin - time.time()
+                except Exception as e:
+                    print(f"An error occurred while refreshing a Spotify token: {e}")
+                    due = 30.0
+            next_due = min(next_due, due)
+        return max(next_due, 1.0)
+
+    def _run(self) -> None:
+        while True:
+            delay = self.refresh_due()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+_token_refresher: Optional[TokenRefresher] = None
+
+
+def token_refresher() -> TokenRefresher:
+    """The process-wide TokenRefresher."""
+    global _token_refresher
+    with _lock:
+        if _token_refresher is None:
+            _token_refresher = TokenRefresher()
+        return _token_refresher
@@ -0,0 +1,140 @@
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from config import ROUTER_CLASSIFIER_MAX_WORDS, ROUTER_CLASSIFIER_THRESHOLD
+
+QUIT = "quit"
+SKIP = "skip"
+PAUSE = "pause"
+RESUME = "resume"
+LOUDER = "louder"
+QUIETER = "quieter"
+SET_VOLUME = "set_volume"
+WHATS_PLAYING = "whats_playing"
+MORE_LIKE_THIS = "more_like_this"
+
+
+class Intent(NamedTuple):
+    name: str
+    value: Optional[int] = None
+
+
+# Whole-utterance patterns, tried in order on the normalized text
+_PATTERNS: List[Tuple[str, str]] = [
+    (QUIT, r"(quit|exit|goodbye|bye|stop the dj|end (the )?session)"),
+    (SET_VOLUME, r"(set (the )?)?volume (to )?(?P<value>\d{1,3})( ?%| percent)?"),
+    (LOUDER, r"(turn (it|the (music|volume)) up|(a bit |a little )?louder|volume up|pump it up)"),
+    (QUIETER, r"(turn (it|the (music|volume)) down|(a bit |a little )?(quieter|softer)|volume down|lower (the )?(music|volume))"),
+    (SKIP, r"(skip|next|next (song|track)|skip (this|it|this (song|track))|play the next (song|track))"),
+    (PAUSE, r"(pause|stop|hold on|wait|pause (the )?(music|song))"),
+    (RESUME, r"(resume|continue|play|unpause|keep (going|playing)|resume (the )?(music|song))"),
+    (WHATS_PLAYING, r"(what('s| is) (playing|this( song)?|the song)|which song is this|who('s| is) (this|singing))"),
+    (MORE_LIKE_THIS, r"((play )?(more|something|songs) like this( one| song)?|more of (this|that)|i like this( one| song)?)"),
+]
+_COMPILED = [(name, re.compile(pattern)) for name, pattern in _PATTERNS]
+
+# Example phrasings for the fallback classifier
+_EXAMPLES: Dict[str, List[str]] = {
+    SKIP: ["skip this song", "next one please", "i don't like this song", "change the song", "move on"],
+    PAUSE: ["pause the music please", "stop the music", "be quiet for a moment"],
+    RESUME: ["start the music again", "play the music again", "go on playing"],
+    LOUDER: ["turn up the volume", "make it louder please", "i can't hear the music"],
+    QUIETER: ["turn down the volume", "make it quieter please", "the music is too loud"],
+    WHATS_PLAYING: ["what song is playing", "tell me the name of this song", "who sings this song"],
+    MORE_LIKE_THIS: ["play more songs like this one", "give me similar songs", "more of the same please"],
+}
+
+
+def normalize_command(text: str) -> str:
+    """Lowercases a transcription and drops punctuation and filler words."""
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s'%]", " ", text)
+    text = re.sub(r"\b(please|hey|okay|ok|um|uh|now|just)\b", " ", text)
+    # "DJ" as a way of addressing the DJ, but not as in "stop the DJ"
+    text = re.sub(r"(?<!\bthe )\b(dj|nea)\b", " ", text)
+    return " ".join(text.split())
+
+
+class KeywordClassifier:
+    """
+    Tiny nearest-example classifier for short commands the patterns miss.
+
+    Each utterance is compared to example phrasings of every intent by word
+    overlap (Jaccard similarity); the best intent wins if it is similar
+    enough and the utterance contains one of its distinctive words (found in
+    the examples of no other intent). Overlap on words like "this song" alone
+    is not enough, so "I love this song" is not taken for "I don't like this
+    song". Long utterances are never classified, so open-ended requests
+    ("play some 90s hip hop for a road trip") still reach the recommender.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]] = _EXAMPLES,
+        threshold: float = ROUTER_CLASSIFIER_THRESHOLD,
+        max_words: int = ROUTER_CLASSIFIER_MAX_WORDS,
+    ) -> None:
+        self.threshold = threshold
+        self.max_words = max_words
+        self._examples = [
+            (name, set(normalize_command(example).split()))
+            for name, phrases in examples.items()
+            for example in phrases
+        ]
+        owners: Dict[str, Set[str]] = {}
+        for name, words in self._examples:
+            for word in words:
+                owners.setdefault(word, set()).add(name)
+        self._distinctive = {
+            name: {word for word, names in owners.items() if names == {name}}
+            for name in examples
+        }
+
+    def __call__(self, text: str) -> Optional[str]:
+        words = set(text.split())
+        if not words or len(words) > self.max_words:
+            return None
+        best, best_score = None, 0.0
+        for name, example in self._examples:
+            score = len(words & example) / len(words | example)
+            if score > best_score and words & self._distinctive[name]:
+                best, best_score = name, score
+        return best if best_score >= self.threshold else None
+
+
+class IntentRouter:
+    """
+    Maps spoken commands to playback intents without calling a model.
+
+    Patterns cover the usual phrasings; an optional classifier catches close
+    variants. Anything else returns None and goes to the recommender.
+    """
+
+    def __init__(self, classifier: Optional[Callable[[str], Optional[str]]] = None) -> None:
+        """
+        Args:
+            classifier (Callable, optional): Maps a normalized utterance to an intent name or None.
+        """
+        self.classifier = classifier
+
+    def route(self, text: str) -> Optional[Intent]:
+        """
+        Args:
+            text (str): The transcribed command.
+
+        Returns:
+            Intent, optional: The playback intent, or None for an open-ended request.
+        """
+        normalized = normalize_command(text)
+        if not normalized:
+            return None
+        for name, pattern in _COMPILED:
+            match = pattern.fullmatch(normalized)
+            if match:
+                value = match.groupdict().get("value")
+                return Intent(name, min(int(value), 100) if value else None)
+        if self.classifier is not None:
+            name = self.classifier(normalized)
+            if name:
+                return Intent(name)
+        return None
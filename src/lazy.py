@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    A service built on first use instead of at import time.
+
+    `warm_up` builds it in a background thread, so that slow imports and
+    network handshakes overlap with whatever the caller does meanwhile;
+    `get` then returns the ready value, or waits for the build in progress.
+    A failed build is reported and retried on the next `get`.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str = "service") -> None:
+        """
+        Args:
+            factory (Callable): Builds the service.
+            name (str): Used in error messages.
+        """
+        self.factory = factory
+        self.name = name
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def get(self) -> T:
+        """Returns the service, building it if needed."""
+        if self._built:
+            return self._value
+        with self._lock:
+            if not self._built:
+                self._value = self.factory()
+                self._built = True
+        return self._value
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Builds the service in the background.
+
+        Returns:
+            threading.Thread: The (daemon) worker thread.
+        """
+
+        def run():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"An error occurred while starting the {self.name}: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
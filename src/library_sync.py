@@ -0,0 +1,454 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from spotipy.exceptions import SpotifyException
+
+from config import (
+    LIBRARY_SYNC_INTERVAL,
+    LIBRARY_SYNC_RETRIES,
+    LIBRARY_SYNC_WORKERS,
+    LIBRARY_TOP_ARTISTS,
+    LIBRARY_TOP_GENRES,
+    LIBRARY_TOP_TRACKS,
+    PROMPT_PROFILE_MAX_TOKENS,
+)
+from prompt_builder import count_tokens, truncate_to_tokens
+from tracing import tracer
+
+TOP_RANGES = ("short_term", "medium_term", "long_term")
+
+# How much a track counts towards the taste summary, by where it comes from
+_SOURCE_WEIGHTS = {
+    "top:short_term": 4.0,
+    "top:medium_term": 3.0,
+    "top:long_term": 2.0,
+    "saved": 1.0,
+    "playlist": 0.5,
+}
+
+
+class LibraryStore:
+    """
+    Compact local copy of a user's Spotify library, in one SQLite file.
+
+    Tracks are stored once (URI, title, primary artist) and listed by source:
+    "saved", "top:<time range>" and "playlist:<id>". Playlists keep the
+    snapshot ID they were fetched at, so that a sync only refetches those
+    that changed, and artists keep their genres for the taste summary.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Args:
+            path (str, optional): Path of the SQLite file. None keeps the library in memory only.
+        """
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # Held while a LibrarySync updates the store
+        self.sync_lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS tracks "
+            "(uri TEXT PRIMARY KEY, name TEXT NOT NULL, artist TEXT, artist_id TEXT);"
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(source TEXT NOT NULL, uri TEXT NOT NULL, added_at TEXT, position INTEGER);"
+            "CREATE INDEX IF NOT EXISTS entries_source ON entries (source);"
+            "CREATE TABLE IF NOT EXISTS playlists "
+            "(id TEXT PRIMARY KEY, name TEXT, snapshot_id TEXT);"
+            "CREATE TABLE IF NOT EXISTS artists (id TEXT PRIMARY KEY, name TEXT, genres TEXT);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        """Closes the SQLite file."""
+        with self._lock:
+            self._db.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+            self._db.commit()
+
+    def _insert_tracks(self, items: List[dict]) -> List[tuple]:
+        # Lock held: stores the tracks of (added_at, track) items, returns their entries
+        rows, entries = [], []
+        for position, (added_at, track) in enumerate(items):
+            if not track or not track.get("uri") or not track.get("name"):
+                continue  # local files, removed tracks and podcast episodes
+            artist = (track.get("artists") or [{}])[0]
+            rows.append((track["uri"], track["name"], artist.get("name"), artist.get("id")))
+            entries.append((track["uri"], added_at, position))
+        self._db.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?)", rows)
+        return entries
+
+    def replace_source(self, source: str, items: List[dict]) -> int:
+        """
+        Replaces the tracks listed under a source.
+
+        Args:
+            source (str): e.g. "top:short_term" or "playlist:<id>".
+            items (List[dict]): (added_at, track object) pairs, in order.
+
+        Returns:
+            int: The number of tracks stored.
+        """
+        with self._lock:
+            entries = self._insert_tracks(items)
+            self._db.execute("DELETE FROM entries WHERE source = ?", (source,))
+            self._db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                [(source, *entry) for entry in entries],
+            )
+            self._db.commit()
+        return len(entries)
+
+    def add_to_source(self, source: str, items: List[dict]) -> int:
+        """Adds tracks to a source, e.g. newly saved ones, without removing any."""
+        with self._lock:
+            entries = self._insert_tracks(items)
+            known = {
+                row[0]
+                for row in self._db.execute("SELECT uri FROM entries WHERE source = ?", (source,))
+            }
+            new = [(source, *entry) for entry in entries if entry[0] not in known]
+            self._db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", new)
+            self._db.commit()
+        return len(new)
+
+    def count(self, source: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM entries WHERE source = ?", (source,)
+            ).fetchone()[0]
+
+    def latest_added_at(self, source: str) -> Optional[str]:
+        """The most recent added_at under a source (ISO 8601 strings sort by time)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MAX(added_at) FROM entries WHERE source = ?", (source,)
+            ).fetchone()[0]
+
+    def playlist_snapshots(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._db.execute("SELECT id, snapshot_id FROM playlists"))
+
+    def set_playlist(self, playlist: dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?)",
+                (playlist["id"], playlist.get("name"), playlist.get("snapshot_id")),
+            )
+            self._db.commit()
+
+    def remove_playlists(self, playlist_ids: Iterable[str]) -> None:
+        with self._lock:
+            for playlist_id in playlist_ids:
+                self._db.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
+                self._db.execute(
+                    "DELETE FROM entries WHERE source = ?", (f"playlist:{playlist_id}",)
+                )
+            self._db.commit()
+
+    def artists_without_genres(self) -> List[str]:
+        with self._lock:
+            return [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT t.artist_id FROM tracks t "
+                    "LEFT JOIN artists a ON a.id = t.artist_id "
+                    "WHERE t.artist_id IS NOT NULL AND a.id IS NULL"
+                )
+            ]
+
+    def set_artists(self, artists: List[dict]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO artists VALUES (?, ?, ?)",
+                [
+                    (a["id"], a.get("name"), "|".join(a.get("genres") or []))
+                    for a in artists
+                    if a
+                ],
+            )
+            self._db.commit()
+
+    def tracks(self) -> Iterator[dict]:
+        """Every stored track, as a minimal Web API track object."""
+        with self._lock:
+            rows = self._db.execute("SELECT uri, name, artist FROM tracks").fetchall()
+        for uri, name, artist in rows:
+            yield {"uri": uri, "name": name, "artists": [{"name": artist}]}
+
+    def taste_summary(self, max_tokens: int = PROMPT_PROFILE_MAX_TOKENS) -> str:
+        """
+        Summarizes the library for recommendation prompts: the most listened
+        artists and genres and the current favourite tracks, weighted by
+        source (recent top tracks count most).
+
+        Args:
+            max_tokens (int): Token budget of the summary.
+
+        Returns:
+            str: The summary, or '' if nothing was synced yet.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT e.source, t.name, t.artist, a.genres FROM entries e "
+                "JOIN tracks t ON t.uri = e.uri LEFT JOIN artists a ON a.id = t.artist_id"
+            ).fetchall()
+            favourites = self._db.execute(
+                "SELECT t.name, t.artist FROM entries e JOIN tracks t ON t.uri = e.uri "
+                "WHERE e.source = 'top:short_term' ORDER BY e.position LIMIT ?",
+                (LIBRARY_TOP_TRACKS,),
+            ).fetchall()
+        if not rows:
+            return ""
+
+        artists, genres = Counter(), Counter()
+        for source, _, artist, artist_genres in rows:
+            weight = _SOURCE_WEIGHTS.get(source, _SOURCE_WEIGHTS.get(source.split(":")[0], 1.0))
+            if artist:
+                artists[artist] += weight
+            for genre in (artist_genres or "").split("|"):
+                if genre:
+                    genres[genre] += weight
+
+        parts = [
+            "Top artists: "
+            + ", ".join(name for name, _ in artists.most_common(LIBRARY_TOP_ARTISTS))
+        ]
+        if genres:
+            parts.append(
+                "genres: " + ", ".join(name for name, _ in genres.most_common(LIBRARY_TOP_GENRES))
+            )
+        if favourites:
+            parts.append(
+                "lately: " + ", ".join(f"{name} - {artist}" for name, artist in favourites)
+            )
+        return truncate_to_tokens("; ".join(parts), max_tokens)
+
+
+class LibrarySync:
+    """
+    Pulls a user's saved tracks, top tracks and playlists into a LibraryStore.
+
+    Paginated endpoints are read with one request for the first page, then
+    the remaining pages concurrently. Syncs are incremental: saved tracks are
+    read newest first until the last synced one, and only playlists whose
+    snapshot ID changed are refetched. Artist genres are fetched in batches
+    of 50 for the artists not seen before.
+    """
+
+    def __init__(self, sp, store: LibraryStore, workers: int = LIBRARY_SYNC_WORKERS,
+                 retries: int = LIBRARY_SYNC_RETRIES) -> None:
+        """
+        Args:
+            sp (spotipy.Spotify): An authenticated client (with the library scopes).
+            store (LibraryStore): Where the library is kept.
+            workers (int): Requests in flight at once.
+            retries (int): Retries of a request answered with 429 (after its Retry-After).
+        """
+        self.sp = sp
+        self.store = store
+        self.retries = retries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="library-sync")
+
+    def _call(self, method: Callable, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return method(*args, **kwargs)
+            except SpotifyException as e:
+                if e.http_status != 429 or attempt >= self.retries:
+                    raise
+                headers = getattr(e, "headers", None) or {}
+                time.sleep(float(headers.get("Retry-After", 1)))
+            attempt += 1
+
+    def _pages(self, method: Callable, limit: int, *args, **kwargs) -> List[dict]:
+        """All items of a paginated endpoint: the first page, then the others concurrently."""
+        first = self._call(method, *args, limit=limit, offset=0, **kwargs)
+        offsets = range(limit, first.get("total") or 0, limit)
+        pages = self._executor.map(
+            lambda offset: self._call(method, *args, limit=limit, offset=offset, **kwargs),
+            offsets,
+        )
+        items = list(first.get("items") or [])
+        for page in pages:
+            items.extend(page.get("items") or [])
+        return items
+
+    def needs_sync(self, interval: float = LIBRARY_SYNC_INTERVAL) -> bool:
+        """Whether the last sync is older than `interval` seconds."""
+        synced_at = self.store.get_meta("synced_at")
+        return synced_at is None or time.time() - float(synced_at) > interval
+
+    def sync(self) -> Dict[str, int]:
+        """
+        Blocking: brings the store up to date. Does nothing if a sync is already running.
+
+        Returns:
+            Dict[str, int]: Tracks fetched per kind of source.
+        """
+        if not self.store.sync_lock.acquire(blocking=False):
+            return {}
+        try:
+            with tracer.span("library.sync") as span:
+                top = self._executor.map(self._sync_top, TOP_RANGES)
+                stats = {
+                    "saved": self._sync_saved(),
+                    "playlists": self._sync_playlists(),
+                    "top": sum(top),
+                }
+                stats["artists"] = self._sync_artists()
+                span.update(stats)
+            self.store.set_meta("synced_at", time.time())
+            return stats
+        finally:
+            self.store.sync_lock.release()
+
+    def _sync_top(self, time_range: str) -> int:
+        page = self._call(self.sp.current_user_top_tracks, limit=50, offset=0, time_range=time_range)
+        items = [(None, track) for track in page.get("items") or []]
+        return self.store.replace_source(f"top:{time_range}", items)
+
+    def _sync_saved(self) -> int:
+        latest = self.store.latest_added_at("saved")
+        if latest is None:
+            items = self._pages(self.sp.current_user_saved_tracks, 50)
+            return self.store.replace_source(
+                "saved", [(item.get("added_at"), item.get("track")) for item in items]
+            )
+
+        # Newest first: read until the last synced track
+        new, offset, total = [], 0, 0
+        while True:
+            page = self._call(self.sp.current_user_saved_tracks, limit=50, offset=offset)
+            total = page.get("total") or 0
+            items = page.get("items") or []
+            fresh = [item for item in items if (item.get("added_at") or "") > latest]
+            new.extend(fresh)
+            offset += len(items)
+            if len(fresh) < len(items) or not items or offset >= total:
+                break
+        added = self.store.add_to_source(
+            "saved", [(item.get("added_at"), item.get("track")) for item in new]
+        )
+        if self.store.count("saved") != total:
+            # Tracks were unsaved since the last sync: read the list again
+            items = self._pages(self.sp.current_user_saved_tracks, 50)
+            return self.store.replace_source(
+                "saved", [(item.get("added_at"), item.get("track")) for item in items]
+            )
+        return added
+
+    def _sync_playlists(self) -> int:
+        playlists = [p for p in self._pages(self.sp.current_user_playlists, 50) if p]
+        known = self.store.playlist_snapshots()
+        changed = [p for p in playlists if known.get(p["id"]) != p.get("snapshot_id")]
+        self.store.remove_playlists(set(known) - {p["id"] for p in playlists})
+
+        def fetch(playlist):
+            items = self._pages(
+                self.sp.playlist_items,
+                100,
+                playlist["id"],
+                fields="total,items(added_at,track(uri,name,artists(id,name)))",
+                additional_types=("track",),
+            )
+            return playlist, items
+
+        fetched = 0
+        # Playlists are fetched one after the other, each with its pages in parallel
+        for playlist, items in map(fetch, changed):
+            fetched += self.store.replace_source(
+                f"playlist:{playlist['id']}",
+                [(item.get("added_at"), item.get("track")) for item in items],
+            )
+            self.store.set_playlist(playlist)
+        return fetched
+
+    def _sync_artists(self) -> int:
+        ids = self.store.artists_without_genres()
+        batches = [ids[i : i + 50] for i in range(0, len(ids), 50)]
+        for page in self._executor.map(lambda batch: self._call(self.sp.artists, batch), batches):
+            self.store.set_artists(page.get("artists") or [])
+        return len(ids)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def describe_taste(
+    description: str, summary: str, max_tokens: int = PROMPT_PROFILE_MAX_TOKENS
+) -> str:
+    """
+    The hand-written taste description, followed by the library's taste summary.
+
+    The summary only gets the tokens the description leaves, so that the
+    combined text fits the profile budget and is not summarized again after
+    every sync. A description over the budget on its own is summarized once,
+    without the library.
+    """
+    description = description.strip()
+    if not summary:
+        return description
+    prefix = "From their Spotify library: "
+    budget = max_tokens - count_tokens(f"{description}\n{prefix}" if description else prefix)
+    if budget <= 0:
+        return description
+    parts = [description, prefix + truncate_to_tokens(summary, budget)]
+    return "\n".join(part for part in parts if part)
+
+
+def sync_in_background(
+    sp,
+    store: LibraryStore,
+    catalog=None,
+    on_synced: Optional[Callable[[str], None]] = None,
+    force: bool = False,
+) -> threading.Thread:
+    """
+    Syncs the library on a daemon thread, unless it was synced recently.
+
+    Args:
+        sp (spotipy.Spotify): An authenticated client.
+        store (LibraryStore): Where the library is kept.
+        catalog (CatalogIndex, optional): Receives every library track, for local resolution.
+        on_synced (Callable, optional): Called with the new taste summary once synced.
+        force (bool): Sync even if the last sync is recent.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+
+    def run():
+        library = LibrarySync(sp, store)
+        try:
+            if force or library.needs_sync():
+                library.sync()
+            if catalog is not None:
+                catalog.add_tracks(store.tracks())
+            if on_synced is not None:
+                on_synced(store.taste_summary())
+        except Exception as e:
+            print(f"An error occurred while syncing the Spotify library: {e}")
+        finally:
+            library.shutdown()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -1,8 +1,11 @@
+import argparse
 import os
-from core_logic import start_dj
 from pathlib import Path
 from dotenv import load_dotenv
 
+from config import TRACE_FILE, TRACE_OTEL
+from tracing import tracer
+
 # path to this folder
 path = os.path.dirname(os.path.abspath(__file__))
 print(path)
@@ -10,10 +13,39 @@ path2secrets = os.path.join(path, "../secrets/.env")
 print(load_dotenv(path2secrets))
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="DJ NEA, the AI DJ.")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Host sessions for many listeners over a local HTTP/WebSocket API.",
+    )
+    parser.add_argument("--host", default=None, help="Server host (server mode).")
+    parser.add_argument("--port", type=int, default=None, help="Server port (server mode).")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print p50/p95 latencies per pipeline stage at the end of the session.",
+    )
+    parser.add_argument(
+        "--trace", default=TRACE_FILE, help="Append every span to this JSONL file."
+    )
+    parser.add_argument(
+        "--otel",
+        action="store_true",
+        default=TRACE_OTEL,
+        help="Export spans to OpenTelemetry (configured through OTEL_* variables).",
+    )
+    return parser.parse_args()
+
+
 def main():
     """
     Main function to start the AI DJ experience.
     """
+    args = parse_args()
+    tracer.configure(jsonl_path=args.trace, otel=args.otel)
+
     # Display a welcome message
     print("🎶 Welcome to the AI DJ Experience! 🎶")
     print("Loading configurations...")
@@ -30,11 +62,21 @@ def main():
         )
         return
 
+    if args.serve:
+        from config import SERVER_HOST, SERVER_PORT
+        from dj_server import serve
+
+        serve(host=args.host or SERVER_HOST, port=args.port or SERVER_PORT)
+        return
+
     print("Configurations loaded successfully. Starting your DJ...")
 
     try:
+        # Imported here: the terminal DJ opens the microphone and speakers
+        from core_logic import start_dj
+
         # Start the AI DJ with the given configuration
-        start_dj()
+        start_dj(profile=args.profile)
     except KeyboardInterrupt:
         print("\nSession ended by user. Thank you for using the AI DJ!")
     except Exception as e:
@@ -0,0 +1,87 @@
+import re
+from typing import Dict, Optional
+
+# Words that give the mood away without asking a model. Keys are the labels
+# the suggester works with; values are lowercase words or short phrases.
+MOOD_LEXICON: Dict[str, tuple] = {
+    "happy": ("happy", "joyful", "cheerful", "glad", "great", "good mood", "excited"),
+    "sad": ("sad", "down", "depressed", "blue", "heartbroken", "lonely", "crying"),
+    "energetic": (
+        "energetic",
+        "workout",
+        "gym",
+        "running",
+        "run",
+        "pump",
+        "hype",
+        "upbeat",
+        "party",
+        "dance",
+    ),
+    "calm": ("calm", "chill", "relax", "relaxed", "relaxing", "mellow", "peaceful"),
+    "focused": ("focus", "focused", "study", "studying", "work", "working", "coding"),
+    "romantic": ("romantic", "love", "date", "in love"),
+    "angry": ("angry", "mad", "furious", "frustrated", "pissed"),
+    "tired": ("tired", "sleepy", "exhausted", "sleep"),
+}
+
+_NEGATIONS = ("not", "no", "never", "don't", "dont", "isn't", "aren't", "ain't")
+_NON_WORD = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+# A mood word only counts in an explicit mood statement ("I'm so tired",
+# "something chill", "for my workout"): elsewhere it is likely part of a
+# title or an artist ("play Blue Monday", "play Run DMC")
+_CUES = (
+    r"(?:i feel|i'm feeling|im feeling|i am feeling|i'm|im|i am|feeling|feel"
+    r"|something|anything|in the mood for|mood is|for(?: a| the| my)?)"
+)
+_INTENSIFIERS = r"(?:(?:so|really|very|pretty|quite|super|kind of|kinda|a bit|a little|more)\s+)*"
+
+_PATTERNS = {
+    mood: re.compile(
+        rf"^(?:{alternatives})$|\b{_CUES}\s+{_INTENSIFIERS}(?:{alternatives})\b"
+    )
+    for mood, alternatives in (
+        (mood, "|".join(re.escape(w) for w in words)) for mood, words in MOOD_LEXICON.items()
+    )
+}
+
+
+def normalize_mood_text(text: str) -> str:
+    """
+    Normalizes user text for mood lookups (lowercase, no punctuation, single spaces).
+
+    Args:
+        text (str): The user's input.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = _NON_WORD.sub(" ", (text or "").lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def classify_mood_locally(text: str) -> Optional[str]:
+    """
+    Classifies obvious moods with the keyword lexicon, without any network call.
+
+    The classifier only answers when the input is a mood on its own or states
+    one explicitly ("I'm feeling down", "something chill"), exactly one mood
+    matches and there is no negation ("not happy"), leaving anything
+    ambiguous (including titles like "Blue Monday") to the model.
+
+    Args:
+        text (str): The user's input, normalized or not.
+
+    Returns:
+        str, optional: The mood label, or None if the input is not obvious.
+    """
+    text = normalize_mood_text(text)
+    if not text:
+        return None
+    words = text.split()
+    if any(negation in words for negation in _NEGATIONS):
+        return None
+    matches = [mood for mood, pattern in _PATTERNS.items() if pattern.search(text)]
+    return matches[0] if len(matches) == 1 else None
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Set
+
+from config import HISTORY_RECENT_SIZE
+from track_cache import normalize_key
+
+
+class PlayHistory:
+    """
+    Everything a user has listened to, for deduplicating recommendations locally.
+
+    Played songs are appended to a per-user TSV file (timestamp, normalized
+    key, label) and indexed in memory: a hash set of normalized "song|artist"
+    keys answers "was this played?" in O(1) whatever the length of the
+    history, and a bounded deque keeps the recent window shown to the model.
+    """
+
+    def __init__(self, path: Optional[str] = None, recent_size: int = HISTORY_RECENT_SIZE) -> None:
+        """
+        Args:
+            path (str, optional): Path of the TSV file. None keeps the history in memory only.
+            recent_size (int): Number of songs kept in the recent window.
+        """
+        self.path = path
+        self._keys: Set[str] = set()
+        self._recent: "deque[str]" = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) == 3:
+                        self._keys.add(parts[1])
+                        self._recent.append(parts[2])
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, song) -> bool:
+        return self.seen(song.song_name, song.artist)
+
+    def seen(self, song_name: str, artist: Optional[str]) -> bool:
+        """Whether the user has already listened to this song."""
+        return normalize_key(song_name, artist) in self._keys
+
+    def add(self, song) -> None:
+        """
+        Records that a song was played.
+
+        Args:
+            song (SuggestedSong): The song (its str() is the 'Title - Artist' label).
+        """
+        key = normalize_key(song.song_name, song.artist)
+        label = " ".join(str(song).split())
+        with self._lock:
+            self._keys.add(key)
+            self._recent.append(label)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(f"{time.time():.0f}\t{key}\t{label}\n")
+
+    def recent(self) -> List[str]:
+        """The most recently played songs, oldest first."""
+        with self._lock:
+            return list(self._recent)
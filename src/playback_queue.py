@@ -0,0 +1,158 @@
+import threading
+from typing import Callable, List, Optional
+
+from config import QUEUE_LOW_WATER, QUEUE_POLL_INTERVAL
+
+
+class PlaybackQueue:
+    """
+    Tracks the recommendations pushed to Spotify's queue.
+
+    Resolved tracks are pushed in order: the first track of a new batch starts
+    playback, the rest are appended with add_to_queue. A monitor thread
+    follows playback, so that `remaining` tells when fewer than `low_water`
+    tracks are left after the current one.
+
+    Note that the Spotify Web API cannot clear the user queue, so tracks
+    already queued from a replaced batch still play after the new first track.
+    """
+
+    def __init__(
+        self,
+        player,
+        device_id: Optional[str] = None,
+        on_now_playing: Optional[Callable[[object], None]] = None,
+        on_queued: Optional[Callable[[object], None]] = None,
+        low_water: int = QUEUE_LOW_WATER,
+        poll_interval: float = QUEUE_POLL_INTERVAL,
+    ) -> None:
+        """
+        Args:
+            player (SpotifyPlayer): The player used to play tracks.
+            device_id (str, optional): The Spotify device to play on.
+            on_now_playing (Callable, optional): Called with the recommendation whenever one of our tracks starts.
+            on_queued (Callable, optional): Called with the recommendation when its track is added to the queue.
+            low_water (int): Refill threshold, in tracks left after the current one (see remaining).
+            poll_interval (float): Seconds between playback state checks.
+        """
+        self.player = player
+        self.device_id = device_id
+        self.on_now_playing = on_now_playing
+        self.on_queued = on_queued
+        self.low_water = low_water
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._uris: List[str] = []
+        self._labels = {}
+        self._current: Optional[str] = None
+        self._stop = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+
+    def start(self) -> None:
+        """Starts following playback."""
+        self._monitor.start()
+
+    def stop(self) -> None:
+        """Stops the monitor; tracks pushed afterwards are dropped."""
+        self._stop.set()
+        with self._lock:
+            self._generation += 1
+
+    def new_batch(self) -> int:
+        """
+        Starts a new batch: tracks pushed for older batches are ignored from now on.
+
+        Returns:
+            int: The generation to push the tracks of the new batch with.
+        """
+        with self._lock:
+            self._generation += 1
+            self._uris = []
+            return self._generation
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def remaining(self) -> int:
+        """
+        Returns:
+            int: Number of our tracks queued after the one currently playing.
+        """
+        with self._lock:
+            if self._current in self._uris:
+                return len(self._uris) - self._uris.index(self._current) - 1
+            return len(self._uris)
+
+    def now_playing(self):
+        """
+        Returns:
+            SuggestedSong, optional: The recommendation currently playing, if it came from this queue.
+        """
+        with self._lock:
+            return self._labels.get(self._current)
+
+    def push(self, song, uri: str, generation: int, start: bool) -> bool:
+        """
+        Sends a resolved track to Spotify; it is announced once Spotify accepted it.
+
+        Args:
+            song (SuggestedSong): The recommendation the track was resolved from.
+            uri (str): The track URI.
+            generation (int): The batch the track belongs to (see new_batch).
+            start (bool): Start playback with this track instead of queueing it.
+
+        Returns:
+            bool: False if the batch has been replaced and the track was dropped.
+
+        Raises:
+            SpotifyException: Spotify rejected the track, which is forgotten.
+        """
+        if generation != self._generation:
+            return False
+        with self._lock:
+            self._uris.append(uri)
+            self._labels[uri] = song
+        try:
+            if start:
+                self.player.play_uris([uri], device_id=self.device_id)
+            else:
+                self.player.add_to_queue(uri, device_id=self.device_id)
+        except Exception:
+            # Rejected by Spotify: never announced nor counted as queued
+            with self._lock:
+                if uri in self._uris:
+                    self._uris.remove(uri)
+                if uri not in self._uris:
+                    self._labels.pop(uri, None)
+            raise
+        if start:
+            self._track_started(uri)
+        elif self.on_queued:
+            self.on_queued(song)
+        return True
+
+    def _track_started(self, uri: str) -> None:
+        with self._lock:
+            if uri == self._current:
+                return
+            self._current = uri
+            song = self._labels.get(uri)
+            if uri in self._uris[1:]:
+                # Past the first track of the batch, the tracks queued before
+                # it (and those left from replaced batches) have finished
+                self._uris = self._uris[self._uris.index(uri) :]
+                self._labels = {u: self._labels[u] for u in self._uris}
+        if song and self.on_now_playing:
+            self.on_now_playing(song)
+
+    def _monitor_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                playback = self.player.get_current_track()
+                if playback and playback.get("item"):
+                    self._track_started(playback["item"]["uri"])
+            except Exception as e:
+                print(f"An error occurred while checking playback: {e}")
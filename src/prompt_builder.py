@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from config import (
+    PROFILE_CACHE_PATH,
+    PROMPT_HISTORY_MAX_TOKENS,
+    PROMPT_INPUT_MAX_TOKENS,
+    PROMPT_PROFILE_MAX_TOKENS,
+    PROMPT_TOKENIZER_MODEL,
+)
+
+try:
+    import tiktoken
+except ImportError:  # token counts are estimated instead
+    tiktoken = None
+
+# Identical on every call, so that provider-side prompt caching can reuse it:
+# everything that varies goes in the user message that follows.
+SYSTEM_PREFIX = (
+    "You are an AI DJ, the most advanced in the world. Your task is to suggest songs "
+    "for the user to listen to next, based on their music taste, mood, activity, and "
+    "previous songs.\n\n"
+    "The request gives: Taste (a summary of the user's music taste), Mood, Played "
+    "(songs already played this session, newest first, 'Title - Artist'), Input (what "
+    "the user just said) and Count (how many songs to suggest).\n\n"
+    "**Instructions:**\n"
+    "- Only provide the song titles and artist names, as a JSON array like this: "
+    '[{"song_name": "Song Title", "artist": "Artist"}, ...]\n'
+    "- Ensure that the recommendations match the user's mood, activity, and music taste.\n"
+    "- If there is no specific input/information, you can provide general recommendations "
+    "you think the user will enjoy based on their taste.\n"
+    "- Do not include any songs from Played.\n"
+    "- Make sure that the songs exist and are spelled correctly.\n"
+    "- If the request ends with 'Report mood', first write a single line 'Mood: <word>' "
+    "with a one-word description of the user's current mood inferred from Input (e.g. "
+    "happy, sad, energetic, calm), then the list on the next line."
+)
+
+PROFILE_PROMPT = (
+    "Summarize this description of a listener's music taste in at most {words} words, "
+    "as a comma-separated list of genres, artists, eras and moods. Keep names exact.\n\n"
+    "Description: {description}\n\nSummary:"
+)
+
+_encoders: Dict[str, object] = {}
+_encoders_lock = threading.Lock()
+
+
+def _encoder(model: str):
+    # Loaded once per model. tiktoken downloads its encoding files on first
+    # use: when that fails (e.g. offline), token counts are estimated instead.
+    with _encoders_lock:
+        if model not in _encoders:
+            encoder = None
+            if tiktoken is not None:
+                try:
+                    try:
+                        encoder = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"Error loading the tokenizer, estimating token counts: {e}")
+            _encoders[model] = encoder
+        return _encoders[model]
+
+
+def count_tokens(text: str, model: str = PROMPT_TOKENIZER_MODEL) -> int:
+    """
+    Counts the tokens of `text` with tiktoken when it is available, and
+    estimates them at four characters per token otherwise.
+
+    Args:
+        text (str): The text.
+        model (str): Model whose tokenizer is used.
+
+    Returns:
+        int: The number of tokens.
+    """
+    encoder = _encoders.get(model) or _encoder(model)
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` at a word boundary so that it fits in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    # Binary search on the number of words kept
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle]) + "...") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + "..."
+
+
+def encode_history(songs: List[str], max_tokens: int = PROMPT_HISTORY_MAX_TOKENS) -> str:
+    """
+    Encodes played songs compactly, newest first, keeping as many as fit in `max_tokens`.
+
+    Args:
+        songs (List[str]): Songs in playing order, as 'Title - Artist'.
+        max_tokens (int): Token budget.
+
+    Returns:
+        str: The songs joined with '; ', or 'none'.
+    """
+    kept: List[str] = []
+    used = 0
+    for song in reversed(songs):
+        cost = count_tokens(song) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(song)
+        used += cost
+    return "; ".join(kept) if kept else "none"
+
+
+class ProfileStore:
+    """
+    Short summaries of user taste descriptions, computed once per description.
+
+    Descriptions that already fit the budget are used as they are (whitespace
+    collapsed); longer ones are summarized by a model. Summaries are keyed by
+    the hash of the description and kept in a JSON file, so the model is only
+    asked again when the description changes.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str], str]] = None,
+        path: str = PROFILE_CACHE_PATH,
+        max_tokens: int = PROMPT_PROFILE_MAX_TOKENS,
+    ) -> None:
+        """
+        Args:
+            summarize (Callable, optional): Sends a prompt to a model and returns its answer.
+                Without it, long descriptions are truncated.
+            path (str): JSON file the summaries are kept in.
+            max_tokens (int): Token budget of a profile.
+        """
+        self.summarize = summarize
+        self.path = path
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._summaries: Dict[str, str] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._summaries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading the profile cache: {e}")
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._summaries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def profile(self, description: str) -> str:
+        """
+        Returns the profile to put in prompts for a taste description.
+
+        Args:
+            description (str): The user's free-text description.
+
+        Returns:
+            str: A summary fitting the token budget ('' for no description).
+        """
+        description = re.sub(r"\s+", " ", description).strip()
+        if not description or count_tokens(description) <= self.max_tokens:
+            return description
+        key = hashlib.sha256(description.encode("utf-8")).hexdigest()
+        with self._lock:
+            summary = self._summaries.get(key)
+        if summary:
+            return summary
+
+        summary = ""
+        if self.summarize is not None:
+            try:
+                summary = self.summarize(
+                    PROFILE_PROMPT.format(
+                        words=self.max_tokens * 3 // 4, description=description
+                    )
+                ).strip()
+            except Exception as e:
+                print(f"An error occurred while summarizing the user profile: {e}")
+        summary = truncate_to_tokens(summary or description, self.max_tokens)
+        with self._lock:
+            self._summaries[key] = summary
+            try:
+                self._save()
+            except OSError as e:
+                print(f"Error writing the profile cache: {e}")
+        return summary
+
+
+def build_request(
+    profile: str,
+    mood: str,
+    played: List[str],
+    input_from_user: str,
+    n_recommendations: int,
+    report_mood: bool = False,
+) -> str:
+    """
+    Builds the variable part of a recommendation request, to follow SYSTEM_PREFIX.
+
+    Args:
+        profile (str): Summary of the user's taste.
+        mood (str): The user's current mood.
+        played (List[str]): Songs played this session, in playing order.
+        input_from_user (str): What the user just said.
+        n_recommendations (int): How many songs to ask for.
+        report_mood (bool): Ask for a 'Mood:' line before the list.
+
+    Returns:
+        str: The user message.
+    """
+    lines = []
+    if profile:
+        lines.append(f"Taste: {profile}")
+    if mood:
+        lines.append(f"Mood: {mood}")
+    lines.append(f"Played: {encode_history(played)}")
+    if input_from_user:
+        lines.append(
+            f"Input: {truncate_to_tokens(input_from_user, PROMPT_INPUT_MAX_TOKENS)}"
+        )
+    lines.append(f"Count: {n_recommendations}")
+    if report_mood:
+        lines.append("Report mood")
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+
+from config import (
+    RECOMMENDATION_CACHE_SIZE,
+    RECOMMENDATION_CACHE_TTL,
+    RECOMMENDATION_REGENERATE_PROBABILITY,
+    RECOMMENDATION_SIMILARITY_THRESHOLD,
+    RECOMMENDATION_VARIETY,
+)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _canonical(text) -> str:
+    text = _NON_WORD.sub(" ", str(text or "").lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _digest(payload: dict) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class CacheEntry:
+    """A pool of songs generated for one set of prompt inputs."""
+
+    context: str
+    input_from_user: str
+    pool: list
+    last_answer: list
+    created_at: float = field(default_factory=time.time)
+    embedding: Optional[List[float]] = None
+
+
+class RecommendationCache:
+    """
+    Caches NextSongsSuggester answers keyed on the inputs of the prompt.
+
+    Hits are found through a hash of the prompt inputs. When an
+    embedding function is given, a second tier matches requests whose user
+    input is phrased differently ("play something chill" vs "something chill
+    please") within the same user description, mood and batch size.
+
+    With the "sample" variety policy every answer for a request is merged into
+    a candidate pool, and hits draw a fresh batch from the pool (skipping the
+    songs played recently) instead of replaying the same list.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RECOMMENDATION_CACHE_SIZE,
+        ttl: float = RECOMMENDATION_CACHE_TTL,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = RECOMMENDATION_SIMILARITY_THRESHOLD,
+        variety: str = RECOMMENDATION_VARIETY,
+        regenerate_probability: float = RECOMMENDATION_REGENERATE_PROBABILITY,
+    ) -> None:
+        """
+        Args:
+            max_entries (int): Maximum number of cached requests.
+            ttl (float): Lifetime of an entry in seconds.
+            embed (Callable, optional): Maps a user input to an embedding vector, enabling the similarity tier.
+            similarity_threshold (float): Minimum cosine similarity for a similarity hit.
+            variety (str): "replay" returns the cached answer as is, "sample" draws from the candidate pool.
+            regenerate_probability (float): Chance of treating a hit as a miss, so pools keep growing.
+        """
+        if variety not in ("replay", "sample"):
+            raise ValueError(f"Unknown variety policy: {variety}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.variety = variety
+        self.regenerate_probability = regenerate_probability
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _keys(self, user_description, mood, input_from_user, prev_songs, n):
+        context = _digest(
+            {"user_description": user_description.strip(), "mood": mood, "n": n}
+        )
+        request = {"context": context, "input_from_user": _canonical(input_from_user)}
+        if self.variety == "replay":
+            # Sampling skips played songs itself, so only replays depend on history
+            request["prev_songs"] = list(prev_songs or [])
+        return context, _digest(request)
+
+    def _find_similar(self, context: str, embedding: List[float]) -> Optional[str]:
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            if entry.context != context or entry.embedding is None:
+                continue
+            score = _cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _answer(self, entry: CacheEntry, prev_songs, n: int) -> Optional[list]:
+        if self.variety == "replay":
+            return list(entry.last_answer)
+        played = {_canonical(song) for song in prev_songs or []}
+        candidates = [song for song in entry.pool if _canonical(song) not in played]
+        if len(candidates) < n:
+            return None
+        return random.sample(candidates, n)
+
+    def lookup(
+        self,
+        user_description: str,
+        mood: str,
+        input_from_user: str,
+        prev_songs: Optional[List[str]],
+        n: int,
+    ) -> Optional[list]:
+        """
+        Looks up cached recommendations for the given prompt inputs.
+
+        Args:
+            user_description (str): The user's music taste description.
+            mood (str): The user's current mood.
+            input_from_user (str): The user's request.
+            prev_songs (List[str], optional): The recent songs included in the prompt.
+            n (int): The number of recommendations requested.
+
+        Returns:
+            list, optional: The recommendations, or None on a miss.
+        """
+        context, key = self._keys(
+            user_description, mood, input_from_user, prev_songs, n
+        )
+        embedding = None
+        if self.embed is not None and input_from_user:
+            with self._lock:
+                needs_embedding = key not in self._entries
+            if needs_embedding:
+                embedding = self.embed(input_from_user)
+
+        now = time.time()
+        with self._lock:
+            expired = [
+                k for k, e in self._entries.items() if e.created_at + self.ttl <= now
+            ]
+            for k in expired:
+                del self._entries[k]
+
+            similar = False
+            if key not in self._entries and embedding is not None:
+                key, similar = self._find_similar(context, embedding), True
+
+            entry = self._entries.get(key) if key else None
+            answer = self._answer(entry, prev_songs, n) if entry else None
+            if answer is None or random.random() < self.regenerate_probability:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.similar_hits += similar
+            return answer
+
+    def store(
+        self,
+        user_description: str,
+        mood: str,
+        input_from_user: str,
+        prev_songs: Optional[List[str]],
+        n: int,
+        songs: list,
+    ) -> None:
+        """
+        Stores freshly generated recommendations, merging them into the pool of the request.
+
+        Args:
+            user_description (str): The user's music taste description.
+            mood (str): The user's current mood.
+            input_from_user (str): The user's request.
+            prev_songs (List[str], optional): The recent songs included in the prompt.
+            n (int): The number of recommendations requested.
+            songs (list): The generated recommendations (compared by their string form).
+        """
+        if not songs:
+            return
+        context, key = self._keys(
+            user_description, mood, input_from_user, prev_songs, n
+        )
+        embedding = None
+        if self.embed is not None and input_from_user:
+            embedding = self.embed(input_from_user)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = CacheEntry(context, input_from_user, [], [], embedding=embedding)
+                self._entries[key] = entry
+            known = {_canonical(song) for song in entry.pool}
+            entry.pool.extend(song for song in songs if _canonical(song) not in known)
+            entry.last_answer = list(songs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Hits (of which similarity hits), misses, hit rate and number of entries.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
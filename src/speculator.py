@@ -0,0 +1,168 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from config import SPECULATION_MATCH_THRESHOLD, SPECULATION_REQUESTS
+from intent_router import KeywordClassifier, normalize_command
+from tracing import tracer
+
+# Requests likely to follow a batch, with phrasings they are recognized by
+_LIKELY_REQUESTS: Dict[str, List[str]] = {
+    "Something more energetic": [
+        "more energetic", "something more energetic", "something upbeat",
+        "play something faster", "pump up the energy", "more energy",
+    ],
+    "Something calmer": [
+        "something calmer", "calm it down", "something more relaxing",
+        "play something slower", "more chill", "something chill",
+    ],
+    "Something different": [
+        "something different", "play something else", "change the style",
+        "different music", "surprise me",
+    ],
+}
+
+
+class _Staged(NamedTuple):
+    tracks: List[Tuple[object, str]]  # (song, uri), in recommendation order
+    mood: Optional[str]  # mood the request reported, applied when it is served
+
+
+class Speculator:
+    """
+    Recommendations prepared before they are asked for.
+
+    While a session is idle, the speculator runs the recommender for the
+    continuation of the current batch and for a few likely requests ("more
+    energetic", "calmer"), resolves the songs and stages them. A request that
+    matches a staged batch is served from it without any model or Spotify
+    call. Staged batches only hold for the batch, mood and taste they were
+    prepared for; speculation in flight is cancelled as soon as the user
+    speaks, so that it never competes with their actual request.
+    """
+
+    def __init__(
+        self,
+        suggester,
+        player,
+        requests: Optional[Dict[str, List[str]]] = None,
+        max_requests: int = SPECULATION_REQUESTS,
+    ) -> None:
+        """
+        Args:
+            suggester (NextSongsSuggester): The recommender.
+            player (SpotifyPlayer): Resolves the speculated songs.
+            requests (Dict[str, List[str]], optional): Likely requests and their phrasings.
+            max_requests (int): Likely requests prepared besides the continuation.
+        """
+        self.suggester = suggester
+        self.player = player
+        requests = requests or _LIKELY_REQUESTS
+        self.requests = list(requests)[:max_requests]
+        self.classifier = KeywordClassifier(
+            {request: [request] + requests[request] for request in self.requests},
+            threshold=SPECULATION_MATCH_THRESHOLD,
+        )
+        self._lock = threading.Lock()
+        self._context = None
+        self._staged: Dict[str, _Staged] = {}
+        self._attempted: Set[str] = set()
+
+    def _sync(self, generation: int):
+        # Lock held: drops the batches staged for another batch, mood or taste
+        context = (generation, self.suggester.mood, self.suggester.user_description)
+        if context != self._context:
+            self._staged.clear()
+            self._attempted.clear()
+            self._context = context
+        return context
+
+    def _key(self, text: str) -> Optional[str]:
+        normalized = normalize_command(text)
+        return self.classifier(normalized) if normalized else ""
+
+    def pending(self, generation: int) -> bool:
+        """Whether something is left to prepare for the current batch."""
+        with self._lock:
+            self._sync(generation)
+            return any(r not in self._attempted for r in [""] + self.requests)
+
+    def take(self, text: str, generation: int) -> Optional[List[Tuple[object, str]]]:
+        """
+        Serves a request from a staged batch.
+
+        Args:
+            text (str): The request ('' for more of the current batch).
+            generation (int): The playback queue's current batch.
+
+        Returns:
+            List[Tuple[SuggestedSong, str]], optional: The songs and their URIs, or None.
+        """
+        key = self._key(text)
+        with self._lock:
+            self._sync(generation)
+            staged = self._staged.pop(key, None) if key is not None else None
+        if key is not None:
+            tracer.count("speculation.hit" if staged else "speculation.miss")
+        if staged is None:
+            return None
+        if staged.mood is not None:
+            self.suggester.mood = staged.mood
+        return staged.tracks
+
+    def prepare_next(self, generation: int, cancel: threading.Event) -> None:
+        """
+        Blocking: prepares the next request not staged yet for the current batch.
+
+        Args:
+            generation (int): The playback queue's current batch.
+            cancel (threading.Event): Abandons the speculation when set.
+        """
+        with self._lock:
+            context = self._sync(generation)
+            request = next(
+                (r for r in [""] + self.requests if r not in self._attempted), None
+            )
+            if request is None:
+                return
+            self._attempted.add(request)
+
+        try:
+            with tracer.span("speculation.prepare", request=request or "continue"):
+                staged = self._speculate(request, cancel)
+        except Exception as e:
+            print(f"An error occurred while preparing recommendations: {e}")
+            return
+        if staged is None:
+            with self._lock:
+                # Cancelled: tried again at the next idle moment
+                self._attempted.discard(request)
+            return
+        with self._lock:
+            if self._sync(generation) == context:
+                self._staged[request] = staged
+
+    def _speculate(self, request: str, cancel: threading.Event) -> Optional[_Staged]:
+        # The mood a request reports is kept aside, and only applied to the
+        # session when the batch is served
+        moods = []
+        songs = []
+        stream = self.suggester.pipeline_stream(
+            input_from_user=request,
+            prev_songs=self.suggester.history.recent(),
+            on_mood=moods.append,
+        )
+        try:
+            for song in stream:
+                if cancel.is_set():
+                    break
+                songs.append(song)
+        finally:
+            stream.close()
+
+        if not songs or cancel.is_set():
+            return None
+        uris = self.player.get_track_uris([(s.song_name, s.artist) for s in songs])
+        if not uris or cancel.is_set():
+            return None
+        tracks = [(song, uri) for song, uri in zip(songs, uris) if uri]
+        return _Staged(tracks, moods[-1] if moods else None)
@@ -0,0 +1,99 @@
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from config import TTS_SYNTHESIS_WORKERS
+from tracing import tracer
+
+
+class SpeechOutput:
+    """
+    Asynchronous speech output: synthesis in a small pool, playback on one worker.
+
+    `say` returns a Future right away. Synthesis starts immediately and in
+    parallel, but announcements are always played in the order they were
+    requested. `on_start` is called before the first announcement of a burst
+    and `on_end` once the queue is drained, e.g. to duck the music.
+    """
+
+    def __init__(
+        self,
+        tts_cache,
+        play: Callable[[str], None],
+        on_start: Optional[Callable[[], None]] = None,
+        on_end: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Args:
+            tts_cache (TTSCache): Where speech is synthesized and cached.
+            play (Callable): Plays an audio file, blocking until it is done.
+            on_start (Callable, optional): Called before speaking after silence.
+            on_end (Callable, optional): Called when there is nothing left to say.
+        """
+        self.tts_cache = tts_cache
+        self.play = play
+        self.on_start = on_start
+        self.on_end = on_end
+        self._synthesis = ThreadPoolExecutor(
+            max_workers=TTS_SYNTHESIS_WORKERS, thread_name_prefix="tts-synthesis"
+        )
+        self._playback: "queue.Queue" = queue.Queue()
+        self._speaking = False
+        threading.Thread(target=self._playback_loop, daemon=True).start()
+
+    def _enqueue(self, synthesize: Callable[[], str]) -> Future:
+        done: Future = Future()
+        self._playback.put((self._synthesis.submit(synthesize), done))
+        return done
+
+    def say(self, text: str) -> Future:
+        """
+        Queues a phrase.
+
+        Args:
+            text (str): The phrase.
+
+        Returns:
+            Future: Resolves once the phrase has been played.
+        """
+        return self._enqueue(lambda: self.tts_cache.get(text))
+
+    def say_fragments(self, fragments: List[str]) -> Future:
+        """
+        Queues an announcement assembled from cached fragments.
+
+        Args:
+            fragments (List[str]): Phrases to say one after another.
+
+        Returns:
+            Future: Resolves once the announcement has been played.
+        """
+        return self._enqueue(lambda: self.tts_cache.assemble(fragments))
+
+    def _playback_loop(self) -> None:
+        while True:
+            synthesis, done = self._playback.get()
+            try:
+                path = synthesis.result()
+                if not self._speaking:
+                    self._speaking = True
+                    self._callback(self.on_start)
+                with tracer.span("speech.play"):
+                    self.play(path)
+                done.set_result(None)
+            except Exception as e:
+                print(f"Error using gTTS: {e}")
+                done.set_exception(e)
+            if self._speaking and self._playback.empty():
+                self._speaking = False
+                self._callback(self.on_end)
+
+    @staticmethod
+    def _callback(callback: Optional[Callable[[], None]]) -> None:
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            print(f"An error occurred while adjusting the volume: {e}")
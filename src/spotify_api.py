@@ -1,32 +1,115 @@
 import spotipy
+from spotipy.cache_handler import CacheFileHandler
 from spotipy.oauth2 import SpotifyOAuth
 
+from catalog_index import CatalogIndex
+from config import HTTP_TIMEOUT, SPOTIFY_ACCOUNTS_URL, SPOTIFY_API_URL
+from http_transport import shared_session
+from track_cache import TrackCache
+from track_resolver import TrackResolver
+from tracing import tracer
+
+SCOPE = (
+    "user-read-playback-state user-modify-playback-state "
+    # Library sync (tokens cached without these are asked for again)
+    "user-library-read user-top-read playlist-read-private"
+)
+
+
+def make_auth_manager(
+    client_id, client_secret, redirect_uri, cache_path=None, open_browser=True
+):
+    """
+    Builds the OAuth manager for one Spotify user.
+
+    Parameters:
+        cache_path (str, optional): File the user's token is kept in (spotipy's ".cache" if None).
+        open_browser (bool): Open the authorization page locally; servers redirect the user instead.
+
+    Returns:
+        SpotifyOAuth: The auth manager, pointed at SPOTIFY_ACCOUNTS_URL.
+    """
+    auth_manager = SpotifyOAuth(
+        client_id=client_id,
+        client_secret=client_secret,
+        redirect_uri=redirect_uri,
+        scope=SCOPE,
+        cache_handler=CacheFileHandler(cache_path=cache_path),
+        open_browser=open_browser,
+        requests_session=shared_session(),
+        requests_timeout=HTTP_TIMEOUT,
+    )
+    accounts_url = SPOTIFY_ACCOUNTS_URL.rstrip("/")
+    auth_manager.OAUTH_AUTHORIZE_URL = f"{accounts_url}/authorize"
+    auth_manager.OAUTH_TOKEN_URL = f"{accounts_url}/api/token"
+    return auth_manager
+
 
 class SpotifyPlayer:
-    def __init__(self, client_id, client_secret, redirect_uri):
-        self.scope = "user-read-playback-state user-modify-playback-state"
+    def __init__(
+        self,
+        client_id,
+        client_secret,
+        redirect_uri,
+        track_cache=None,
+        catalog=None,
+        auth_manager=None,
+        bucket=None,
+        api_url=SPOTIFY_API_URL,
+    ):
+        self.scope = SCOPE
+        if auth_manager is None:
+            auth_manager = make_auth_manager(client_id, client_secret, redirect_uri)
+        self.auth_manager = auth_manager
+        # Keep-alive connections and retries come from the shared session
         self.sp = spotipy.Spotify(
-            auth_manager=SpotifyOAuth(
-                client_id=client_id,
-                client_secret=client_secret,
-                redirect_uri=redirect_uri,
-                scope=self.scope,
-            )
+            auth_manager=auth_manager,
+            requests_session=shared_session(),
+            requests_timeout=HTTP_TIMEOUT,
         )
+        self.sp.prefix = api_url
+        # Resolved (song, artist) -> URI lookups, shared across sessions on disk
+        self.track_cache = track_cache if track_cache is not None else TrackCache()
+        # Known tracks matched locally before falling back to the search endpoint
+        self.catalog = catalog if catalog is not None else CatalogIndex()
+        if not len(self.catalog):
+            self.catalog.add_from_track_cache(self.track_cache)
+        # Cache misses are searched concurrently, under a rate limit that
+        # players of different users share through `bucket`
+        self.resolver = TrackResolver(self._search_track, bucket=bucket)
+        # Whether music was last started or stopped from here (voice
+        # activation listens harder while it plays)
+        self.playing = False
 
     def play_song(self, song_artist_list: list, device_id=None):
-        """Start playing a song given its Spotify URI."""
-        print(type(song_artist_list))
+        """Start playing the songs of a list of (song_name, artist_name) tuples."""
         track_uris = self.get_track_uris(song_artist_list)
         self.sp.start_playback(device_id=device_id, uris=track_uris)
 
+    def play_uris(self, track_uris, device_id=None):
+        """Start playing the given track URIs, in order, replacing the current context."""
+        with tracer.span("spotify.start_playback"):
+            self.sp.start_playback(device_id=device_id, uris=list(track_uris))
+        self.playing = True
+
+    def add_to_queue(self, track_uri, device_id=None):
+        """Append a track URI to the user's playback queue."""
+        with tracer.span("spotify.add_to_queue"):
+            self.sp.add_to_queue(track_uri, device_id=device_id)
+
+    def next_track(self, device_id=None):
+        """Skip to the next track in the queue."""
+        self.sp.next_track(device_id=device_id)
+
     def pause(self, device_id=None):
         """Pause the current playback."""
+        self.playing = False
         self.sp.pause_playback(device_id=device_id)
 
     def resume(self, device_id=None):
         """Resume playback."""
         self.sp.start_playback(device_id=device_id)
+        self.playing = True
 
     def stop(self, device_id=None):
         """Stop playback by pausing and seeking to the beginning."""
@@ -41,6 +124,13 @@ class SpotifyPlayer:
         """Set the volume (0 to 100)."""
         self.sp.volume(volume_percent, device_id=device_id)
 
+    def get_volume(self):
+        """Get the volume (0 to 100) of the active device, or None if nothing is playing."""
+        playback = self.sp.current_playback()
+        if not playback or not playback.get("device"):
+            return None
+        return playback["device"]["volume_percent"]
+
     def get_devices(self):
         """List available playback devices."""
         devices = self.sp.devices()
@@ -48,31 +138,76 @@ class SpotifyPlayer:
 
     def get_track_uris(self, artist_song_list):
         """
-        Takes a lisst of (artist_name, song_name) tuples and returns a list of Spotify track URIs.
+        Takes a list of (song_name, artist_name) tuples and returns a list of Spotify track URIs.
+        Results (including songs that were not found) are served from the track cache or the
+        local catalog when possible, and the remaining searches run concurrently; the output
+        keeps the order of the input.
 
         Parameters:
-            artist_song_list (list of tuples): Each tuple contains (artist_name, song_name).
+            artist_song_list (list of tuples): Each tuple contains (song_name, artist_name).
 
         Returns:
             list: A list of Spotify track URIs.
         """
+        with tracer.span("spotify.get_track_uris") as span:
+            track_uris = self._get_track_uris(artist_song_list)
+            span["tracks"] = len(track_uris)
+            return track_uris
+
+    def _get_track_uris(self, artist_song_list):
+        pairs = [(song, artist) for song, artist in artist_song_list]
+        cached = [self._lookup_locally(song, artist) for song, artist in pairs]
+        pending = {
+            i: self.resolver.submit(song, artist)
+            for i, ((song, artist), (found, _)) in enumerate(zip(pairs, cached))
+            if not found
+        }
+
         track_uris = []
-        for song, artist in artist_song_list:
-            query = f"artist:{artist} track:{song}"
-            try:
-                results = self.sp.search(q=query, type="track", limit=1)
-                tracks = results["tracks"]["items"]
-                if tracks:
-                    track_uri = tracks[0]["uri"]
-                    track_uris.append(track_uri)
-                else:
-                    print(f"Track not found for {artist} - {song}")
+        for i, (song, artist) in enumerate(pairs):
+            track_uri = cached[i][1]
+            if i in pending:
+                try:
+                    track_uri = pending[i].result()
+                except Exception as e:
+                    # Errors are not cached, only searches that found nothing
+                    print(
+                        f"An error occurred while searching for {artist} - {song}: {e}"
+                    )
                     track_uris.append(None)
-            except Exception as e:
-                print(f"An error occurred while searching for {artist} - {song}: {e}")
-                track_uris.append(None)
+                    continue
+                self.track_cache.store(song, artist, track_uri)
+            if track_uri is None:
+                print(f"Track not found for {artist} - {song}")
+            track_uris.append(track_uri)
         return track_uris
 
+    def _lookup_locally(self, song, artist):
+        """Looks a track up in the track cache, then in the catalog, without any network call."""
+        found, track_uri = self.track_cache.lookup(song, artist)
+        if found:
+            tracer.count("track_cache.hit")
+            return found, track_uri
+        tracer.count("track_cache.miss")
+        match = self.catalog.match(song, artist)
+        if match:
+            tracer.count("catalog.hit")
+            self.track_cache.store(song, artist, match[0])
+            return True, match[0]
+        tracer.count("catalog.miss")
+        return False, None
+
+    def _search_track(self, song, artist):
+        """Searches Spotify for a single track, returning its URI or None."""
+        query = f"artist:{artist} track:{song}" if artist else f"track:{song}"
+        with tracer.span("spotify.search"):
+            results = self.sp.search(q=query, type="track", limit=1)
+        tracks = results["tracks"]["items"]
+        if not tracks:
+            return None
+        self.catalog.add_tracks(tracks)
+        return tracks[0]["uri"]
+
     def create_playlist(self, playlist_name, track_uris, public=False):
         """
         Creates a new playlist with the given name and adds the provided track URIs.
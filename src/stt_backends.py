@@ -0,0 +1,202 @@
+import io
+import threading
+import wave
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from config import (
+    STT_BACKEND,
+    STT_LOCAL_COMPUTE_TYPE,
+    STT_LOCAL_MODEL,
+    STT_LOCAL_THREADS,
+)
+
+try:
+    import soundfile
+except ImportError:  # FLAC encoding is optional, WAV is used otherwise
+    soundfile = None
+
+
+def _whisper_model_class():
+    # Imported on demand: loading CTranslate2 is slow and only the local backend needs it
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        return None
+    return WhisperModel
+
+
+def encode_audio(samples, sample_rate):
+    """
+    Encodes mono int16 samples in memory for upload, as FLAC when the optional
+    soundfile package is installed and as 16-bit PCM WAV otherwise.
+
+    Args:
+        samples (np.ndarray): Mono int16 samples.
+        sample_rate (int): Sample rate of the samples, in Hz.
+
+    Returns:
+        tuple: The file name (its extension tells the API the format) and the encoded bytes.
+    """
+    buffer = io.BytesIO()
+    if soundfile is not None:
+        soundfile.write(buffer, samples, sample_rate, format="FLAC", subtype="PCM_16")
+        return "speech.flac", buffer.getvalue()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples)
+    return "speech.wav", buffer.getvalue()
+
+
+class TranscriptionBackend(ABC):
+    """Turns mono int16 samples into text. Errors are raised, not swallowed."""
+
+    name = "base"
+
+    @abstractmethod
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> str:
+        """Returns the text spoken in the samples."""
+
+    def warm_up(self) -> None:
+        """Prepares the backend so that the first command is not slower than the rest."""
+
+
+class WhisperAPIBackend(TranscriptionBackend):
+    """OpenAI's hosted whisper-1 model."""
+
+    name = "api"
+
+    def __init__(self, make_client: Callable[[], object]) -> None:
+        """
+        Args:
+            make_client (Callable): Returns the OpenAI client to upload with, called on first use.
+        """
+        self.make_client = make_client
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self.make_client()
+            return self._client
+
+    def warm_up(self) -> None:
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> str:
+        response = self._load().audio.transcriptions.create(
+            model="whisper-1", file=encode_audio(samples, sample_rate)
+        )
+        return response.text.strip()
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    Local CPU transcription with faster-whisper, int8-quantized by default.
+
+    The model is loaded once and kept warm in the process; `warm_up` loads it
+    in the background so that startup does not wait for it.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str = STT_LOCAL_MODEL,
+        compute_type: str = STT_LOCAL_COMPUTE_TYPE,
+        cpu_threads: int = STT_LOCAL_THREADS,
+    ) -> None:
+        """
+        Args:
+            model_name (str): faster-whisper model size or path (e.g. "base.en", "small").
+            compute_type (str): CTranslate2 quantization, e.g. "int8".
+            cpu_threads (int): Threads used by the model.
+        """
+        self._model_class = _whisper_model_class()
+        if self._model_class is None:
+            raise RuntimeError("faster-whisper is not installed")
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self._model_class(
+                    self.model_name,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                )
+            return self._model
+
+    def warm_up(self) -> None:
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> str:
+        audio = samples.astype(np.float32) / 32768.0
+        if sample_rate != 16000:
+            positions = np.arange(0, len(audio), sample_rate / 16000)
+            audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+        segments, _ = self._load().transcribe(audio, beam_size=1, language="en")
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class FallbackBackend(TranscriptionBackend):
+    """Tries each backend in order until one succeeds."""
+
+    def __init__(self, backends: List[TranscriptionBackend]) -> None:
+        self.backends = backends
+        self.name = "+".join(backend.name for backend in backends)
+
+    def warm_up(self) -> None:
+        for backend in self.backends:
+            backend.warm_up()
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> str:
+        error: Optional[Exception] = None
+        for backend in self.backends:
+            try:
+                return backend.transcribe(samples, sample_rate)
+            except Exception as e:
+                print(f"Transcription with the {backend.name} backend failed: {e}")
+                error = e
+        raise error
+
+
+def create_backend(
+    name: str = STT_BACKEND, make_client: Optional[Callable[[], object]] = None
+) -> TranscriptionBackend:
+    """
+    Builds the transcription backend selected in the configuration.
+
+    Args:
+        name (str): "api", "local", or backends joined with "+" to fall back in order (e.g. "local+api").
+        make_client (Callable, optional): Returns the OpenAI client, required by the "api" backend.
+
+    Returns:
+        TranscriptionBackend: The backend. Local backends that cannot be loaded
+        are skipped when another backend follows them.
+    """
+    backends = []
+    names = [part.strip() for part in name.split("+") if part.strip()]
+    for i, part in enumerate(names):
+        try:
+            if part == "api":
+                backends.append(WhisperAPIBackend(make_client))
+            elif part == "local":
+                backends.append(FasterWhisperBackend())
+            else:
+                raise ValueError(f"Unknown transcription backend: {part}")
+        except RuntimeError as e:
+            if i == len(names) - 1 and not backends:
+                raise
+            print(f"Skipping the {part} transcription backend: {e}")
+    return backends[0] if len(backends) == 1 else FallbackBackend(backends)
@@ -0,0 +1,185 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+from config import TRACE_MAX_SAMPLES
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry export is optional
+    otel_trace = None
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("dj_span", default=None)
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty sequence."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Tracer:
+    """
+    Spans and counters for the stages of the DJ pipeline.
+
+    Every span records its duration per stage name (for p50/p95 reports) and,
+    when configured, is written as one JSON line and/or mirrored as an
+    OpenTelemetry span. Spans opened inside another one (in the same thread,
+    or in a thread started with asyncio.to_thread) share its trace ID.
+    Counters hold token counts and cache hits and misses: counters named
+    "<cache>.hit" and "<cache>.miss" are reported as hit rates.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=TRACE_MAX_SAMPLES))
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._jsonl = None
+        self._otel = None
+
+    def configure(self, jsonl_path: Optional[str] = None, otel: bool = False) -> None:
+        """
+        Args:
+            jsonl_path (str, optional): Append every finished span to this file as JSON.
+            otel (bool): Mirror spans to OpenTelemetry (its SDK is configured through
+                the usual OTEL_* environment variables).
+        """
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            if jsonl_path:
+                os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+                self._jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1)
+        if otel:
+            if otel_trace is None:
+                print("OpenTelemetry is not installed, spans are not exported to it.")
+            else:
+                self._otel = otel_trace.get_tracer("dj-nea")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Times a block. The yielded dict can be filled with more attributes.
+
+        Args:
+            name (str): Stage name, e.g. "spotify.search".
+            **attributes: Attributes recorded with the span.
+        """
+        parent = _current_span.get()
+        span = {
+            "name": name,
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "attributes": attributes,
+        }
+        token = _current_span.set(span)
+        otel_context = (
+            self._otel.start_as_current_span(name)
+            if self._otel is not None
+            else nullcontext()
+        )
+        start = time.perf_counter()
+        error = None
+        try:
+            with otel_context as otel_span:
+                yield attributes
+                if otel_span is not None:
+                    for key, value in attributes.items():
+                        if isinstance(value, (str, bool, int, float)):
+                            otel_span.set_attribute(key, value)
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _current_span.reset(token)
+            span["error"] = error
+            self._finish(span, time.time() - duration, duration)
+
+    def record(self, name: str, duration: float, **attributes) -> None:
+        """Records a span timed by the caller (e.g. across a generator's lifetime)."""
+        parent = _current_span.get()
+        span = {
+            "name": name,
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "attributes": attributes,
+            "error": None,
+        }
+        self._finish(span, time.time() - duration, duration)
+
+    def _finish(self, span: dict, start: float, duration: float) -> None:
+        span["start"] = round(start, 6)
+        span["duration_ms"] = round(duration * 1000, 3)
+        with self._lock:
+            self._durations[span["name"]].append(duration)
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(span, default=str) + "\n")
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Adds `value` to a counter, e.g. tokens or cache hits."""
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: The recorded durations in seconds per stage name, and the counters.
+        """
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+            return durations, dict(self._counters)
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: p50/p95 per stage, cache hit rates and counters, as a table.
+        """
+        durations, counters = self.snapshot()
+
+        lines = [f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for name in sorted(durations):
+            values = durations[name]
+            if not values:
+                continue
+            lines.append(
+                f"{name:<28}{len(values):>7}"
+                f"{percentile(values, 0.5) * 1000:>10.1f}"
+                f"{percentile(values, 0.95) * 1000:>10.1f}"
+                f"{max(values) * 1000:>10.1f}"
+            )
+
+        caches = sorted(
+            {name[: -len(".hit")] for name in counters if name.endswith(".hit")}
+            | {name[: -len(".miss")] for name in counters if name.endswith(".miss")}
+        )
+        for cache in caches:
+            hits = counters.pop(f"{cache}.hit", 0)
+            misses = counters.pop(f"{cache}.miss", 0)
+            total = hits + misses
+            rate = hits / total if total else 0.0
+            lines.append(f"{cache + ' hit rate':<28}{rate:>7.0%}  ({hits:.0f}/{total:.0f})")
+        for name in sorted(counters):
+            lines.append(f"{name:<28}{counters[name]:>7.0f}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._counters.clear()
+
+
+# The process-wide tracer used by every module
+tracer = Tracer()
+
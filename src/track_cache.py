@@ -0,0 +1,228 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import (
+    TRACK_CACHE_MEMORY_SIZE,
+    TRACK_CACHE_NEGATIVE_TTL,
+    TRACK_CACHE_PATH,
+    TRACK_CACHE_TTL,
+)
+
+# "Song (feat. Someone)", "Song [ft. Someone]", "Song - featuring Someone", but
+# not the words of titles such as "Feat of Strength"
+_FEATURING = re.compile(
+    r"\s*[\(\[]\s*(feat|ft|featuring)\b[^\)\]]*[\)\]]?|\s+-\s+(feat|ft|featuring)\b.*$",
+    re.IGNORECASE,
+)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a song title or artist name for use in cache keys.
+
+    Lowercases, folds accents, drops "feat." credits and punctuation, and
+    collapses whitespace, so that "Bésame (feat. X)" and "besame" match.
+
+    Args:
+        text (str): The raw title or artist name.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _FEATURING.sub("", text.lower())
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def normalize_key(song: str, artist: Optional[str]) -> str:
+    """
+    Builds the cache key for a (song, artist) pair.
+
+    Args:
+        song (str): The song title.
+        artist (str, optional): The artist name.
+
+    Returns:
+        str: The normalized key.
+    """
+    return f"{normalize_text(song)}|{normalize_text(artist or '')}"
+
+
+class TrackCache:
+    """
+    Two-tier cache mapping (song, artist) pairs to Spotify track URIs.
+
+    Lookups go to an in-memory LRU first and then to an SQLite file on disk.
+    Tracks that the search did not find are cached too (as None), with a
+    shorter TTL, so that hallucinated songs are not searched over and over.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = TRACK_CACHE_PATH,
+        memory_size: int = TRACK_CACHE_MEMORY_SIZE,
+        ttl: float = TRACK_CACHE_TTL,
+        negative_ttl: float = TRACK_CACHE_NEGATIVE_TTL,
+    ) -> None:
+        """
+        Initializes the cache and opens (or creates) the on-disk tier.
+
+        Args:
+            db_path (str, optional): Path of the SQLite file. None keeps the cache in memory only.
+            memory_size (int): Maximum number of entries kept in the LRU tier.
+            ttl (float): Lifetime in seconds of entries with a URI.
+            negative_ttl (float): Lifetime in seconds of "not found" entries.
+        """
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tracks "
+                "(key TEXT PRIMARY KEY, uri TEXT, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, uri: Optional[str], expires_at: float) -> None:
+        self._memory[key] = (uri, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def lookup(self, song: str, artist: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Looks up the URI of a song.
+
+        Args:
+            song (str): The song title.
+            artist (str, optional): The artist name.
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether the pair was cached, and its URI
+            (None if the track is known not to exist).
+        """
+        key = normalize_key(song, artist)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT uri, expires_at FROM tracks WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return True, row[0]
+
+            self.misses += 1
+            return False, None
+
+    def store(self, song: str, artist: Optional[str], uri: Optional[str]) -> None:
+        """
+        Stores the result of a search, including "not found" results.
+
+        Args:
+            song (str): The song title.
+            artist (str, optional): The artist name.
+            uri (str, optional): The resolved URI, or None if the search found nothing.
+        """
+        key = normalize_key(song, artist)
+        expires_at = time.time() + (self.ttl if uri else self.negative_ttl)
+        with self._lock:
+            self._remember(key, uri, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO tracks (key, uri, expires_at) VALUES (?, ?, ?)",
+                    (key, uri, expires_at),
+                )
+                self._db.commit()
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired entries from both tiers.
+
+        Returns:
+            int: The number of rows removed from the on-disk tier.
+        """
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, exp) in self._memory.items() if exp <= now]:
+                del self._memory[key]
+            if self._db is None:
+                return 0
+            cursor = self._db.execute("DELETE FROM tracks WHERE expires_at <= ?", (now,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def resolved_items(self) -> Iterator[Tuple[str, str]]:
+        """
+        Iterates over the unexpired entries that resolved to a URI.
+
+        Yields:
+            Tuple[str, str]: The normalized 'song|artist' key and its URI.
+        """
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key, uri FROM tracks WHERE uri IS NOT NULL AND expires_at > ?",
+                    (now,),
+                ).fetchall()
+            else:
+                rows = [
+                    (key, uri)
+                    for key, (uri, exp) in self._memory.items()
+                    if uri and exp > now
+                ]
+        yield from rows
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Reports the hit/miss counters of the cache.
+
+        Returns:
+            Dict[str, float]: Hits, disk hits, misses, hit rate and memory tier size.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self) -> None:
+        """Closes the on-disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import requests
+from spotipy.exceptions import SpotifyException
+
+from config import (
+    SPOTIFY_REQUESTS_BURST,
+    SPOTIFY_REQUESTS_PER_SECOND,
+    SPOTIFY_RETRY_BACKOFF,
+    SPOTIFY_SEARCH_RETRIES,
+    SPOTIFY_SEARCH_WORKERS,
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker talking to the same API.
+
+    Besides the steady refill rate, the bucket can be paused as a whole when
+    the server answers 429, so that all workers back off together instead of
+    each one discovering the rate limit on its own.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum number of tokens (burst size).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(
+                        self.capacity, self._tokens + (now - self._updated) * self.rate
+                    )
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out tokens for the given number of seconds.
+
+        Args:
+            seconds (float): How long to hold every caller back.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def _retry_after(error: SpotifyException) -> float:
+    """Reads the Retry-After header of a 429 response, in seconds."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class TrackResolver:
+    """
+    Resolves many (song, artist) pairs concurrently on a bounded thread pool.
+
+    Every search goes through a shared token bucket; 429 responses pause the
+    bucket for the advertised Retry-After, and transient failures (5xx,
+    connection errors, timeouts) are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        search_fn: Callable[[str, Optional[str]], Optional[str]],
+        max_workers: int = SPOTIFY_SEARCH_WORKERS,
+        bucket: Optional[TokenBucket] = None,
+        max_retries: int = SPOTIFY_SEARCH_RETRIES,
+        backoff: float = SPOTIFY_RETRY_BACKOFF,
+    ) -> None:
+        """
+        Args:
+            search_fn (Callable): Function searching a single (song, artist) pair and returning its URI or None.
+            max_workers (int): Maximum number of searches in flight.
+            bucket (TokenBucket, optional): Rate limiter to share with other resolvers.
+            max_retries (int): Retries for a single search before giving up.
+            backoff (float): Base delay in seconds of the exponential backoff.
+        """
+        self.search_fn = search_fn
+        self.bucket = bucket or TokenBucket(
+            SPOTIFY_REQUESTS_PER_SECOND, SPOTIFY_REQUESTS_BURST
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="track-resolver"
+        )
+
+    def _search_with_retries(self, song: str, artist: Optional[str]) -> Optional[str]:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return self.search_fn(song, artist)
+            except SpotifyException as e:
+                if attempt >= self.max_retries:
+                    raise
+                if e.http_status == 429:
+                    self.bucket.pause(_retry_after(e))
+                elif e.http_status is None or e.http_status < 500:
+                    raise
+                else:
+                    time.sleep(random.uniform(0, self.backoff * 2**attempt))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(random.uniform(0, self.backoff * 2**attempt))
+            attempt += 1
+
+    def submit(self, song: str, artist: Optional[str]) -> Future:
+        """
+        Schedules the search of a single track.
+
+        Returns:
+            Future: Resolves to the URI (or None if not found), or raises the last error.
+        """
+        return self._executor.submit(self._search_with_retries, song, artist)
+
+    def resolve(self, pairs: Sequence[Tuple[str, Optional[str]]]) -> List[Future]:
+        """
+        Schedules the search of every pair.
+
+        Args:
+            pairs (Sequence[Tuple[str, Optional[str]]]): (song, artist) pairs.
+
+        Returns:
+            List[Future]: One future per pair, in the same order as the input.
+        """
+        return [self.submit(song, artist) for song, artist in pairs]
+
+    def shutdown(self) -> None:
+        """Stops the worker threads once pending searches are done."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Callable, Iterable, List
+
+from config import TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, TTS_LANG
+from tracing import tracer
+
+
+def gtts_synthesize(text: str, lang: str, path: str) -> None:
+    """Synthesizes `text` to an MP3 file with Google Text-to-Speech, over the shared session."""
+    from gtts import gTTS
+
+    from http_transport import gtts_stream
+
+    with open(path, "wb") as f:
+        for chunk in gtts_stream(gTTS(text, lang=lang)):
+            f.write(chunk)
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech on disk.
+
+    Each phrase is stored once as an MP3 named after the hash of its language
+    and text. Files are touched on use and the least recently used ones are
+    deleted when the cache grows over `max_bytes`. Phrases can be synthesized
+    ahead of time in the background, and longer announcements can be
+    assembled from cached fragments (MP3 frames concatenate cleanly).
+    """
+
+    def __init__(
+        self,
+        directory: str = TTS_CACHE_DIR,
+        max_bytes: int = TTS_CACHE_MAX_BYTES,
+        lang: str = TTS_LANG,
+        synthesize: Callable[[str, str, str], None] = gtts_synthesize,
+    ) -> None:
+        """
+        Args:
+            directory (str): Where the MP3 files are kept.
+            max_bytes (int): Size above which least recently used files are evicted.
+            lang (str): Language passed to the synthesizer.
+            synthesize (Callable): Writes the speech for (text, lang) to a path.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lang = lang
+        self.synthesize = synthesize
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        digest = hashlib.sha256(f"{self.lang}\0{key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.mp3")
+
+    def _lock_for(self, path: str) -> threading.Lock:
+        # One lock per file, so a phrase being prefetched is not synthesized twice
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _produce(self, path: str, write: Callable[[str], None]) -> str:
+        with self._lock_for(path):
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                tracer.count("tts_cache.hit")
+                return path
+            self.misses += 1
+            tracer.count("tts_cache.miss")
+            fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.directory)
+            os.close(fd)
+            try:
+                with tracer.span("tts.synthesize"):
+                    write(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def get(self, text: str) -> str:
+        """
+        Returns the MP3 for a phrase, synthesizing it on a miss.
+
+        Args:
+            text (str): The phrase.
+
+        Returns:
+            str: Path of the cached MP3.
+        """
+        return self._produce(
+            self.path_for(text), lambda tmp: self.synthesize(text, self.lang, tmp)
+        )
+
+    def assemble(self, fragments: List[str]) -> str:
+        """
+        Returns an MP3 made of the cached speech of each fragment, in order.
+
+        Args:
+            fragments (List[str]): Phrases to say one after another.
+
+        Returns:
+            str: Path of the cached MP3.
+        """
+        def concatenate(tmp_path):
+            with open(tmp_path, "wb") as out:
+                for fragment in fragments:
+                    # Just touched by get(), so it is the last file eviction would pick
+                    with open(self.get(fragment), "rb") as f:
+                        out.write(f.read())
+
+        return self._produce(self.path_for("\0".join(fragments)), concatenate)
+
+    def prefetch(self, texts: Iterable[str]) -> threading.Thread:
+        """
+        Synthesizes phrases in the background.
+
+        Args:
+            texts (Iterable[str]): Phrases that will be needed soon.
+
+        Returns:
+            threading.Thread: The (daemon) worker thread.
+        """
+
+        def run():
+            for text in texts:
+                try:
+                    self.get(text)
+                except Exception as e:
+                    print(f"Error pre-synthesizing '{text}': {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def evict(self) -> None:
+        """Deletes the least recently used files until the cache fits in `max_bytes`."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,293 @@
+import queue
+import threading
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from config import (
+    VAD_AGGRESSIVENESS,
+    VAD_ENERGY_RATIO,
+    VAD_FRAME_MS,
+    VAD_HANGOVER_MS,
+    VAD_MAX_UTTERANCE_SECONDS,
+    VAD_MUSIC_ENERGY_RATIO,
+    VAD_PADDING_MS,
+    VAD_START_MS,
+)
+
+try:
+    import webrtcvad
+except ImportError:  # the energy detector is used instead
+    webrtcvad = None
+
+
+class EnergyVAD:
+    """
+    Frame classifier comparing the RMS energy of a frame to an adaptive noise floor.
+    """
+
+    def __init__(self, ratio: float = VAD_ENERGY_RATIO, min_rms: float = 200.0) -> None:
+        """
+        Args:
+            ratio (float): How many times louder than the noise floor speech must be.
+            min_rms (float): Absolute floor, so that silence in a quiet room is not speech.
+        """
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.noise_floor = min_rms
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+        speech = rms > max(self.min_rms, self.noise_floor * self.ratio)
+        if not speech:
+            # Track the background slowly so steady noise never counts as speech
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * max(rms, 1.0)
+        return speech
+
+
+class MusicLevel:
+    """
+    Follows the loudness of the music heard by the microphone. The level
+    falls quickly and rises slowly, so that a few frames of speech barely
+    move it; for `settle_frames` after the music starts it is only learned.
+    """
+
+    def __init__(
+        self,
+        ratio: float = VAD_MUSIC_ENERGY_RATIO,
+        rise: float = 0.05,
+        fall: float = 0.2,
+        settle_frames: int = 16,
+        min_rms: float = 200.0,
+    ) -> None:
+        """
+        Args:
+            ratio (float): How many times louder than the music speech must be.
+            rise (float): Share of the gap closed per frame when the frame is louder.
+            fall (float): Share of the gap closed per frame when it is quieter.
+            settle_frames (int): Frames spent learning the level after the music starts.
+            min_rms (float): Starting level.
+        """
+        self.ratio = ratio
+        self.rise = rise
+        self.fall = fall
+        self.settle_frames = settle_frames
+        self.level = min_rms
+        self._settling = 0
+
+    def restart(self) -> None:
+        """The music (re)started: learn its level before judging frames against it."""
+        self._settling = self.settle_frames
+
+    def update(self, frame: np.ndarray) -> bool:
+        """Follows the frame's loudness; returns whether it stands out from the music."""
+        rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+        if self._settling:
+            self._settling -= 1
+            self.level += 0.3 * (rms - self.level)
+            return False
+        above = rms > self.level * self.ratio
+        self.level += (self.rise if rms > self.level else self.fall) * (rms - self.level)
+        return above
+
+
+class WebRTCVAD:
+    """Frame classifier backed by the webrtcvad package."""
+
+    def __init__(self, sample_rate: int, aggressiveness: int = VAD_AGGRESSIVENESS) -> None:
+        self.sample_rate = sample_rate
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        return self._vad.is_speech(frame.astype(np.int16).tobytes(), self.sample_rate)
+
+
+def make_vad(sample_rate: int):
+    """
+    Picks the best available frame classifier.
+
+    Args:
+        sample_rate (int): Sample rate of the frames, in Hz.
+
+    Returns:
+        WebRTCVAD or EnergyVAD: WebRTC's detector when installed and the rate is supported.
+    """
+    if webrtcvad is not None and sample_rate in (8000, 16000, 32000, 48000):
+        return WebRTCVAD(sample_rate)
+    return EnergyVAD()
+
+
+class UtteranceDetector:
+    """
+    Turns per-frame speech decisions into utterance boundaries.
+
+    An utterance opens after `start_ms` of consecutive speech and closes after
+    `hangover_ms` of silence (or at `max_seconds`). Boundaries are absolute
+    sample positions, padded on both sides and with trailing silence trimmed.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_ms: int = VAD_FRAME_MS,
+        start_ms: int = VAD_START_MS,
+        hangover_ms: int = VAD_HANGOVER_MS,
+        padding_ms: int = VAD_PADDING_MS,
+        max_seconds: float = VAD_MAX_UTTERANCE_SECONDS,
+    ) -> None:
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.padding = sample_rate * padding_ms // 1000
+        self.max_samples = int(sample_rate * max_seconds)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forgets the utterance in progress, if any."""
+        self._speech_run = 0
+        self._silence_run = 0
+        self._start: Optional[int] = None
+        self._last_speech = 0
+
+    @property
+    def in_utterance(self) -> bool:
+        return self._start is not None
+
+    def update(self, position: int, speech: bool):
+        """
+        Feeds the decision for the frame starting at `position`.
+
+        Returns:
+            str or tuple, optional: "start" when an utterance opens, (start, end)
+            sample positions when it closes, None otherwise.
+        """
+        end_of_frame = position + self.frame_size
+        if self._start is None:
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self.start_frames:
+                first = end_of_frame - self._speech_run * self.frame_size
+                self._start = max(0, first - self.padding)
+                self._last_speech = end_of_frame
+                self._silence_run = 0
+                return "start"
+            return None
+
+        if speech:
+            self._last_speech = end_of_frame
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+        too_long = end_of_frame - self._start >= self.max_samples
+        if self._silence_run >= self.hangover_frames or too_long:
+            bounds = (self._start, self._last_speech + self.padding)
+            self._start = None
+            self._speech_run = 0
+            return bounds
+        return None
+
+
+class VADListener:
+    """
+    Hands-free capture on top of a RingBufferRecorder.
+
+    The recorder keeps writing the microphone into its ring buffer while the
+    listener classifies its blocks frame by frame; every utterance is yielded
+    as soon as its end is detected, as a slice of the ring buffer.
+
+    The DJ hears itself: audio is ignored while `muted` is set (e.g. during
+    announcements), and while music plays an utterance only opens on speech
+    `VAD_MUSIC_ENERGY_RATIO` times louder than the music. Audio heard while
+    an utterance is handled is dropped rather than queued up.
+    """
+
+    def __init__(
+        self,
+        recorder,
+        on_speech_start: Optional[Callable[[], None]] = None,
+        muted: Optional[threading.Event] = None,
+        music_playing: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        """
+        Args:
+            recorder (RingBufferRecorder): The recorder to listen through.
+            on_speech_start (Callable, optional): Called when an utterance opens, e.g. to pause the music.
+            muted (threading.Event, optional): Set while the microphone should be ignored.
+            music_playing (Callable, optional): Tells whether music is playing on the speakers.
+        """
+        self.recorder = recorder
+        self.on_speech_start = on_speech_start
+        self.muted = muted
+        self.music_playing = music_playing
+        self.vad = make_vad(recorder.sample_rate)
+        self.music = MusicLevel()
+        self._music_was_playing = False
+        self.detector = UtteranceDetector(recorder.sample_rate)
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        speech = self.vad.is_speech(frame)
+        if self.detector.in_utterance:
+            # The music is paused once the user is heard
+            return speech
+        playing = self.music_playing is not None and self.music_playing()
+        if playing and not self._music_was_playing:
+            self.music.restart()
+        self._music_was_playing = playing
+        above_music = self.music.update(frame)
+        return speech and above_music if playing else speech
+
+    def utterances(self, stop: Optional[threading.Event] = None) -> Iterator[np.ndarray]:
+        """
+        Listens until `stop` is set, yielding each utterance once it ends.
+
+        Yielded arrays may be views into the ring buffer: use them before the
+        recorder wraps around (its `max_seconds`).
+
+        Args:
+            stop (threading.Event, optional): Ends the capture when set.
+
+        Yields:
+            np.ndarray: Mono int16 samples of one utterance, silence trimmed.
+        """
+        blocks: "queue.Queue[np.ndarray]" = queue.Queue()
+        frame_size = self.detector.frame_size
+        self.recorder.reset()
+        self.recorder.on_block = blocks.put
+        pending = np.empty(0, dtype=np.int16)
+        position = 0
+        try:
+            with self.recorder.stream():
+                while stop is None or not stop.is_set():
+                    try:
+                        block = blocks.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if self.muted is not None and self.muted.is_set():
+                        position += len(pending) + len(block)
+                        pending = pending[:0]
+                        self.detector.reset()
+                        continue
+                    pending = np.concatenate((pending, block))
+                    while len(pending) >= frame_size:
+                        frame, pending = pending[:frame_size], pending[frame_size:]
+                        event = self.detector.update(position, self._is_speech(frame))
+                        position += frame_size
+                        if event == "start":
+                            if self.on_speech_start is not None:
+                                try:
+                                    self.on_speech_start()
+                                except Exception as e:
+                                    # e.g. pausing music that is already paused
+                                    print(f"An error occurred at the start of speech: {e}")
+                        elif event is not None:
+                            yield self.recorder.slice(*event)
+                            # Skips what was heard while the utterance was handled
+                            position += len(pending)
+                            pending = pending[:0]
+                            while True:
+                                try:
+                                    position += len(blocks.get_nowait())
+                                except queue.Empty:
+                                    break
+                            self.detector.reset()
+        finally:
+            self.recorder.on_block = None
@@ -1,35 +1,135 @@
-import openai
-from openai import OpenAI
 import os
-import tempfile
-from gtts import gTTS
-import playsound
+import wave
 from dotenv import load_dotenv
 
+from config import HTTP_RETRIES, HTTP_TIMEOUT
+from lazy import Lazy
+from speech_output import SpeechOutput
+from tts_cache import TTSCache
+from tracing import tracer
+
 # Load environment variables
 path = os.path.dirname(os.path.abspath(__file__))
 path2secrets = os.path.join(path, "../secrets/.env")
 load_dotenv(path2secrets)
 openai_api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI()
 
 
-def speak_text(text):
+def _make_client():
+    from openai import OpenAI
+
+    from http_transport import shared_http_client
+
+    # Shares its connection pool with the chat models
+    return OpenAI(
+        http_client=shared_http_client(), timeout=HTTP_TIMEOUT, max_retries=HTTP_RETRIES
+    )
+
+
+def _make_transcriber():
+    from stt_backends import create_backend
+
+    # Selected with DJ_STT_BACKEND ("api", "local" or "local+api"); the
+    # OpenAI client is only built if the API backend is
+    backend = create_backend(make_client=client.get)
+    backend.warm_up()
+    return backend
+
+
+def play_audio(path):
+    """Plays an audio file, blocking until it is done."""
+    import playsound
+
+    playsound.playsound(path)
+
+
+# Built on first use, or in the background by warm_up()
+client = Lazy(_make_client, "OpenAI client")
+transcriber = Lazy(_make_transcriber, "transcription backend")
+# Synthesized speech is cached on disk, so stock phrases hit the network once
+tts_cache = TTSCache()
+# Announcements are synthesized and played off the caller's thread, in order;
+# set speech.on_start / speech.on_end to duck the music around them
+speech = SpeechOutput(tts_cache, play=play_audio)
+
+# Fixed announcements, synthesized ahead of time by presynthesize_phrases()
+GREETING_WITH_TASTE = (
+    "Hey there! Based on your music taste from spotify, I see what you enjoy. Let's get started!"
+)
+GREETING = "Hey there! I'm excited to build a playlist just for you!"
+INTRO = "Alright, DJ NEA is crafting a playlist just for you. Enjoy!"
+GOODBYE = "Goodbye! Thanks for listening with DJ NEA! Catch you next time!"
+NOW_PLAYING_PREFIX = "Got it! Now playing"
+NOW_PLAYING_SUFFIX = "Hope you enjoy it!"
+STOCK_PHRASES = [
+    GREETING_WITH_TASTE,
+    GREETING,
+    INTRO,
+    GOODBYE,
+    NOW_PLAYING_PREFIX,
+    NOW_PLAYING_SUFFIX,
+]
+
+
+def speak_text(text, block=False):
     """
     Uses Google Text-to-Speech (gTTS) for more natural-sounding TTS.
+    The audio comes from the TTS cache when the phrase was said before.
+
+    Args:
+        text (str): The phrase to say.
+        block (bool): Wait until the phrase has been played.
+
+    Returns:
+        Future: Resolves once the phrase has been played.
     """
-    try:
-        tts = gTTS(text, lang="en")
-        with tempfile.NamedTemporaryFile(delete=True, suffix=".mp3") as temp_audio_file:
-            tts.save(temp_audio_file.name)
-            playsound.playsound(temp_audio_file.name)
-    except Exception as e:
-        print(f"Error using gTTS: {e}")
+    future = speech.say(text)
+    if block:
+        try:
+            future.result()
+        except Exception:
+            pass  # already reported by the speech worker
+    return future
+
+
+def warm_up():
+    """Starts the OpenAI client and the transcription backend in the background."""
+    return transcriber.warm_up()
+
+
+def presynthesize_phrases():
+    """Synthesizes the stock announcements in the background at startup."""
+    return tts_cache.prefetch(STOCK_PHRASES)
+
+
+def prepare_announcement(song):
+    """
+    Synthesizes the title part of a "Now playing" announcement in the background,
+    typically for a queued track while the current one plays.
+
+    Args:
+        song: The upcoming song (anything whose str() is 'Song Title - Artist').
+    """
+    return tts_cache.prefetch([str(song)])
+
+
+def announce_now_playing(song):
+    """
+    Says "Now playing <song>", assembled from the cached stock fragments and
+    the (usually prefetched) song title, without waiting for it.
+
+    Args:
+        song: The song that started (anything whose str() is 'Song Title - Artist').
+
+    Returns:
+        Future: Resolves once the announcement has been played.
+    """
+    return speech.say_fragments([NOW_PLAYING_PREFIX, str(song), NOW_PLAYING_SUFFIX])
 
 
 def listen_user(audio_file_path):
     """
-    Records audio from the user's microphone and transcribes it using OpenAI's Whisper API.
+    Transcribes a recorded 16-bit WAV file with the configured transcription backend.
 
     Args:
         audio_file_path (str): Path to the audio file to transcribe.
@@ -37,15 +137,15 @@ def listen_user(audio_file_path):
     Returns:
         str: The transcribed text from the user's speech.
     """
+    import numpy as np
+
     try:
-        # Open the audio file
-        with open(audio_file_path, "rb") as audio_file:
-            # Call OpenAI's Whisper API using the 'transcribe' method
-            response = client.audio.transcriptions.create(
-                model="whisper-1", file=audio_file
-            )
-        # Extract the transcribed text from the response
-        transcribed_text = response.text.strip()
+        with wave.open(audio_file_path, "rb") as wf:
+            channels, sample_rate = wf.getnchannels(), wf.getframerate()
+            samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        transcribed_text = transcribe_audio(samples, sample_rate)
     except Exception as e:
         print(f"An error occurred during transcription: {e}")
         transcribed_text = ""
@@ -55,3 +155,31 @@ def listen_user(audio_file_path):
             os.remove(audio_file_path)
 
     return transcribed_text
+
+
+def transcribe_audio(samples, sample_rate):
+    """
+    Transcribes recorded samples with the configured backend (local model or
+    OpenAI's Whisper API) without touching the disk.
+
+    Args:
+        samples (np.ndarray): Mono int16 samples.
+        sample_rate (int): Sample rate of the samples, in Hz.
+
+    Returns:
+        str: The transcribed text from the user's speech.
+    """
+    if not len(samples):
+        print("No audio frames recorded.")
+        return ""
+    try:
+        backend = transcriber.get()
+        with tracer.span(
+            "stt.transcribe",
+            backend=backend.name,
+            audio_seconds=round(len(samples) / sample_rate, 2),
+        ):
+            return backend.transcribe(samples, sample_rate)
+    except Exception as e:
+        print(f"An error occurred during transcription: {e}")
+        return ""
@@ -0,0 +1,29 @@
+class VolumeDucker:
+    """Lowers the playback volume while the DJ speaks and restores it afterwards."""
+
+    def __init__(self, player, device_id=None, ratio=0.3):
+        """
+        Parameters:
+            player (SpotifyPlayer): The player whose device volume is changed.
+            device_id (str, optional): The playback device.
+            ratio (float): Share of the volume kept while ducked.
+        """
+        self.player = player
+        self.device_id = device_id
+        self.ratio = ratio
+        self._saved_volume = None
+
+    def duck(self):
+        """Lower the volume to `ratio` of its current value."""
+        volume = self.player.get_volume()
+        if volume is None:
+            return
+        self._saved_volume = volume
+        self.player.set_volume(int(volume * self.ratio), device_id=self.device_id)
+
+    def restore(self):
+        """Restore the volume saved by the last duck()."""
+        if self._saved_volume is None:
+            return
+        self.player.set_volume(self._saved_volume, device_id=self.device_id)
+        self._saved_volume = None
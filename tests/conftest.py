@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live flat in src/, as main.py imports them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+# Stand-ins for Spotify, the LLM and the microphone, shared with the benchmark
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../benchmarks"))
@@ -0,0 +1,61 @@
+import importlib
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from stubs import FakeSoundDevice, synthetic_speech_wav
+
+
+@pytest.fixture
+def audio_capture(monkeypatch):
+    # The recorder talks to the fake device, installed or not the real one
+    device = FakeSoundDevice(synthetic_speech_wav(1, sample_rate=48000), speed=50)
+    monkeypatch.setitem(sys.modules, "sounddevice", device)
+    monkeypatch.delitem(sys.modules, "audio_capture", raising=False)
+    module = importlib.import_module("audio_capture")
+    yield module
+    sys.modules.pop("audio_capture", None)
+
+
+def test_ring_buffer_keeps_the_last_samples(audio_capture):
+    recorder = audio_capture.RingBufferRecorder(sample_rate=48000, max_seconds=0.001)  # 48 samples
+    assert recorder.capacity == 48 and recorder.capture_rate == 48000
+    recorder.write(np.arange(30, dtype=np.int16))
+    assert np.array_equal(recorder.view(), np.arange(30))
+
+    recorder.write(np.arange(30, 60, dtype=np.int16))
+    assert recorder.written == 60
+    assert np.array_equal(recorder.view(), np.arange(12, 60))
+    # Wrapped ranges are unrolled, overwritten ones clamped
+    assert np.array_equal(recorder.slice(40, 55), np.arange(40, 55))
+    assert np.array_equal(recorder.slice(0, 20), np.arange(12, 20))
+    assert len(recorder.slice(70, 80)) == 0
+
+    recorder.write(np.arange(100, dtype=np.int16))
+    assert np.array_equal(recorder.view(), np.arange(52, 100))
+    recorder.reset()
+    assert recorder.written == 0 and recorder.duration() == 0
+
+
+def test_blocks_are_resampled_to_the_target_rate(audio_capture):
+    recorder = audio_capture.RingBufferRecorder(sample_rate=16000, max_seconds=1)
+    # The fake device only records at 48 kHz
+    assert recorder.capture_rate == 48000
+    block = np.arange(0, 4800, 10, dtype=np.int16).reshape(-1, 1)  # 480 samples
+    received = []
+    recorder.on_block = received.append
+    recorder.callback(block, len(block), None, None)
+    recorder.callback(block, len(block), None, None)
+    assert recorder.written == 320
+    assert np.array_equal(received[0], np.arange(0, 4800, 30))
+
+
+def test_stream_records_the_device(audio_capture):
+    recorder = audio_capture.RingBufferRecorder(sample_rate=48000, max_seconds=1)
+    heard = threading.Event()
+    recorder.on_block = lambda block: heard.set()
+    with recorder.stream():
+        assert heard.wait(2)
+    assert recorder.written > 0
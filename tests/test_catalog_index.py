@@ -0,0 +1,46 @@
+import builtins
+
+from catalog_index import CatalogIndex
+
+
+def track(uri, name, artist):
+    return {"uri": uri, "name": name, "artists": [{"name": artist}]}
+
+
+def test_add_tracks_writes_the_file_once_and_reloads(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.tsv")
+    catalog = CatalogIndex(path)
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(builtins, "open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+
+    tracks = [track(f"spotify:track:{i}", f"Song number {i}", f"Artist {i}") for i in range(50)]
+    assert catalog.add_tracks(tracks) == 50
+    assert opened == [path]
+
+    # Known tracks are not written again
+    catalog.add_tracks(tracks)
+    assert opened == [path]
+
+    monkeypatch.undo()
+    reloaded = CatalogIndex(path)
+    assert len(reloaded) == 50
+    assert reloaded.match("Song number 7", "Artist 7")[0] == "spotify:track:7"
+
+
+def test_title_and_artist_match_tolerates_small_differences():
+    catalog = CatalogIndex(None)
+    catalog.add_tracks([track("spotify:track:hey", "Hey Jude", "The Beatles")])
+    assert catalog.match("Hey  jude!", "the Beatles")[0] == "spotify:track:hey"
+    assert catalog.match("Yellow Submarine", "The Beatles") is None
+
+
+def test_title_alone_matches_only_when_one_artist_has_it():
+    catalog = CatalogIndex(None)
+    catalog.add_tracks([track("spotify:track:adele", "Hello", "Adele")])
+    assert catalog.match("Hello")[0] == "spotify:track:adele"
+
+    catalog.add_tracks([track("spotify:track:lionel", "Hello", "Lionel Richie")])
+    # Left to the search endpoint, which ranks by popularity
+    assert catalog.match("Hello") is None
+    assert catalog.match("Hello", "Lionel Richie")[0] == "spotify:track:lionel"
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from chatgpt_handler import NextSongsSuggester  # noqa: E402
+from prompt_builder import ProfileStore  # noqa: E402
+from stubs import FakeChatModel, Latency  # noqa: E402
+
+SONGS = [("Song A", "Artist A"), ("Song B", "Artist B"), ("Song C", "Artist C")]
+
+
+def make_suggester(songs=SONGS, **kwargs):
+    reply = json.dumps([{"song_name": title, "artist": artist} for title, artist in songs])
+    model = FakeChatModel([], first_token=Latency(0), token_delay=0, reply=reply)
+    return NextSongsSuggester(
+        n_recommendations=2,
+        overrequest=0,
+        chat_model=model,
+        mood_model=model,
+        profiles=ProfileStore(summarize=None, path=None),
+        **kwargs,
+    )
+
+
+def titles(songs):
+    return [song.song_name for song in songs]
+
+
+def test_only_played_songs_are_excluded_from_later_answers():
+    suggester = make_suggester()
+    assert titles(suggester.pipeline("party")) == ["Song A", "Song B"]
+    # Suggested but never played: still available
+    assert titles(suggester.pipeline_stream("party")) == ["Song A", "Song B"]
+
+    first = suggester.pipeline("party")[0]
+    suggester.record_played(first)
+    assert titles(suggester.pipeline("party")) == ["Song B", "Song C"]
+    assert titles(suggester.pipeline_stream("party")) == ["Song B", "Song C"]
+
+
+def test_repeated_songs_of_an_answer_are_selected_once():
+    suggester = make_suggester(SONGS[:1] * 2 + SONGS[1:])
+    assert titles(suggester.pipeline("party")) == ["Song A", "Song B"]
+    assert titles(suggester.pipeline_stream("party")) == ["Song A", "Song B"]
+
+
+def test_the_session_mood_only_changes_when_asked():
+    suggester = make_suggester(fold_mood=True)
+    suggester.mood = "calm"
+    suggester.pipeline("I feel happy")
+    list(suggester.pipeline_stream("I feel happy"))
+    assert suggester.mood == "calm"
+
+    list(suggester.pipeline_stream("I feel happy", on_mood=suggester.set_mood))
+    assert suggester.mood == "happy"
@@ -0,0 +1,173 @@
+import asyncio
+import time
+import urllib.parse
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("spotipy")
+pytest.importorskip("langchain_openai")
+
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+import dj_server  # noqa: E402
+from catalog_index import CatalogIndex  # noqa: E402
+from prompt_builder import ProfileStore  # noqa: E402
+from stubs import FakeChatModel, Latency, StubSpotifyServer, make_catalog  # noqa: E402
+from track_cache import TrackCache  # noqa: E402
+
+
+class FakeAuthManager:
+    """One user's OAuth manager: authorized once a code was exchanged."""
+
+    authorized = set()
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cache_handler = self
+
+    def get_authorize_url(self, state=None):
+        return "https://accounts.example/authorize?" + urllib.parse.urlencode({"state": state})
+
+    def get_cached_token(self):
+        if self.user_id in self.authorized:
+            return {"access_token": "stub-token", "expires_at": time.time() + 3600}
+        return None
+
+    def validate_token(self, token):
+        return token
+
+    def get_access_token(self, code=None, check_cache=True, as_dict=False):
+        if code is not None:
+            self.authorized.add(self.user_id)
+        return "stub-token"
+
+
+@pytest.fixture
+def spotify():
+    catalog = make_catalog(size=200, artists=20)
+    server = StubSpotifyServer(catalog, latency=Latency(0.0)).start()
+    server.catalog = catalog
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def server(spotify, tmp_path, monkeypatch):
+    FakeAuthManager.authorized = set()
+    monkeypatch.setattr(dj_server, "LIBRARY_SYNC", False)
+    monkeypatch.setattr(dj_server, "LIBRARY_DIR", str(tmp_path / "library"))
+    monkeypatch.setattr(dj_server, "HISTORY_DIR", str(tmp_path / "history"))
+    monkeypatch.setattr(dj_server, "TrackCache", lambda: TrackCache(db_path=None))
+    monkeypatch.setattr(dj_server, "CatalogIndex", lambda: CatalogIndex(path=None))
+    monkeypatch.setattr(
+        dj_server, "ProfileStore", lambda summarize: ProfileStore(path=str(tmp_path / "p.json"))
+    )
+    models = FakeChatModel(spotify.catalog, first_token=Latency(0.0), token_delay=0)
+    monkeypatch.setattr(dj_server, "make_chat_models", lambda: (models, models))
+    monkeypatch.setattr(dj_server.DJServer, "_auth_manager", lambda self, user: FakeAuthManager(user))
+    return dj_server.DJServer(
+        "id", "secret", token_dir=str(tmp_path / "tokens"), max_sessions=2, api_url=spotify.api_url
+    )
+
+
+def run(server, scenario):
+    async def main():
+        async with TestClient(TestServer(server.make_app())) as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+async def log_in(client, user):
+    response = await client.get(f"/login?user={user}", allow_redirects=False)
+    assert response.status == 302
+    state = urllib.parse.parse_qs(urllib.parse.urlparse(response.headers["Location"]).query)["state"][0]
+    response = await client.get(f"/callback?state={state}&code=code")
+    assert response.status == 200
+    token = (await response.text()).rsplit(" ", 1)[-1]
+    client.session.cookie_jar.clear()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_login_rejects_forged_or_replayed_state(server):
+    async def scenario(client):
+        response = await client.get("/login?user=alice", allow_redirects=False)
+        state = urllib.parse.parse_qs(urllib.parse.urlparse(response.headers["Location"]).query)["state"][0]
+        assert state != "alice"
+        assert (await client.get("/callback?state=alice&code=code")).status == 400
+        client.session.cookie_jar.clear()
+        # Another browser, without the login's cookie
+        assert (await client.get(f"/callback?state={state}&code=code")).status == 400
+        assert "alice" not in FakeAuthManager.authorized
+
+    run(server, scenario)
+
+
+def test_sessions_require_the_users_token(server):
+    async def scenario(client):
+        assert (await client.post("/sessions", json={"user": "alice"})).status == 401
+        alice = await log_in(client, "alice")
+        bob = await log_in(client, "bob")
+        forged = {"Authorization": alice["Authorization"].replace("alice", "bob", 1)}
+        assert (await client.post("/sessions", json={}, headers=forged)).status == 401
+        assert (await client.post("/sessions", json={"user": "bob"}, headers=alice)).status == 403
+
+        response = await client.post("/sessions", json={"mood": "happy"}, headers=alice)
+        assert response.status == 201
+        session = (await response.json())["session"]
+        assert (await client.get(f"/sessions/{session}")).status == 401
+        assert (await client.get(f"/sessions/{session}", headers=bob)).status == 404
+        response = await client.post(
+            f"/sessions/{session}/commands", json={"text": "stop"}, headers=bob
+        )
+        assert response.status == 404
+        assert (await client.delete(f"/sessions/{session}", headers=bob)).status == 404
+        assert (await client.get(f"/sessions/{session}", headers=alice)).status == 200
+        assert (await client.delete(f"/sessions/{session}", headers=alice)).status == 200
+
+    run(server, scenario)
+
+
+def test_session_plays_through_the_stub(server, spotify):
+    async def scenario(client):
+        alice = await log_in(client, "alice")
+        response = await client.post("/sessions", json={"mood": "happy"}, headers=alice)
+        session = (await response.json())["session"]
+        response = await client.post(
+            f"/sessions/{session}/commands",
+            json={"text": "play some upbeat latin music for a party"},
+            headers=alice,
+        )
+        assert response.status == 202
+        for _ in range(100):
+            if spotify.current:
+                break
+            await asyncio.sleep(0.05)
+        assert spotify.current is not None
+        await client.delete(f"/sessions/{session}", headers=alice)
+
+    run(server, scenario)
+
+
+def test_session_limit(server):
+    async def scenario(client):
+        alice = await log_in(client, "alice")
+        responses = await asyncio.gather(
+            *(client.post("/sessions", json={}, headers=alice) for _ in range(4))
+        )
+        statuses = sorted(response.status for response in responses)
+        assert statuses == [201, 201, 503, 503]
+        for response in responses:
+            if response.status == 201:
+                session = (await response.json())["session"]
+                await client.delete(f"/sessions/{session}", headers=alice)
+
+    run(server, scenario)
+
+
+def test_shutdown_closes_the_libraries(server):
+    library = server._library("alice")
+    run(server, lambda client: asyncio.sleep(0))
+    with pytest.raises(Exception):
+        library.taste_summary()
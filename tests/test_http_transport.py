@@ -0,0 +1,47 @@
+import base64
+import io
+import os
+
+import pytest
+import requests
+
+from http_transport import _GTTS_TESTED_VERSIONS, gtts_stream
+
+REQUIREMENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../requirements.txt")
+AUDIO = b"\xff\xf3fake mp3 frames"
+
+
+def _response(request, **kwargs):
+    line = 'jQ1olc","[\\"%s\\"]' % base64.b64encode(AUDIO).decode("ascii")
+    response = requests.Response()
+    response.status_code = 200
+    response.request = request
+    response.raw = io.BytesIO(f")]}}'\n\n{line}\n".encode("utf-8"))
+    return response
+
+
+def test_gtts_pin_matches_the_tested_releases():
+    # gtts_stream copies gTTS internals: a release is added to the pin and to
+    # _GTTS_TESTED_VERSIONS together, once the test below passes against it
+    with open(REQUIREMENTS, encoding="utf-8") as f:
+        pins = [line.split("#")[0].strip() for line in f if line.lower().startswith("gtts")]
+    assert pins == ["gTTS>=2.5,<2.6"]
+    assert _GTTS_TESTED_VERSIONS == ("2.5.",)
+
+
+def test_gtts_stream_matches_gtts(monkeypatch):
+    gtts = pytest.importorskip("gtts")
+    sent = []
+
+    def send(session, request, **kwargs):
+        sent.append(request)
+        return _response(request)
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    tts = gtts.gTTS("Hello there. This is the DJ speaking.", lang="en")
+
+    ours = list(gtts_stream(tts, session=requests.Session()))
+    theirs = list(tts.stream())
+
+    assert ours == theirs == [AUDIO] * (len(sent) // 2)
+    assert [r.body for r in sent[: len(sent) // 2]] == [r.body for r in sent[len(sent) // 2 :]]
@@ -0,0 +1,45 @@
+import pytest
+
+from intent_router import (
+    LOUDER,
+    MORE_LIKE_THIS,
+    PAUSE,
+    QUIT,
+    SKIP,
+    Intent,
+    IntentRouter,
+    KeywordClassifier,
+)
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(KeywordClassifier())
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Stop the DJ.", Intent(QUIT)),
+        ("Hey DJ, skip", Intent(SKIP)),
+        ("I don't like this song", Intent(SKIP)),
+        ("next one please", Intent(SKIP)),
+        ("I like this song", Intent(MORE_LIKE_THIS)),
+        ("make it louder please", Intent(LOUDER)),
+        ("stop the music", Intent(PAUSE)),
+    ],
+)
+def test_commands(router, text, expected):
+    assert router.route(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "I love this song",
+        "this song is great",
+        "play some 90s hip hop for a road trip",
+    ],
+)
+def test_not_commands(router, text):
+    assert router.route(text) is None
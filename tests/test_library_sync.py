@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip("spotipy")
+
+from spotipy.exceptions import SpotifyException  # noqa: E402
+
+from library_sync import LibraryStore, LibrarySync  # noqa: E402
+
+
+def track(n):
+    return {"uri": f"spotify:track:{n}", "name": f"Song {n}", "artists": [{"id": f"artist{n % 3}", "name": f"Artist {n % 3}"}]}
+
+
+def page(items, limit, offset):
+    return {"items": items[offset : offset + limit], "total": len(items)}
+
+
+class FakeSpotify:
+    """A library of saved tracks and playlists, counting the requests made."""
+
+    def __init__(self):
+        self.saved = [{"added_at": f"2024-01-{day:02d}T00:00:00Z", "track": track(day)} for day in range(30, 0, -1)]
+        self.playlists = {
+            "p1": ("s1", [track(n) for n in range(100, 220)]),
+            "p2": ("s1", [track(n) for n in range(300, 305)]),
+        }
+        self.calls = []
+        self.rate_limited = 0
+
+    def current_user_top_tracks(self, limit, offset, time_range):
+        self.calls.append(("top", time_range))
+        return page([track(1), track(2)], limit, offset)
+
+    def current_user_saved_tracks(self, limit, offset):
+        self.calls.append(("saved", offset))
+        return page(self.saved, limit, offset)
+
+    def current_user_playlists(self, limit, offset):
+        self.calls.append(("playlists", offset))
+        playlists = [{"id": pid, "name": pid, "snapshot_id": snap} for pid, (snap, _) in self.playlists.items()]
+        return page(playlists, limit, offset)
+
+    def playlist_items(self, playlist_id, limit, offset, fields=None, additional_types=None):
+        self.calls.append(("playlist", playlist_id, offset))
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise SpotifyException(429, -1, "Too many requests", headers={"Retry-After": "0"})
+        return page([{"added_at": None, "track": t} for t in self.playlists[playlist_id][1]], limit, offset)
+
+    def artists(self, ids):
+        self.calls.append(("artists", len(ids)))
+        return {"artists": [{"id": i, "name": i, "genres": ["pop"]} for i in ids]}
+
+
+def sync(sp, store):
+    library = LibrarySync(sp, store, workers=4)
+    try:
+        return library.sync()
+    finally:
+        library.shutdown()
+
+
+def test_first_sync_reads_every_page():
+    sp, store = FakeSpotify(), LibraryStore()
+    stats = sync(sp, store)
+    assert stats["saved"] == 30 and stats["playlists"] == 125
+    assert store.count("playlist:p1") == 120 and store.count("saved") == 30
+    assert sorted(c[2] for c in sp.calls if c[:2] == ("playlist", "p1")) == [0, 100]
+    assert store.playlist_snapshots() == {"p1": "s1", "p2": "s1"}
+    assert ("artists", 3) in sp.calls
+    assert not LibrarySync(sp, store).needs_sync(interval=60)
+
+
+def test_later_syncs_only_fetch_what_changed():
+    sp, store = FakeSpotify(), LibraryStore()
+    sync(sp, store)
+    sp.calls.clear()
+
+    sp.saved.insert(0, {"added_at": "2024-02-01T00:00:00Z", "track": track(31)})
+    sp.playlists["p2"] = ("s2", [track(n) for n in range(300, 310)])
+    del sp.playlists["p1"]
+    stats = sync(sp, store)
+
+    assert stats["saved"] == 1 and stats["playlists"] == 10 and stats["artists"] == 0
+    assert [c for c in sp.calls if c[0] == "saved"] == [("saved", 0)]
+    assert [c for c in sp.calls if c[0] == "playlist"] == [("playlist", "p2", 0)]
+    assert store.playlist_snapshots() == {"p2": "s2"}
+    assert store.count("playlist:p1") == 0 and store.count("saved") == 31
+
+
+def test_unsaved_tracks_trigger_a_full_reread():
+    sp, store = FakeSpotify(), LibraryStore()
+    sync(sp, store)
+    del sp.saved[5]
+    sync(sp, store)
+    assert store.count("saved") == 29
+
+
+def test_rate_limited_requests_are_retried():
+    sp, store = FakeSpotify(), LibraryStore()
+    sp.rate_limited = 2
+    sync(sp, store)
+    assert store.count("playlist:p2") == 5
+    assert len([c for c in sp.calls if c[0] == "playlist"]) == 5
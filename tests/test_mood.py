@@ -0,0 +1,34 @@
+import pytest
+
+from mood import classify_mood_locally
+
+
+@pytest.mark.parametrize(
+    "text, mood",
+    [
+        ("I'm feeling sad today, play something to cheer me up", "sad"),
+        ("I feel great", "happy"),
+        ("I'm so tired", "tired"),
+        ("something chill please", "calm"),
+        ("music for my workout", "energetic"),
+        ("I'm in love", "romantic"),
+        ("chill", "calm"),
+    ],
+)
+def test_explicit_moods(text, mood):
+    assert classify_mood_locally(text) == mood
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "play Blue Monday",
+        "play Love Story",
+        "play Run DMC",
+        "put on Great Balls of Fire",
+        "I'm not happy",
+        "play something to cheer me up",
+    ],
+)
+def test_titles_and_ambiguous_inputs_are_left_to_the_model(text):
+    assert classify_mood_locally(text) is None
@@ -0,0 +1,81 @@
+import pytest
+
+from playback_queue import PlaybackQueue
+
+
+class FakePlayer:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def play_uris(self, uris, device_id=None):
+        if uris[0] in self.failing:
+            raise RuntimeError("Player command failed: No active device found")
+        self.calls.append(("play", uris[0]))
+
+    def add_to_queue(self, uri, device_id=None):
+        if uri in self.failing:
+            raise RuntimeError("Player command failed: No active device found")
+        self.calls.append(("queue", uri))
+
+
+def make_queue(player):
+    started, queued = [], []
+    queue = PlaybackQueue(player, "device", on_now_playing=started.append, on_queued=queued.append)
+    return queue, started, queued
+
+
+def test_first_track_starts_playback_and_the_rest_are_queued_in_order():
+    player = FakePlayer()
+    queue, started, queued = make_queue(player)
+    generation = queue.new_batch()
+    for i in range(4):
+        assert queue.push(f"song {i}", f"uri:{i}", generation, start=i == 0)
+    assert player.calls == [("play", "uri:0"), ("queue", "uri:1"), ("queue", "uri:2"), ("queue", "uri:3")]
+    assert started == ["song 0"] and queued == ["song 1", "song 2", "song 3"]
+    assert queue.now_playing() == "song 0" and queue.remaining() == 3
+
+
+def test_tracks_of_a_replaced_batch_are_dropped():
+    player = FakePlayer()
+    queue, started, _ = make_queue(player)
+    old = queue.new_batch()
+    queue.push("old", "uri:old", old, start=True)
+    new = queue.new_batch()
+    assert not queue.push("late", "uri:late", old, start=False)
+    assert queue.push("new", "uri:new", new, start=True)
+    assert [uri for _, uri in player.calls] == ["uri:old", "uri:new"]
+    assert started == ["old", "new"]
+
+
+def test_rejected_start_is_not_announced():
+    player = FakePlayer(failing={"uri:0"})
+    queue, started, _ = make_queue(player)
+    generation = queue.new_batch()
+    with pytest.raises(RuntimeError):
+        queue.push("song 0", "uri:0", generation, start=True)
+    assert started == [] and queue.now_playing() is None and queue.remaining() == 0
+    # The next song of the batch starts it instead
+    assert queue.push("song 1", "uri:1", generation, start=True)
+    assert started == ["song 1"]
+
+
+def test_rejected_queueing_is_not_counted():
+    player = FakePlayer(failing={"uri:1"})
+    queue, _, queued = make_queue(player)
+    generation = queue.new_batch()
+    queue.push("song 0", "uri:0", generation, start=True)
+    with pytest.raises(RuntimeError):
+        queue.push("song 1", "uri:1", generation, start=False)
+    assert queued == [] and queue.remaining() == 0
+
+
+def test_finished_tracks_are_forgotten():
+    queue, started, _ = make_queue(FakePlayer())
+    generation = queue.new_batch()
+    for i in range(5):
+        queue.push(f"song {i}", f"uri:{i}", generation, start=i == 0)
+    queue._track_started("uri:3")
+    assert started[-1] == "song 3"
+    assert queue.remaining() == 1
+    assert set(queue._labels) == {"uri:3", "uri:4"}
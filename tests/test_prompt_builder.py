@@ -0,0 +1,33 @@
+import prompt_builder
+
+
+class OfflineTiktoken:
+    def __init__(self):
+        self.loads = 0
+
+    def encoding_for_model(self, model):
+        raise KeyError(model)
+
+    def get_encoding(self, name):
+        self.loads += 1
+        raise OSError(f"{name}.tiktoken NameResolutionError")
+
+
+def test_count_tokens_estimates_when_the_tokenizer_cannot_load(monkeypatch):
+    offline = OfflineTiktoken()
+    monkeypatch.setattr(prompt_builder, "tiktoken", offline)
+    monkeypatch.setattr(prompt_builder, "_encoders", {})
+
+    assert prompt_builder.count_tokens("abcdefgh") == 2
+    assert prompt_builder.count_tokens("abcdefghi") == 3
+    # The failed load is not retried on every count
+    assert offline.loads == 1
+
+
+def test_truncate_to_tokens_works_offline(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "tiktoken", OfflineTiktoken())
+    monkeypatch.setattr(prompt_builder, "_encoders", {})
+
+    text = prompt_builder.truncate_to_tokens("one two three four five six seven", 4)
+    assert text.endswith("...")
+    assert prompt_builder.count_tokens(text) <= 4
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+import recommendation_cache
+from recommendation_cache import RecommendationCache
+
+SONGS = ["Song A - Artist A", "Song B - Artist B", "Song C - Artist C"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Entries take their creation time from time.time itself
+    now = [time.time()]
+    monkeypatch.setattr(recommendation_cache.time, "time", lambda: now[0])
+    return now
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("regenerate_probability", 0)
+    return RecommendationCache(**kwargs)
+
+
+def test_replayed_answers_expire_after_the_ttl(clock):
+    cache = make_cache(ttl=60, variety="replay")
+    cache.store("taste", "happy", "Party!", [], 2, SONGS[:2])
+    assert cache.lookup("taste", "happy", "party", [], 2) == SONGS[:2]
+    assert cache.lookup("taste", "sad", "party", [], 2) is None
+
+    clock[0] += 61
+    assert cache.lookup("taste", "happy", "party", [], 2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_requests_are_evicted(clock):
+    cache = make_cache(max_entries=2, variety="replay")
+    for request in ("one", "two"):
+        cache.store("taste", "happy", request, [], 1, SONGS[:1])
+    cache.lookup("taste", "happy", "one", [], 1)
+    cache.store("taste", "happy", "three", [], 1, SONGS[:1])
+    assert cache.lookup("taste", "happy", "two", [], 1) is None
+    assert cache.lookup("taste", "happy", "one", [], 1) == SONGS[:1]
+    assert cache.lookup("taste", "happy", "three", [], 1) == SONGS[:1]
+
+
+def test_samples_skip_recently_played_songs(clock):
+    cache = make_cache(variety="sample")
+    cache.store("taste", "happy", "party", [], 2, SONGS[:2])
+    cache.store("taste", "happy", "party", [], 2, SONGS[1:])
+    answer = cache.lookup("taste", "happy", "party", [SONGS[0]], 2)
+    assert sorted(answer) == SONGS[1:]
+    # Not enough unplayed songs left in the pool: asked again
+    assert cache.lookup("taste", "happy", "party", SONGS[:2], 2) is None
+
+
+def test_similar_requests_hit_through_embeddings(clock):
+    vectors = {"play something chill": [1.0, 0.0], "something chill please": [0.99, 0.1], "rock": [0.0, 1.0]}
+    cache = make_cache(variety="replay", embed=vectors.get, similarity_threshold=0.9)
+    cache.store("taste", "calm", "play something chill", [], 1, SONGS[:1])
+    assert cache.lookup("taste", "calm", "something chill please", [], 1) == SONGS[:1]
+    assert cache.lookup("taste", "calm", "rock", [], 1) is None
+    assert cache.stats()["similar_hits"] == 1
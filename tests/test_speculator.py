@@ -0,0 +1,94 @@
+import threading
+
+from speculator import Speculator
+
+
+class Song:
+    def __init__(self, song_name, artist="Artist"):
+        self.song_name = song_name
+        self.artist = artist
+
+
+class FakeHistory:
+    def recent(self):
+        return []
+
+
+class FakeSuggester:
+    """Answers each request with songs named after it, reporting a mood for calm ones."""
+
+    def __init__(self):
+        self.mood = "happy"
+        self.user_description = "pop"
+        self.history = FakeHistory()
+        self.requests = []
+
+    def pipeline_stream(self, input_from_user="", prev_songs=None, on_mood=None):
+        self.requests.append(input_from_user)
+        if "calm" in input_from_user.lower() and on_mood is not None:
+            on_mood("calm")
+        for i in range(3):
+            yield Song(f"{input_from_user or 'more'} {i}")
+
+
+class FakePlayer:
+    def __init__(self):
+        self.lookups = 0
+
+    def get_track_uris(self, pairs):
+        self.lookups += 1
+        return [None if song.endswith("2") else f"uri:{song}" for song, _ in pairs]
+
+
+def prepare_all(speculator, generation):
+    cancel = threading.Event()
+    while speculator.pending(generation):
+        speculator.prepare_next(generation, cancel)
+
+
+def test_staged_batches_serve_matching_requests_without_any_call():
+    suggester, player = FakeSuggester(), FakePlayer()
+    speculator = Speculator(suggester, player, max_requests=2)
+    prepare_all(speculator, generation=1)
+    assert suggester.requests == ["", "Something more energetic", "Something calmer"]
+    assert player.lookups == 3
+
+    tracks = speculator.take("play something more energetic", 1)
+    # Songs that were not found are left out
+    assert [uri for _, uri in tracks] == ["uri:Something more energetic 0", "uri:Something more energetic 1"]
+    assert speculator.take("more energetic", 1) is None
+    assert speculator.take("play some jazz", 1) is None
+    assert [uri for _, uri in speculator.take("", 1)] == ["uri:more 0", "uri:more 1"]
+    assert suggester.requests == ["", "Something more energetic", "Something calmer"]
+
+
+def test_the_reported_mood_only_applies_when_the_batch_is_served():
+    suggester = FakeSuggester()
+    speculator = Speculator(suggester, FakePlayer(), max_requests=2)
+    prepare_all(speculator, generation=1)
+    assert suggester.mood == "happy"
+    assert speculator.take("something calmer", 1) is not None
+    assert suggester.mood == "calm"
+
+
+def test_batches_are_dropped_when_the_context_changes():
+    suggester = FakeSuggester()
+    speculator = Speculator(suggester, FakePlayer(), max_requests=1)
+    prepare_all(speculator, generation=1)
+    assert speculator.take("", 2) is None
+    assert speculator.pending(2)
+
+    prepare_all(speculator, generation=2)
+    suggester.user_description = "jazz"
+    assert speculator.take("", 2) is None
+
+
+def test_cancelled_speculation_is_tried_again():
+    suggester, player = FakeSuggester(), FakePlayer()
+    speculator = Speculator(suggester, player, max_requests=0)
+    cancel = threading.Event()
+    cancel.set()
+    speculator.prepare_next(1, cancel)
+    assert player.lookups == 0 and speculator.pending(1)
+    speculator.prepare_next(1, threading.Event())
+    assert not speculator.pending(1) and speculator.take("", 1)
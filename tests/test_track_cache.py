@@ -0,0 +1,82 @@
+import pytest
+
+import track_cache
+from track_cache import TrackCache, normalize_key, normalize_text
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "Bésame (feat. Someone)",
+        "Bésame [ft. Someone]",
+        "Bésame (Featuring Someone & Other)",
+        "Bésame - feat. Someone",
+        "BESAME",
+    ],
+)
+def test_featuring_credits_are_dropped(raw):
+    assert normalize_text(raw) == "besame"
+
+
+def test_titles_starting_with_feat_words_are_kept():
+    assert normalize_text("Feat of Strength") == "feat of strength"
+    assert normalize_text("Featuring Tonight") == "featuring tonight"
+    assert normalize_text("Left Feat (feat. Someone) - Live") == "left feat live"
+    assert normalize_key("Featuring Tonight", None) != normalize_key("Tonight", None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(track_cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TrackCache(db_path=None, ttl=100, negative_ttl=10)
+    cache.store("Song", "Artist", "spotify:track:1")
+    cache.store("Made Up", "Nobody", None)
+    assert cache.lookup("song", "ARTIST") == (True, "spotify:track:1")
+    assert cache.lookup("Made Up", "Nobody") == (True, None)
+
+    clock.now += 50
+    assert cache.lookup("Made Up", "Nobody") == (False, None)
+    assert cache.lookup("Song", "Artist") == (True, "spotify:track:1")
+    clock.now += 60
+    assert cache.lookup("Song", "Artist") == (False, None)
+
+
+def test_least_recently_used_entries_leave_the_memory_tier(clock):
+    cache = TrackCache(db_path=None, memory_size=2)
+    cache.store("A", None, "uri:a")
+    cache.store("B", None, "uri:b")
+    cache.lookup("A", None)
+    cache.store("C", None, "uri:c")
+    assert cache.lookup("B", None) == (False, None)
+    assert cache.lookup("A", None) == (True, "uri:a")
+    assert cache.lookup("C", None) == (True, "uri:c")
+
+
+def test_the_disk_tier_outlives_the_process_and_is_purged(clock, tmp_path):
+    path = str(tmp_path / "tracks.db")
+    cache = TrackCache(db_path=path, memory_size=1, ttl=100, negative_ttl=10)
+    cache.store("A", None, "uri:a")
+    cache.store("B", None, None)
+    cache.close()
+
+    cache = TrackCache(db_path=path, ttl=100, negative_ttl=10)
+    assert cache.lookup("A", None) == (True, "uri:a")
+    assert cache.stats()["disk_hits"] == 1
+    assert list(cache.resolved_items()) == [("a|", "uri:a")]
+    clock.now += 50
+    assert cache.purge_expired() == 1
+    assert cache.lookup("B", None) == (False, None)
+    cache.close()
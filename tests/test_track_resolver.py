@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("spotipy")
+
+import requests  # noqa: E402
+from spotipy.exceptions import SpotifyException  # noqa: E402
+
+from track_resolver import TokenBucket, TrackResolver  # noqa: E402
+
+
+class FlakySearch:
+    """Fails each song with the given errors, in order, then finds it."""
+
+    def __init__(self, errors=None):
+        self.errors = {song: list(e) for song, e in (errors or {}).items()}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, song, artist):
+        with self._lock:
+            self.calls.append(song)
+            errors = self.errors.get(song)
+            if errors:
+                raise errors.pop(0)
+        return None if song == "missing" else f"uri:{song}"
+
+
+def make_resolver(search, **kwargs):
+    return TrackResolver(search, bucket=TokenBucket(1000, 1000), backoff=0.001, **kwargs)
+
+
+def test_results_keep_the_order_of_the_input():
+    resolver = make_resolver(FlakySearch())
+    futures = resolver.resolve([(f"song {i}", "artist") for i in range(8)] + [("missing", None)])
+    assert [f.result() for f in futures] == [f"uri:song {i}" for i in range(8)] + [None]
+    resolver.shutdown()
+
+
+def test_transient_errors_are_retried():
+    search = FlakySearch({
+        "a": [SpotifyException(502, -1, "Bad gateway")],
+        "b": [requests.ConnectionError("reset"), requests.Timeout("slow")],
+    })
+    resolver = make_resolver(search)
+    assert resolver.submit("a", None).result() == "uri:a"
+    assert resolver.submit("b", None).result() == "uri:b"
+    assert search.calls.count("b") == 3
+    resolver.shutdown()
+
+
+def test_client_errors_and_exhausted_retries_are_raised():
+    search = FlakySearch({
+        "bad": [SpotifyException(400, -1, "Bad request")],
+        "down": [SpotifyException(503, -1, "Unavailable")] * 3,
+    })
+    resolver = make_resolver(search, max_retries=2)
+    with pytest.raises(SpotifyException):
+        resolver.submit("bad", None).result()
+    with pytest.raises(SpotifyException):
+        resolver.submit("down", None).result()
+    assert search.calls.count("bad") == 1 and search.calls.count("down") == 3
+    resolver.shutdown()
+
+
+def test_rate_limits_pause_every_worker_for_retry_after():
+    bucket = TokenBucket(1000, 1000)
+    search = FlakySearch({"a": [SpotifyException(429, -1, "Too many", headers={"Retry-After": "0.2"})]})
+    resolver = TrackResolver(search, bucket=bucket, backoff=0.001)
+    start = time.monotonic()
+    assert resolver.submit("a", None).result() == "uri:a"
+    assert time.monotonic() - start >= 0.2
+    resolver.shutdown()
+
+
+def test_bucket_limits_the_request_rate():
+    bucket = TokenBucket(rate=50, capacity=2)
+    start = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    # Two tokens at once, then one every 20 ms
+    assert time.monotonic() - start >= 0.09
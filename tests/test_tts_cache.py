@@ -0,0 +1,41 @@
+import os
+
+from tts_cache import TTSCache
+
+
+def make_cache(tmp_path, max_bytes=1000):
+    calls = []
+
+    def synthesize(text, lang, path):
+        calls.append(text)
+        with open(path, "wb") as f:
+            f.write(text.encode("utf-8") * 100)
+
+    return TTSCache(str(tmp_path), max_bytes=max_bytes, lang="en", synthesize=synthesize), calls
+
+
+def test_phrases_are_synthesized_once(tmp_path):
+    cache, calls = make_cache(tmp_path)
+    first = cache.get("hello")
+    assert cache.get("hello") == first
+    assert calls == ["hello"] and (cache.hits, cache.misses) == (1, 1)
+    assert [name for name in os.listdir(tmp_path) if not name.endswith(".mp3")] == []
+
+
+def test_least_recently_used_files_are_evicted_over_the_size_limit(tmp_path):
+    cache, calls = make_cache(tmp_path, max_bytes=1000)
+    a = cache.get("aaaa")  # 400 bytes each
+    b = cache.get("bbbb")
+    os.utime(b, (1, 1))  # b is now the least recently used
+    cache.get("cccc")
+    assert os.path.exists(a) and not os.path.exists(b)
+    assert cache.get("bbbb") == b and calls.count("bbbb") == 2
+
+
+def test_announcements_are_assembled_from_cached_fragments(tmp_path):
+    cache, calls = make_cache(tmp_path, max_bytes=10000)
+    path = cache.assemble(["Now playing", "Song"])
+    with open(path, "rb") as f:
+        assert f.read() == b"Now playing" * 100 + b"Song" * 100
+    cache.assemble(["Now playing", "Other"])
+    assert calls == ["Now playing", "Song", "Other"]
@@ -0,0 +1,146 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+import vad
+from vad import EnergyVAD, UtteranceDetector, VADListener
+
+RATE = 16000
+FRAME = RATE * 30 // 1000
+
+
+@pytest.fixture(autouse=True)
+def energy_vad(monkeypatch):
+    # The same detector whether or not webrtcvad is installed
+    monkeypatch.setattr(vad, "make_vad", lambda sample_rate: EnergyVAD())
+
+
+def noise(seconds, level, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(0, level, int(RATE * seconds)), -32768, 32767).astype(np.int16)
+
+
+class FakeRecorder:
+    """
+    Plays `audio` into the listener in 30 ms blocks, ten times faster than
+    real time, with the first `muted_until` samples muted.
+    """
+
+    sample_rate = RATE
+
+    def __init__(self, audio, muted=None, muted_until=0):
+        self.audio = audio
+        self.muted = muted
+        self.muted_until = muted_until
+        self.on_block = None
+        self.done = threading.Event()
+
+    def reset(self):
+        pass
+
+    @contextmanager
+    def stream(self):
+        def run():
+            for start in range(0, len(self.audio), FRAME):
+                if self.muted is not None:
+                    if start < self.muted_until:
+                        self.muted.set()
+                    else:
+                        self.muted.clear()
+                self.on_block(self.audio[start : start + FRAME])
+                time.sleep(0.003)
+            self.done.set()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        yield self
+        thread.join()
+
+    def slice(self, start, end):
+        return self.audio[start:end]
+
+
+def listen_until_done(recorder, handle=None, **kwargs):
+    listener = VADListener(recorder, **kwargs)
+    stop = threading.Event()
+    threading.Thread(target=lambda: (recorder.done.wait(), stop.set()), daemon=True).start()
+    utterances = []
+    for utterance in listener.utterances(stop):
+        utterances.append(utterance.copy())
+        if handle is not None:
+            handle()
+    return utterances
+
+
+def test_detector_pads_and_closes_utterances():
+    detector = UtteranceDetector(RATE)
+    decisions = [False] * 10 + [True] * 20 + [False] * 40
+    events = [detector.update(i * FRAME, speech) for i, speech in enumerate(decisions)]
+    assert events.count("start") == 1
+    (start, end), = [e for e in events if isinstance(e, tuple)]
+    assert start == 10 * FRAME - detector.padding
+    assert end == 30 * FRAME + detector.padding
+
+
+def two_commands():
+    return np.concatenate(
+        [noise(0.5, 20), noise(0.6, 4000, 1), noise(1.0, 20), noise(0.6, 4000, 2), noise(1.0, 20)]
+    )
+
+
+def test_utterances_are_split_on_silence():
+    utterances = listen_until_done(FakeRecorder(two_commands()))
+    assert len(utterances) == 2
+    assert all(0.6 * RATE <= len(u) <= 1.2 * RATE for u in utterances)
+
+
+def test_audio_heard_while_handling_an_utterance_is_dropped():
+    # Handling the first command takes longer than the rest of the audio
+    utterances = listen_until_done(FakeRecorder(two_commands()), handle=lambda: time.sleep(0.5))
+    assert len(utterances) == 1
+
+
+def test_muted_audio_is_ignored():
+    audio = np.concatenate(
+        [noise(0.6, 4000, 1), noise(1.0, 20), noise(0.6, 4000, 2), noise(1.0, 20)]
+    )
+    muted = threading.Event()
+    started = []
+    recorder = FakeRecorder(audio, muted=muted, muted_until=int(1.6 * RATE))
+    utterances = listen_until_done(
+        recorder, muted=muted, on_speech_start=lambda: started.append(True)
+    )
+    # Only the speech after the announcement counts
+    assert len(utterances) == 1 and len(started) == 1
+
+
+def test_music_is_not_taken_for_speech():
+    music = noise(3.0, 1500, 3)
+    started = []
+    listen_until_done(
+        FakeRecorder(music), music_playing=lambda: True, on_speech_start=lambda: started.append(1)
+    )
+    assert started == []
+    # Without music playing, the same audio opens an utterance
+    listen_until_done(FakeRecorder(music), on_speech_start=lambda: started.append(1))
+    assert started == [1]
+
+
+def test_speech_over_music_is_heard():
+    audio = noise(2.0, 500, 3)
+    audio[int(1.0 * RATE) : int(1.6 * RATE)] += noise(0.6, 6000, 4)
+    started = []
+    listen_until_done(
+        FakeRecorder(audio), music_playing=lambda: True, on_speech_start=lambda: started.append(1)
+    )
+    assert started == [1]
+
+
+def test_speech_start_errors_do_not_end_the_capture():
+    def pause():
+        raise RuntimeError("Player command failed: Restriction violated")
+
+    assert len(listen_until_done(FakeRecorder(two_commands()), on_speech_start=pause)) == 2
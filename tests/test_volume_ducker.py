@@ -0,0 +1,33 @@
+from volume_ducker import VolumeDucker
+
+
+class FakePlayer:
+    def __init__(self, volume):
+        self.volume = volume
+
+    def get_volume(self):
+        return self.volume
+
+    def set_volume(self, volume_percent, device_id=None):
+        self.volume = volume_percent
+
+
+def test_volume_is_lowered_then_restored():
+    player = FakePlayer(80)
+    ducker = VolumeDucker(player, "device", ratio=0.25)
+    ducker.duck()
+    assert player.volume == 20
+    ducker.restore()
+    assert player.volume == 80
+    # Nothing to restore twice
+    player.volume = 50
+    ducker.restore()
+    assert player.volume == 50
+
+
+def test_nothing_happens_without_an_active_device():
+    player = FakePlayer(None)
+    ducker = VolumeDucker(player)
+    ducker.duck()
+    ducker.restore()
+    assert player.volume is None